@@ -10,12 +10,21 @@ import os
 from database import (
     get_user, get_user_projects, create_project,
     get_profession_by_project, create_profession,
-    add_progressive_rate, get_progressive_rates,
-    add_additional_service, get_additional_services,
-    get_meal_types, add_meal_type  # НОВОЕ!
+    add_progressive_rate, add_additional_service,
+    add_meal_type,  # НОВОЕ!
+    get_profession_config, get_project_totals, get_shifts_page,
+    get_project_export, init_reporting_pool, search_shifts,
+    get_shift_details, count_stale_shifts
 )
-import json
-import aiosqlite
+from calculator import recalculate_project, simulate_project
+from profession_config import validate_progressive_rates
+from timings import timings
+import blob_codec
+from config import SHIFTS_PAGE_SIZE, RECALC_JOB_TTL, RECALC_JOBS_MAX
+from datetime import date
+import threading
+import time
+import uuid
 import csv
 from io import StringIO
 from urllib.parse import quote
@@ -45,14 +54,37 @@ def serve_static(path):
     return send_from_directory(MINIAPP_DIR, path)
 
 # Хелпер для запуска async функций
+# Один фоновый event loop на процесс: пул отчётов и его соединения
+# живут между запросами, а не открываются заново на каждый вызов
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    """
+    Фоновый event loop (создаётся при первом вызове)
+
+    Если пул не открылся, loop останавливается, а поток завершается:
+    следующий запрос попробует заново.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="api-async", daemon=True)
+            thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(init_reporting_pool(), loop).result()
+            except BaseException:
+                loop.call_soon_threadsafe(loop.stop)
+                thread.join()
+                loop.close()
+                raise
+            _loop = loop
+    return _loop
+
 def run_async(coro):
-    """Запускает async функцию в sync контексте"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coro)
-    finally:
-        loop.close()
+    """Запускает async функцию в sync контексте (в фоновом event loop)"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
 
 # ============================================================
 # ПРОЕКТЫ
@@ -118,8 +150,8 @@ def create_project_api():
 def get_project_details(project_id):
     """Получить детали проекта (профессии + услуги + ОБЕДЫ)"""
     try:
-        # Получаем профессию
-        profession = run_async(get_profession_by_project(project_id))
+        # Профессия, ставки, услуги и обеды - одним снимком из кэша
+        config = run_async(get_profession_config(project_id))
         
         result = {
             'project_id': project_id,
@@ -129,21 +161,8 @@ def get_project_details(project_id):
             'meals': []  # НОВОЕ!
         }
         
-        if profession:
-            result['profession'] = dict(profession)
-            
-            # Получаем прогрессивные ставки
-            rates = run_async(get_progressive_rates(profession['id']))
-            result['progressive_rates'] = [dict(r) for r in rates]
-            
-            # Получаем услуги
-            services = run_async(get_additional_services(profession['id']))
-            result['services'] = [dict(s) for s in services]
-            
-            # === НОВОЕ: Получаем типы обедов ===
-            meals = run_async(get_meal_types(profession['id']))
-            result['meals'] = [dict(m) for m in meals]
-            # === КОНЕЦ НОВОГО ===
+        if config:
+            result.update(config.to_dict())
         
         return jsonify(result)
     
@@ -161,6 +180,16 @@ def add_profession_api(project_id):
     """Добавить профессию к проекту"""
     data = request.json
     
+    # Шкала прогрессивных ставок проверяется до создания профессии
+    # (нет полей, не числа, пересечения - ошибка клиента, а не 500)
+    try:
+        rates = sorted(data.get('progressive_rates', []), key=lambda r: r['order_num'])
+        validate_progressive_rates([(r['hours_from'], r.get('hours_to')) for r in rates])
+    except KeyError as e:
+        return jsonify({'error': f'В прогрессивной ставке нет поля {e}'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Некорректные прогрессивные ставки: {e}'}), 400
+    
     try:
         # Создаём профессию
         profession_id = run_async(create_profession(
@@ -181,7 +210,6 @@ def add_profession_api(project_id):
         print(f"✅ Профессия создана: ID={profession_id}, Должность={data['position']}")
         
         # Добавляем прогрессивные ставки
-        rates = data.get('progressive_rates', [])
         for rate in rates:
             run_async(add_progressive_rate(
                 profession_id=profession_id,
@@ -260,68 +288,55 @@ def add_service_api(project_id):
 
 @app.route('/api/projects/<int:project_id>/statistics', methods=['GET'])
 def get_project_statistics(project_id):
-    """Получить статистику по проекту"""
+    """
+    Получить статистику по проекту
+
+    Смены отдаются страницами: ?limit=&cursor=&since=YYYY-MM-DD.
+    Итоги (statistics) - только на первой странице (без cursor).
+    """
     try:
-        # Получаем все смены проекта с заработком
-        async def fetch_stats():
-            async with aiosqlite.connect('data.db') as db:
-                db.row_factory = aiosqlite.Row
-                
-                # Статистика по сменам
-                async with db.execute("""
-                    SELECT 
-                        COUNT(*) as total_shifts,
-                        SUM(total_hours) as total_hours,
-                        SUM(overtime_hours) as total_overtime
-                    FROM shifts
-                    WHERE project_id = ? AND status = 'calculated'
-                """, (project_id,)) as cursor:
-                    stats = await cursor.fetchone()
-                
-                # Статистика по заработку
-                async with db.execute("""
-                    SELECT 
-                        SUM(e.total_net) as total_net,
-                        SUM(e.total_gross) as total_gross
-                    FROM earnings e
-                    JOIN shifts s ON e.shift_id = s.id
-                    WHERE s.project_id = ?
-                """, (project_id,)) as cursor:
-                    earnings = await cursor.fetchone()
-                
-                # Список смен с заработком
-                async with db.execute("""
-                    SELECT 
-                        s.id,
-                        s.date,
-                        s.start_time,
-                        s.end_time,
-                        s.total_hours,
-                        s.overtime_hours,
-                        e.total_net,
-                        e.total_gross
-                    FROM shifts s
-                    LEFT JOIN earnings e ON e.shift_id = s.id
-                    WHERE s.project_id = ? AND s.status = 'calculated'
-                    ORDER BY s.date DESC, s.created_at DESC
-                """, (project_id,)) as cursor:
-                    shifts = await cursor.fetchall()
-                
-                return stats, earnings, shifts
-        
-        stats, earnings, shifts = run_async(fetch_stats())
-        
+        cursor = request.args.get('cursor') or None
+        limit = request.args.get('limit', SHIFTS_PAGE_SIZE, type=int)
+        since = request.args.get('since') or None
+
+        try:
+            shifts, next_cursor = run_async(get_shifts_page(
+                project_id, limit=limit, cursor=cursor, since=since, reporting=True
+            ))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         result = {
             'project_id': project_id,
-            'statistics': {
-                'total_shifts': stats['total_shifts'] or 0,
-                'total_hours': round(stats['total_hours'] or 0, 1),
-                'total_overtime': round(stats['total_overtime'] or 0, 1),
-                'total_net': earnings['total_net'] or 0,
-                'total_gross': earnings['total_gross'] or 0
-            },
-            'shifts': [dict(s) for s in shifts]
+            'shifts': [
+                {
+                    'id': s['id'],
+                    'date': s['date'],
+                    'start_time': s['start_time'],
+                    'end_time': s['end_time'],
+                    'total_hours': s['total_hours'],
+                    'overtime_hours': s['overtime_hours'],
+                    'total_net': s['total_net'],
+                    'total_gross': s['total_gross']
+                }
+                for s in shifts
+            ],
+            'next_cursor': next_cursor
         }
+
+        # Итоги - из агрегатов project_period_totals
+        if cursor is None:
+            totals = run_async(get_project_totals(project_id, reporting=True))
+            result['statistics'] = {
+                'total_shifts': totals['total_shifts'],
+                'total_hours': round(totals['total_hours'], 1),
+                'total_overtime': round(totals['total_overtime'], 1),
+                'total_net': totals['total_net'],
+                'total_gross': totals['total_gross'],
+                'periods': totals['periods'],
+                # Смены, ещё не пересчитанные после изменения настроек
+                'pending_recompute': run_async(count_stale_shifts(project_id, reporting=True))
+            }
         
         return jsonify(result)
     
@@ -330,6 +345,75 @@ def get_project_statistics(project_id):
         return jsonify({'error': str(e)}), 500
 
 
+# ============================================================
+# СМЕНА
+# ============================================================
+
+@app.route('/api/shifts/<int:shift_id>', methods=['GET'])
+def get_shift_api(shift_id):
+    """Смена с заработком, результатом парсинга и деталями расчёта"""
+    try:
+        shift = run_async(get_shift_details(shift_id, reporting=True))
+
+        if not shift:
+            return jsonify({'error': 'Shift not found'}), 404
+
+        result = dict(shift)
+        # Блобы в БД хранятся в компактном формате - отдаём как JSON
+        result['parsed_data'] = blob_codec.decode(shift['parsed_data'])
+        result['calculation_details'] = blob_codec.decode(shift['calculation_details'])
+
+        return jsonify(result)
+
+    except Exception as e:
+        print(f"❌ Ошибка get_shift_api: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+# ============================================================
+# ПОИСК ПО СМЕНАМ
+# ============================================================
+
+@app.route('/api/projects/<int:project_id>/search', methods=['GET'])
+def search_project_shifts(project_id):
+    """
+    Полнотекстовый поиск смен проекта по исходному сообщению
+
+    ?q=ронин или ?q="поздний обед" (точная фраза), &limit=
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        limit = request.args.get('limit', 20, type=int)
+
+        if not query:
+            return jsonify({'error': 'Пустой запрос (параметр q)'}), 400
+
+        shifts = run_async(search_shifts(project_id, query, limit=limit, reporting=True))
+
+        return jsonify({
+            'project_id': project_id,
+            'query': query,
+            'results': [
+                {
+                    'id': s['id'],
+                    'date': s['date'],
+                    'start_time': s['start_time'],
+                    'end_time': s['end_time'],
+                    'total_hours': s['total_hours'],
+                    'overtime_hours': s['overtime_hours'],
+                    'status': s['status'],
+                    'snippet': s['snippet'],
+                    'rank': round(s['rank'], 4)
+                }
+                for s in shifts
+            ]
+        })
+
+    except Exception as e:
+        print(f"❌ Ошибка search_project_shifts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 # ============================================================
 # ЭКСПОРТ В CSV
 # ============================================================
@@ -338,40 +422,10 @@ def get_project_statistics(project_id):
 def export_project_csv(project_id):
     """Экспорт смен проекта в CSV"""
     try:
-        # Получаем название проекта
-        async def fetch_project_name():
-            async with aiosqlite.connect('data.db') as db:
-                db.row_factory = aiosqlite.Row
-                async with db.execute(
-                    "SELECT name FROM projects WHERE id = ?",
-                    (project_id,)
-                ) as cursor:
-                    project = await cursor.fetchone()
-                    return project['name'] if project else f"Проект {project_id}"
-        
-        project_name = run_async(fetch_project_name())
-        
-        # Получаем смены
-        async def fetch_shifts():
-            async with aiosqlite.connect('data.db') as db:
-                db.row_factory = aiosqlite.Row
-                async with db.execute("""
-                    SELECT 
-                        s.date,
-                        s.start_time,
-                        s.end_time,
-                        s.total_hours,
-                        s.overtime_hours,
-                        e.total_net,
-                        e.total_gross
-                    FROM shifts s
-                    LEFT JOIN earnings e ON e.shift_id = s.id
-                    WHERE s.project_id = ? AND s.status = 'calculated'
-                    ORDER BY s.date ASC
-                """, (project_id,)) as cursor:
-                    return await cursor.fetchall()
-        
-        shifts = run_async(fetch_shifts())
+        # Название проекта и смены - через пул отчётов (только чтение)
+        project_name, shifts = run_async(get_project_export(project_id))
+        if project_name is None:
+            project_name = f"Проект {project_id}"
         
         # Создаём CSV в памяти
         output = StringIO()
@@ -442,6 +496,166 @@ def export_project_csv(project_id):
         return jsonify({'error': str(e)}), 500
 
 
+# ============================================================
+# ПЕРЕСЧЁТ ПРОЕКТА
+# ============================================================
+
+# Задачи пересчёта: job_id -> состояние (в памяти процесса)
+_recalc_jobs = {}
+_recalc_jobs_lock = threading.Lock()
+
+def _prune_recalc_jobs():
+    """
+    Убрать завершённые задачи старше RECALC_JOB_TTL, а сверх
+    RECALC_JOBS_MAX - самые давние завершённые (идущие не трогаем)
+    """
+    now = time.time()
+    with _recalc_jobs_lock:
+        finished = sorted(
+            (job['finished_at'], job_id)
+            for job_id, job in _recalc_jobs.items()
+            if job['finished_at'] is not None
+        )
+        # + 1 - место под новую задачу
+        excess = len(_recalc_jobs) + 1 - RECALC_JOBS_MAX
+        for n, (finished_at, job_id) in enumerate(finished):
+            if n < excess or now - finished_at > RECALC_JOB_TTL:
+                del _recalc_jobs[job_id]
+
+def _parse_date(value, field: str):
+    """
+    Дата YYYY-MM-DD из тела запроса (None - без границы)
+
+    Raises:
+        ValueError: Не строка или не дата
+    """
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError(f"{field}: нужна дата YYYY-MM-DD, получено {value!r}")
+
+async def _run_recalc_job(job, project_id, date_from, date_to):
+    """Пересчёт в фоновом event loop с обновлением прогресса задачи"""
+    async def progress(done, total):
+        job['done'], job['total'] = done, total
+
+    try:
+        job['result'] = await recalculate_project(project_id, date_from, date_to, progress=progress)
+        job['status'] = 'done'
+    except Exception as e:
+        print(f"❌ Ошибка пересчёта проекта {project_id}: {e}")
+        job['error'] = str(e)
+        job['status'] = 'error'
+    finally:
+        job['finished_at'] = time.time()
+
+
+@app.route('/api/projects/<int:project_id>/recalculate', methods=['POST'])
+def recalculate_project_api(project_id):
+    """
+    Запустить пересчёт смен проекта
+
+    Тело (необязательно): {"date_from": "YYYY-MM-DD", "date_to": "YYYY-MM-DD"}.
+    Возвращает job_id; прогресс - GET /api/recalculations/<job_id>
+    (завершённая задача хранится RECALC_JOB_TTL секунд).
+    """
+    data = request.get_json(silent=True) or {}
+
+    try:
+        date_from = _parse_date(data.get('date_from'), 'date_from')
+        date_to = _parse_date(data.get('date_to'), 'date_to')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if date_from and date_to and date_from > date_to:
+        return jsonify({'error': 'date_from позже date_to'}), 400
+
+    _prune_recalc_jobs()
+
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'project_id': project_id,
+        'status': 'running',
+        'done': 0,
+        'total': None,
+        'result': None,
+        'error': None,
+        'finished_at': None
+    }
+    with _recalc_jobs_lock:
+        _recalc_jobs[job_id] = job
+
+    asyncio.run_coroutine_threadsafe(
+        _run_recalc_job(job, project_id, date_from, date_to),
+        _get_loop()
+    )
+
+    return jsonify(job), 202
+
+
+@app.route('/api/recalculations/<job_id>', methods=['GET'])
+def get_recalculation_api(job_id):
+    """Состояние задачи пересчёта: status (running/done/error), done, total, result"""
+    job = _recalc_jobs.get(job_id)
+
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return jsonify(job)
+
+
+@app.route('/api/projects/<int:project_id>/simulate', methods=['POST'])
+def simulate_project_api(project_id):
+    """
+    Симуляция ставок по сохранённым сменам (без записи в БД)
+
+    Тело: {"scenarios": [{"name": "...", "overrides": {"base_rate_net": ...,
+    "progressive_rates": [{"hours_from", "hours_to", "rate"}]}}],
+    "date_from": "YYYY-MM-DD", "date_to": "YYYY-MM-DD"}.
+    Вместо scenarios можно передать один "overrides".
+    """
+    data = request.get_json(silent=True) or {}
+
+    scenarios = data.get('scenarios')
+    if scenarios is None and 'overrides' in data:
+        scenarios = [{'name': data.get('name'), 'overrides': data['overrides']}]
+
+    if not isinstance(scenarios, list) or not all(
+        isinstance(s, dict) and isinstance(s.get('overrides', {}), dict) for s in scenarios
+    ):
+        return jsonify({'error': 'scenarios: нужен список {"name", "overrides"}'}), 400
+
+    try:
+        result = run_async(simulate_project(
+            project_id, scenarios, data.get('date_from'), data.get('date_to')
+        ))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Ошибка simulate_project: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify(result)
+
+
+# ============================================================
+# ЗАМЕРЫ ВРЕМЕНИ
+# ============================================================
+
+@app.route('/api/timings', methods=['GET'])
+def get_timings_api():
+    """Гистограммы замеров процесса API-сервера (timings.py), ?reset=1 - сбросить после выдачи"""
+    result = timings.snapshot()
+
+    if request.args.get('reset') == '1':
+        timings.reset()
+
+    return jsonify({'enabled': timings.enabled, 'timings': result})
+
+
 # ============================================================
 # ЗАПУСК СЕРВЕРА
 # ============================================================
@@ -457,6 +671,10 @@ if __name__ == '__main__':
     print("   POST /api/projects/<id>/services")
     print("   GET  /api/projects/<id>/statistics")
     print("   GET  /api/projects/<id>/export/csv")
+    print("   POST /api/projects/<id>/recalculate")
+    print("   GET  /api/recalculations/<job_id>")
+    print("   POST /api/projects/<id>/simulate")
+    print("   GET  /api/timings")
     print("\n📁 Статика раздаётся из папки miniapp/")
     print("   /index.html")
     print("   /create-project.html")
@@ -0,0 +1,252 @@
+"""
+Резервные копии базы данных
+
+Онлайн-бэкап через SQLite backup API: страницы копируются небольшими
+шагами в потоке отдельного соединения (только чтение), event loop и
+запись смен ботом при этом не останавливаются. Копия проверяется
+PRAGMA integrity_check, сжимается gzip (по настройке) и только после
+этого появляется в BACKUP_DIR под итоговым именем.
+"""
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from config import (
+    DATABASE_PATH, BACKUP_DIR, BACKUP_INTERVAL, BACKUP_RETENTION,
+    BACKUP_COMPRESS, BACKUP_PAGES_PER_STEP, BACKUP_STEP_SLEEP,
+    BACKUP_MAX_RESTARTS
+)
+from database import open_connection
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX = "data-"
+BACKUP_SUFFIXES = (".db", ".db.gz")
+
+
+class BackupError(Exception):
+    """Копия не создана или не прошла проверку"""
+
+
+class _BackupRestarted(Exception):
+    """Источник слишком часто меняется во время пошагового копирования"""
+
+
+def integrity_check(path: str) -> str:
+    """PRAGMA integrity_check для файла БД ("ok" - копия целая)"""
+    conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+    except sqlite3.DatabaseError as e:
+        # Заголовок или схема повреждены настолько, что проверка не запускается
+        return str(e)
+    finally:
+        conn.close()
+    return "; ".join(row[0] for row in rows)
+
+
+def _gzip(source: str, target: str):
+    with open(source, "rb") as src, gzip.open(target, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def _gunzip(source: str, target: str):
+    with gzip.open(source, "rb") as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+async def _copy(source_path: str, target_path: str, pages: int, sleep: float) -> dict:
+    """
+    Пошаговое копирование source_path -> target_path через backup API
+
+    Запись в источник другим соединением перезапускает копирование с
+    начала. Если это случилось больше BACKUP_MAX_RESTARTS раз, копия
+    снимается за один шаг: в режиме WAL это одна читающая транзакция,
+    писателей она не блокирует.
+    """
+    source = await open_connection(source_path, read_only=True)
+    target = sqlite3.connect(target_path, check_same_thread=False)
+    state = {"remaining": None, "restarts": 0, "steps": 0}
+
+    def progress(status, remaining, total):
+        state["steps"] += 1
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted()
+        state["remaining"] = remaining
+
+    try:
+        try:
+            await source.backup(target, pages=pages, progress=progress, sleep=sleep)
+        except _BackupRestarted:
+            logger.warning(
+                "Бэкап перезапускался %s раз, копируем за один шаг", state["restarts"]
+            )
+            await source.backup(target, pages=-1)
+            state["single_step"] = True
+    finally:
+        target.close()
+        await source.close()
+
+    return state
+
+
+async def create_backup(
+    source_path: str = DATABASE_PATH,
+    backup_dir: str = BACKUP_DIR,
+    compress: bool = BACKUP_COMPRESS,
+    pages: int = BACKUP_PAGES_PER_STEP,
+    sleep: float = BACKUP_STEP_SLEEP
+) -> str:
+    """
+    Создать проверенную резервную копию
+
+    Returns:
+        Путь к копии (data-YYYYmmdd-HHMMSS.db[.gz])
+
+    Raises:
+        BackupError: Копия не прошла integrity_check
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    name = f"{BACKUP_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}.db"
+    final_path = os.path.join(backup_dir, name + (".gz" if compress else ""))
+    # Временные файлы - в той же папке, чтобы rename был атомарным
+    fd, raw_path = tempfile.mkstemp(prefix=".backup-", suffix=".db", dir=backup_dir)
+    os.close(fd)
+
+    try:
+        state = await _copy(source_path, raw_path, pages, sleep)
+
+        result = await asyncio.to_thread(integrity_check, raw_path)
+        if result != "ok":
+            raise BackupError(f"integrity_check копии: {result}")
+
+        if compress:
+            packed_path = raw_path + ".gz"
+            await asyncio.to_thread(_gzip, raw_path, packed_path)
+            os.replace(packed_path, final_path)
+        else:
+            os.replace(raw_path, final_path)
+    finally:
+        for path in (raw_path, raw_path + ".gz"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    logger.info(
+        "Бэкап %s создан за %.2f с (шагов: %s, перезапусков: %s, размер: %s байт)",
+        final_path, time.perf_counter() - started, state["steps"],
+        state["restarts"], os.path.getsize(final_path)
+    )
+    return final_path
+
+
+def list_backups(backup_dir: str = BACKUP_DIR) -> list:
+    """Резервные копии, новые первыми"""
+    if not os.path.isdir(backup_dir):
+        return []
+
+    backups = [
+        os.path.join(backup_dir, name)
+        for name in os.listdir(backup_dir)
+        if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIXES)
+    ]
+    # Имя содержит время создания - сортировка по имени хронологическая
+    return sorted(backups, key=os.path.basename, reverse=True)
+
+
+def apply_retention(backup_dir: str = BACKUP_DIR, keep: int = BACKUP_RETENTION) -> list:
+    """Удалить копии сверх keep самых новых, вернуть удалённые"""
+    removed = list_backups(backup_dir)[max(0, keep):]
+    for path in removed:
+        os.remove(path)
+        logger.info("Бэкап %s удалён (хранится %s копий)", path, keep)
+    return removed
+
+
+async def verify_backup(backup_path: str) -> str:
+    """integrity_check копии (распаковывается во временный файл)"""
+    if not backup_path.endswith(".gz"):
+        return await asyncio.to_thread(integrity_check, backup_path)
+
+    fd, raw_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(_gunzip, backup_path, raw_path)
+        return await asyncio.to_thread(integrity_check, raw_path)
+    finally:
+        os.remove(raw_path)
+
+
+async def restore_backup(backup_path: str, target_path: str = DATABASE_PATH) -> str:
+    """
+    Восстановить БД из копии
+
+    Копия распаковывается и проверяется integrity_check до того, как
+    target_path будет затронут; затем страницы переносятся в target_path
+    через backup API (файл и его -wal остаются согласованными).
+    Бот на время восстановления нужно остановить.
+
+    Returns:
+        Путь восстановленной БД
+
+    Raises:
+        BackupError: Копия повреждена или восстановленная БД не прошла проверку
+    """
+    fd, raw_path = tempfile.mkstemp(
+        prefix=".restore-", suffix=".db",
+        dir=os.path.dirname(os.path.abspath(target_path))
+    )
+    os.close(fd)
+
+    try:
+        if backup_path.endswith(".gz"):
+            await asyncio.to_thread(_gunzip, backup_path, raw_path)
+        else:
+            await asyncio.to_thread(shutil.copyfile, backup_path, raw_path)
+
+        result = await asyncio.to_thread(integrity_check, raw_path)
+        if result != "ok":
+            raise BackupError(f"integrity_check копии {backup_path}: {result}")
+
+        def copy_into_target():
+            source = sqlite3.connect(raw_path)
+            target = sqlite3.connect(target_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+
+        await asyncio.to_thread(copy_into_target)
+    finally:
+        os.remove(raw_path)
+
+    result = await asyncio.to_thread(integrity_check, target_path)
+    if result != "ok":
+        raise BackupError(f"integrity_check после восстановления: {result}")
+
+    logger.info("БД %s восстановлена из %s", target_path, backup_path)
+    return target_path
+
+
+async def backup_loop(interval: int = BACKUP_INTERVAL):
+    """Фоновая задача: бэкап по расписанию и удаление старых копий"""
+    if interval <= 0:
+        return
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await create_backup()
+            apply_retention()
+        except (BackupError, sqlite3.Error, OSError) as e:
+            logger.error("Бэкап не создан: %s", e)
@@ -0,0 +1,538 @@
+"""
+Бенчмарк слоя данных (database.py)
+
+Заполняет временную БД синтетическими пользователями, проектами,
+профессиями и сменами, затем замеряет каждую публичную функцию
+database.py (включая запросы статистики и экспорта api_server.py)
+на нескольких объёмах данных. Результат - JSON-отчёт с p50/p95/p99
+и сравнением с базовым отчётом.
+
+Запуск:
+    python bench_database.py --sizes 10000,100000 --output bench.json
+    python bench_database.py --baseline bench.json   # код 1 при регрессии
+
+Работает на временной БД, data.db не трогает. Объёмы заполняются
+по возрастанию: каждый следующий добирает смены к предыдущему.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+# Временная БД - до импорта config/database
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_db_"), "bench.db")
+os.environ.setdefault("REPORTING_DATABASE_PATH", os.environ["DATABASE_PATH"])
+
+import database
+from database import (
+    init_db, close_pool, init_reporting_pool, close_reporting_pool,
+    start_writer, stop_writer, get_connection, rebuild_period_totals,
+    create_user, get_user, set_contractor_type,
+    create_project, get_user_projects, get_active_project,
+    create_shift, confirm_shift, get_shift, get_shift_details, get_user_shifts,
+    get_shifts_page, get_project_export, search_shifts, delete_shift,
+    persist_confirmed_shift, save_shift_earnings,
+    count_recalc_shifts, iter_recalc_shifts, save_recalculated_shifts,
+    create_profession, get_profession_by_project,
+    add_progressive_rate, get_progressive_rates,
+    add_additional_service, get_additional_services,
+    add_meal_type, get_meal_types, add_shift_meal, get_shift_meals,
+    load_project_snapshot, get_profession_config, get_project_totals,
+    get_stale_shifts, count_stale_shifts, clear_stale_projects,
+    count_calculated_shifts_by_project, save_drift_report, get_drift_report,
+    profession_from_snapshot, PROJECT_SNAPSHOT_SQL
+)
+from profession_config import profession_cache
+
+# Служебные функции, которые не замеряются (жизненный цикл, миграции)
+NOT_BENCHMARKED = {
+    "init_pool", "close_pool", "get_pool_stats", "get_connection", "open_connection",
+    "init_reporting_pool", "close_reporting_pool", "get_reporting_connection",
+    "wal_checkpoint", "wal_checkpoint_loop", "start_writer", "stop_writer",
+    "get_writer_stats", "get_schema_version", "migrate", "init_db", "create_schema",
+    "encode_shift_cursor", "decode_shift_cursor", "rebuild_period_totals",
+    "build_search_query",
+}
+
+SHIFTS_PER_USER = 1000      # смен на синтетического пользователя
+PROJECTS_PER_USER = 2
+HOT_PROJECT_SHARE = 0.1     # доля всех смен в "большом" проекте
+
+EARNINGS = {
+    "base_pay_net": 10000, "base_pay_gross": 11494, "overtime_pay": 1500,
+    "daily_allowance": 1000, "services_pay": 0,
+    "total_net": 12500, "total_gross": 14368,
+    "calculation_details": json.dumps({"base_pay": 10000, "overtime_pay": 1500}),
+    # Рассчитано по текущей версии настроек (иначе все смены устаревшие)
+    "calculated_with_version": 1
+}
+
+
+# === ЗАПОЛНЕНИЕ ===
+
+class Dataset:
+    """Синтетические данные: пользователи, проекты, конфигурация, смены"""
+
+    def __init__(self, seed: int = 42):
+        self.random = random.Random(seed)
+        self.users = []
+        self.projects = []
+        self.professions = {}   # project_id -> profession_id
+        self.meal_types = {}    # project_id -> [meal_type_id]
+        self.hot_project = None
+        self.shift_count = 0
+        self.next_user_id = 1_000_000
+
+    async def add_user(self):
+        """Пользователь с проектами и полной конфигурацией профессии"""
+        user_id = self.next_user_id
+        self.next_user_id += 1
+        await create_user(user_id, f"bench_{user_id}")
+        self.users.append(user_id)
+
+        for n in range(PROJECTS_PER_USER):
+            project_id = await create_project(user_id, f"Проект {user_id}-{n}", "")
+            profession_id = await create_profession(
+                project_id=project_id,
+                position="Оператор",
+                base_rate_net=10000,
+                tax_percentage=13,
+                base_overtime_rate=500,
+                daily_allowance=1000,
+                overtime_rounding=0.5,
+                overtime_threshold=0.25
+            )
+            for i in range(5):
+                hours_to = (i + 1) * 2 if i < 4 else None
+                await add_progressive_rate(profession_id, i * 2, hours_to, 500 + i * 100, i + 1)
+            for i in range(10):
+                await add_additional_service(profession_id, f"услуга {i}", 1000 + i * 100, 'on_mention', 15, '[]')
+            self.meal_types[project_id] = [
+                await add_meal_type(profession_id, name, 1.0, '[]')
+                for name in ("текущий обед", "поздний обед", "ужин")
+            ]
+
+            self.projects.append(project_id)
+            self.professions[project_id] = profession_id
+
+        if self.hot_project is None:
+            self.hot_project = self.projects[0]
+
+    def _shift_rows(self, count: int, first_id: int):
+        """Строки shifts/earnings/shift_meals пачкой"""
+        start = date(2020, 1, 1)
+        shifts, earnings, meals = [], [], []
+
+        for shift_id in range(first_id, first_id + count):
+            if self.random.random() < HOT_PROJECT_SHARE:
+                project_id = self.hot_project
+            else:
+                project_id = self.random.choice(self.projects)
+
+            day = start + timedelta(days=self.random.randrange(365 * 6))
+            hours = self.random.choice((10.0, 12.0, 13.5, 15.0))
+            overtime = max(0.0, hours - 12)
+            calculated = self.random.random() < 0.9
+
+            shifts.append((
+                shift_id, project_id, day.isoformat(), "09:00", "21:00", hours, overtime,
+                "смена 9-21", "{}", "calculated" if calculated else "confirmed"
+            ))
+            if calculated:
+                earnings.append((shift_id, *EARNINGS.values()))
+            if self.random.random() < 0.3:
+                meals.append((shift_id, self.random.choice(self.meal_types[project_id])))
+
+        return shifts, earnings, meals
+
+    async def grow_to(self, size: int, chunk: int = 50_000):
+        """Добрать данные до size смен"""
+        users_needed = max(1, size // SHIFTS_PER_USER)
+        while len(self.users) < users_needed:
+            await self.add_user()
+
+        async with get_connection() as db:
+            async with db.execute("SELECT COALESCE(MAX(id), 0) FROM shifts") as cursor:
+                next_id = (await cursor.fetchone())[0] + 1
+
+            while self.shift_count < size:
+                count = min(chunk, size - self.shift_count)
+                shifts, earnings, meals = self._shift_rows(count, next_id)
+
+                await db.executemany("""
+                    INSERT INTO shifts (
+                        id, project_id, date, start_time, end_time, total_hours,
+                        overtime_hours, original_message, parsed_data, status
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, shifts)
+                await db.executemany("""
+                    INSERT INTO earnings (
+                        shift_id, base_pay_net, base_pay_gross, overtime_pay,
+                        daily_allowance, services_pay, total_net, total_gross,
+                        calculation_details, calculated_with_version
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, earnings)
+                await db.executemany(
+                    "INSERT INTO shift_meals (shift_id, meal_type_id) VALUES (?, ?)", meals
+                )
+                await db.commit()
+
+                next_id += count
+                self.shift_count += count
+
+            await db.execute("ANALYZE")
+            await db.commit()
+
+        # Агрегаты заполнялись в обход database.py - перестраиваем
+        await rebuild_period_totals(fix=True)
+
+
+# === ЗАМЕРЫ ===
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def summarize(timings: list) -> dict:
+    timings = sorted(timings)
+    return {
+        "n": len(timings),
+        "mean_ms": round(sum(timings) / len(timings), 4),
+        "p50_ms": round(percentile(timings, 50), 4),
+        "p95_ms": round(percentile(timings, 95), 4),
+        "p99_ms": round(percentile(timings, 99), 4),
+        "max_ms": round(timings[-1], 4),
+    }
+
+
+async def measure(factory, iterations: int, warmup: int = 3) -> dict:
+    for _ in range(min(warmup, iterations)):
+        await factory()
+
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await factory()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+
+def cases(data: Dataset):
+    """
+    Замеряемые вызовы: имя -> (фабрика корутины, доля итераций)
+
+    Для "тяжёлых" функций (экспорт всего проекта) итераций меньше.
+    """
+    rnd = random.Random(7)
+    project_id = data.hot_project
+    profession_id = data.professions[project_id]
+    user_id = data.users[0]
+    meal_type_id = data.meal_types[project_id][0]
+    state = {}
+
+    def random_shift_id():
+        return rnd.randint(1, data.shift_count)
+
+    async def deep_page():
+        # Страница из середины ленты: курсор от предыдущих страниц
+        cursor = state.get("cursor")
+        shifts, cursor = await get_shifts_page(project_id, limit=50, cursor=cursor)
+        state["cursor"] = cursor
+
+    async def cached_config():
+        await get_profession_config(project_id)
+
+    async def uncached_config():
+        profession_cache.invalidate(project_id)
+        await get_profession_config(project_id)
+
+    async def create_and_delete_shift():
+        shift_id = await create_shift(project_id, "2026-01-15", "09:00", "21:00", 12, "bench", "{}")
+        await delete_shift(shift_id)
+
+    async def confirm_random():
+        await confirm_shift(state.setdefault("draft", await create_shift(
+            project_id, "2026-01-16", "09:00", "21:00", 12, "bench", "{}"
+        )))
+
+    async def persist_and_delete():
+        shift_id = await persist_confirmed_shift(
+            project_id, "2026-01-17", "09:00", "22:00", 13, "bench", "{}",
+            overtime_hours=1, meal_type_ids=[meal_type_id], earnings=EARNINGS
+        )
+        await delete_shift(shift_id)
+
+    async def save_earnings():
+        shift_id = state.setdefault("calc", await create_shift(
+            project_id, "2026-01-18", "09:00", "21:00", 12, "bench", "{}"
+        ))
+        await save_shift_earnings(shift_id, 1.5, EARNINGS)
+
+    async def add_meal():
+        shift_id = state.setdefault("meal", await create_shift(
+            project_id, "2026-01-19", "09:00", "21:00", 12, "bench", "{}"
+        ))
+        await add_shift_meal(shift_id, meal_type_id)
+
+    async def iter_recalc():
+        async for _ in iter_recalc_shifts(project_id):
+            pass
+
+    async def save_recalculated():
+        # 50 своих смен: пересчёт не трогает заработок остальных
+        if "recalc" not in state:
+            state["recalc"] = [
+                await create_shift(project_id, "2026-01-20", "09:00", "22:00", 13, "bench", "{}")
+                for _ in range(50)
+            ]
+        await save_recalculated_shifts([(shift_id, 1.5, EARNINGS) for shift_id in state["recalc"]])
+
+    async def scratch_profession():
+        # Отдельная профессия: запись настроек не меняет замеряемый проект
+        if "profession" not in state:
+            scratch_project = await create_project(user_id, "Бенчмарк: настройки", "")
+            state["profession"] = await create_profession(scratch_project, "Тест", 10000, 13)
+        return state["profession"]
+
+    async def add_rate():
+        # Ступени подряд: шкала проверяется на разрывы и пересечения
+        n = state["rates"] = state.get("rates", 0) + 1
+        await add_progressive_rate(await scratch_profession(), (n - 1) * 2, n * 2, 500, n)
+
+    async def add_service():
+        await add_additional_service(await scratch_profession(), "услуга", 1000)
+
+    async def add_meal_type_case():
+        await add_meal_type(await scratch_profession(), "обед", 1.0)
+
+    async def snapshot_to_config():
+        # Только разбор строки: сам запрос замеряет load_project_snapshot
+        if "snapshot" not in state:
+            async with get_connection() as db:
+                async with db.execute(PROJECT_SNAPSHOT_SQL, (project_id,)) as cursor:
+                    state["snapshot"] = await cursor.fetchone()
+        profession_from_snapshot(state["snapshot"])
+
+    async def save_drift():
+        # 50 расхождений, старые прогоны сверх NIGHTLY_KEEP_RUNS удаляются
+        run = {
+            "run_id": uuid.uuid4().hex, "workers": 1, "projects": 1,
+            "shifts": data.shift_count, "drifted": 50, "seconds": 1.0
+        }
+        drift = [
+            (project_id, shift_id, 1000, 1100, 1150, 1265, 1.0, 1.5)
+            for shift_id in rnd.sample(range(1, data.shift_count + 1), 50)
+        ]
+        await save_drift_report(run, drift)
+
+    async def new_profession():
+        scratch_project = state.setdefault("profession_project", await create_project(user_id, "Бенчмарк: профессии", ""))
+        await create_profession(scratch_project, "Тест", 10000, 13)
+
+    return {
+        # Пользователи и проекты
+        "create_user": (lambda: create_user(rnd.randint(1, 10**9), "bench"), 1.0),
+        "get_user": (lambda: get_user(rnd.choice(data.users)), 1.0),
+        "set_contractor_type": (lambda: set_contractor_type(user_id, "crew"), 1.0),
+        "create_project": (lambda: create_project(user_id, "Бенчмарк", ""), 1.0),
+        "get_user_projects": (lambda: get_user_projects(rnd.choice(data.users)), 1.0),
+        "get_active_project": (lambda: get_active_project(rnd.choice(data.users)), 1.0),
+
+        # Смены
+        "create_shift+delete_shift": (create_and_delete_shift, 1.0),
+        "confirm_shift": (confirm_random, 1.0),
+        "get_shift": (lambda: get_shift(random_shift_id()), 1.0),
+        "get_shift_details": (lambda: get_shift_details(random_shift_id()), 1.0),
+        "get_user_shifts": (lambda: get_user_shifts(project_id), 1.0),
+        "persist_confirmed_shift+delete_shift": (persist_and_delete, 1.0),
+        "save_shift_earnings": (save_earnings, 1.0),
+        "add_shift_meal": (add_meal, 1.0),
+        "get_shift_meals": (lambda: get_shift_meals(random_shift_id()), 1.0),
+
+        # Массовый пересчёт проекта
+        "count_recalc_shifts": (lambda: count_recalc_shifts(project_id), 1.0),
+        "iter_recalc_shifts": (iter_recalc, 0.05),
+        "save_recalculated_shifts: 50 смен": (save_recalculated, 0.25),
+
+        # Устаревшие расчёты (фоновый пересчёт, статистика)
+        "get_stale_shifts": (lambda: get_stale_shifts(), 1.0),
+        "count_stale_shifts": (lambda: count_stale_shifts(), 1.0),
+        "count_stale_shifts: проект, reporting": (lambda: count_stale_shifts(project_id, reporting=True), 1.0),
+        "clear_stale_projects": (clear_stale_projects, 1.0),
+
+        # Ночная сверка (nightly_recompute.py)
+        "count_calculated_shifts_by_project": (count_calculated_shifts_by_project, 0.05),
+        "save_drift_report: 50 расхождений": (save_drift, 0.25),
+        "get_drift_report": (get_drift_report, 1.0),
+
+        # Статистика и экспорт (api_server.py)
+        "get_shifts_page: первая страница": (lambda: get_shifts_page(project_id, limit=50), 1.0),
+        "get_shifts_page: по курсору": (deep_page, 1.0),
+        "get_shifts_page: reporting": (lambda: get_shifts_page(project_id, limit=50, reporting=True), 1.0),
+        "get_project_totals": (lambda: get_project_totals(project_id), 1.0),
+        "get_project_totals: reporting": (lambda: get_project_totals(project_id, reporting=True), 1.0),
+        "get_project_export": (lambda: get_project_export(project_id), 0.05),
+        "search_shifts": (lambda: search_shifts(project_id, "смена", reporting=True), 0.25),
+
+        # Конфигурация профессии
+        "create_profession": (new_profession, 1.0),
+        "get_profession_by_project": (lambda: get_profession_by_project(project_id), 1.0),
+        "add_progressive_rate": (add_rate, 1.0),
+        "get_progressive_rates": (lambda: get_progressive_rates(profession_id), 1.0),
+        "add_additional_service": (add_service, 1.0),
+        "get_additional_services": (lambda: get_additional_services(profession_id), 1.0),
+        "add_meal_type": (add_meal_type_case, 1.0),
+        "get_meal_types": (lambda: get_meal_types(profession_id), 1.0),
+        "load_project_snapshot": (lambda: load_project_snapshot(project_id), 1.0),
+        "profession_from_snapshot": (snapshot_to_config, 1.0),
+        "get_profession_config: кэш": (cached_config, 1.0),
+        "get_profession_config: промах": (uncached_config, 1.0),
+    }
+
+
+def check_coverage(names) -> list:
+    """Публичные функции database.py без замера"""
+    covered = {part.split(":")[0].strip() for name in names for part in name.split("+")}
+    public = {
+        name for name, obj in vars(database).items()
+        if not name.startswith("_") and callable(obj)
+        and getattr(obj, "__module__", None) == "database"
+        and not isinstance(obj, type)
+    }
+    return sorted(public - covered - NOT_BENCHMARKED)
+
+
+async def bench_size(data: Dataset, size: int, iterations: int) -> dict:
+    started = time.perf_counter()
+    await data.grow_to(size)
+    print(f"\n📦 {size} смен (заполнение {time.perf_counter() - started:.1f} с)")
+
+    results = {}
+    for name, (factory, share) in cases(data).items():
+        stats = await measure(factory, max(3, int(iterations * share)))
+        results[name] = stats
+        print(f"  {name:<40} p50 {stats['p50_ms']:8.3f}  p95 {stats['p95_ms']:8.3f}  p99 {stats['p99_ms']:8.3f} мс")
+    return results
+
+
+# === ОТЧЁТ ===
+
+def compare(report: dict, baseline: dict, threshold: float, min_delta_ms: float) -> list:
+    """
+    Сравнение с базовым отчётом по p95
+
+    Регрессия - p95 вырос больше чем в threshold раз и больше чем на
+    min_delta_ms (микросекундные замеры слишком шумные для одного отношения)
+
+    Returns:
+        Список регрессий: {size, name, baseline_p95_ms, p95_ms, ratio}
+    """
+    regressions = []
+    for size, results in report["results"].items():
+        base_results = baseline.get("results", {}).get(size, {})
+        for name, stats in results.items():
+            base = base_results.get(name)
+            if not base or not base["p95_ms"]:
+                continue
+
+            ratio = stats["p95_ms"] / base["p95_ms"]
+            stats["baseline_p95_ms"] = base["p95_ms"]
+            stats["ratio"] = round(ratio, 3)
+            if ratio > threshold and stats["p95_ms"] - base["p95_ms"] > min_delta_ms:
+                regressions.append({
+                    "size": size, "name": name,
+                    "baseline_p95_ms": base["p95_ms"], "p95_ms": stats["p95_ms"],
+                    "ratio": round(ratio, 3)
+                })
+    return regressions
+
+
+async def main(args) -> dict:
+    await init_db()
+    await init_reporting_pool()
+    if args.writer:
+        await start_writer()
+
+    data = Dataset()
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "writer": args.writer,
+        },
+        "results": {}
+    }
+
+    try:
+        for size in sorted(args.sizes):
+            report["results"][str(size)] = await bench_size(data, size, args.iterations)
+
+        # Новая публичная функция без замера - видно в отчёте
+        report["not_benchmarked"] = check_coverage(cases(data).keys())
+        if report["not_benchmarked"]:
+            print(f"\n⚠️ Без замера: {', '.join(report['not_benchmarked'])}")
+    finally:
+        if args.writer:
+            await stop_writer()
+        await close_reporting_pool()
+        await close_pool()
+
+    return report
+
+
+def parse_sizes(value: str) -> list:
+    return [int(v.replace("_", "")) for v in value.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк слоя данных (database.py)")
+    parser.add_argument("--sizes", type=parse_sizes, default=[10_000],
+                        help="Объёмы смен через запятую, например 10000,100000,1000000")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--writer", action="store_true",
+                        help="Записи через очередь записи (как в боте)")
+    parser.add_argument("--output", help="Куда сохранить JSON-отчёт")
+    parser.add_argument("--baseline", help="Базовый JSON-отчёт для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Регрессия: p95 больше базового в N раз")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="И больше базового хотя бы на столько мс")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report, baseline, args.threshold, args.min_delta_ms)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Отчёт: {args.output}")
+    else:
+        print(json.dumps(report["meta"], ensure_ascii=False))
+
+    regressions = report.get("regressions", [])
+    if regressions:
+        print(f"\n❌ Регрессии (p95 > x{args.threshold}):")
+        for r in regressions:
+            print(f"   {r['size']} / {r['name']}: {r['baseline_p95_ms']} → {r['p95_ms']} мс (x{r['ratio']})")
+        sys.exit(1)
+    elif args.baseline:
+        print("\n✅ Регрессий нет")
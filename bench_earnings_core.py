@@ -0,0 +1,138 @@
+"""
+Бенчмарк ядра расчёта (earnings_core.compute) без БД
+Конфигурация профессии собирается в памяти, замеряется только расчёт.
+Для пачки смен - сравнение с векторизованным расчётом (earnings_vectorized)
+
+Запуск: python bench_earnings_core.py [--iterations 20000] [--batch 50000]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from earnings_core import ShiftInput, compute
+from earnings_memo import EarningsMemo
+from earnings_vectorized import HAS_NUMPY, compute_many, compute_arrays, shift_arrays
+from profession_config import (
+    ProfessionConfig, ProgressiveRate, AdditionalService, MealType
+)
+
+
+def make_profession() -> ProfessionConfig:
+    """Типичная конфигурация: 5 ставок, 10 услуг, 4 обеда"""
+    return ProfessionConfig(
+        id=1,
+        project_id=1,
+        position="Оператор",
+        base_rate_net=10000,
+        base_rate_gross=11494,
+        tax_percentage=13,
+        base_shift_hours=12,
+        base_overtime_rate=500,
+        daily_allowance=1000,
+        break_hours=0,
+        payment_schedule="",
+        conditions="",
+        overtime_rounding=0.5,
+        overtime_threshold=0.25,
+        created_at="",
+        progressive_rates=tuple(
+            ProgressiveRate(i + 1, 1, i * 2, (i + 1) * 2 if i < 4 else None, 500 + i * 100, i + 1)
+            for i in range(5)
+        ),
+        services=tuple(
+            AdditionalService(i + 1, 1, f"услуга {i}", 1000 + i * 100, 15, 'on_mention', None, '[]')
+            for i in range(10)
+        ),
+        meal_types=tuple(
+            MealType(i + 1, 1, name, 1.0, '[]')
+            for i, name in enumerate(("текущий обед", "поздний обед", "ужин", "завтрак"))
+        )
+    )
+
+
+SHIFTS = {
+    "без переработки": ShiftInput(total_hours=12),
+    "переработка 5.5ч": ShiftInput(total_hours=17.5),
+    "обеды + услуги": ShiftInput(
+        total_hours=16,
+        meals=("текущий обед", "поздний обед"),
+        services=("услуга 3", "услуга 7"),
+        is_expense_day=True
+    ),
+}
+
+
+def measure(profession, shift, iterations: int, func=compute) -> list:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func(profession, shift)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return timings
+
+
+def report(name: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"  {name:<24} median {statistics.median(timings):8.2f} мкс   p95 {p95:8.2f} мкс")
+
+
+def timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) * 1000
+
+
+def bench_batch(profession, size: int):
+    """Пачка смен: earnings_core по одной против earnings_vectorized"""
+    rnd = random.Random(1)
+    shifts = [
+        ShiftInput(
+            total_hours=rnd.randint(8 * 60, 20 * 60) / 60,
+            meals=("текущий обед",) if rnd.random() < 0.3 else (),
+            services=("услуга 3",) if rnd.random() < 0.1 else (),
+            is_expense_day=rnd.random() < 0.2
+        )
+        for _ in range(size)
+    ]
+
+    print(f"\n⏱ Пачка из {size} смен\n")
+    scalar = timed(lambda: [compute(profession, shift) for shift in shifts])
+    print(f"  {'earnings_core (по одной)':<32} {scalar:9.1f} мс")
+
+    if not HAS_NUMPY:
+        print("  ⚠️ NumPy не установлен - векторизованный расчёт не замерен")
+        return
+
+    vectorized = timed(lambda: compute_many(profession, shifts))
+    print(f"  {'compute_many':<32} {vectorized:9.1f} мс   x{scalar / vectorized:.1f}")
+
+    arrays = shift_arrays(profession, shifts)
+    math_only = timed(lambda: compute_arrays(profession, **arrays))
+    print(f"  {'compute_arrays (только расчёт)':<32} {math_only:9.1f} мс   x{scalar / math_only:.1f}")
+
+
+def main(iterations: int, batch: int):
+    profession = make_profession()
+
+    print(f"⏱ earnings_core.compute, {iterations} итераций\n")
+    for name, shift in SHIFTS.items():
+        report(name, measure(profession, shift, iterations))
+
+    # Повторная форма смены: результат из earnings_memo
+    memo = EarningsMemo()
+    report("обеды + услуги (кэш)", measure(profession, SHIFTS["обеды + услуги"], iterations, memo.compute))
+
+    if batch > 0:
+        bench_batch(profession, batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=50000,
+                        help="Смен в пачке для сравнения с NumPy (0 - не сравнивать)")
+    args = parser.parse_args()
+
+    main(args.iterations, args.batch)
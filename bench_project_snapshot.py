@@ -0,0 +1,129 @@
+"""
+Бенчмарк загрузки конфигурации проекта
+Сравнивает load_project_snapshot (один SQL-запрос) с прежним путём
+из четырёх вызовов: профессия, ставки, услуги, обеды.
+Оба пути делают одинаковую работу: сначала только SQL (строки из БД),
+затем полностью - до готового ProfessionConfig.
+
+Запуск: python bench_project_snapshot.py [--iterations 500]
+Работает на временной БД, data.db не трогает.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+# Временная БД - до импорта config/database
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_snapshot_"), "bench.db")
+
+from database import (
+    init_db, close_pool, create_user, create_project, create_profession,
+    add_progressive_rate, add_additional_service, add_meal_type,
+    get_profession_by_project, get_progressive_rates,
+    get_additional_services, get_meal_types, get_connection,
+    load_project_snapshot, PROJECT_SNAPSHOT_SQL
+)
+from profession_config import ProfessionConfig
+
+
+async def seed() -> int:
+    """Проект с типичной конфигурацией: 5 ставок, 10 услуг, 4 обеда"""
+    await create_user(1, "bench")
+    project_id = await create_project(1, "Бенчмарк", "")
+    profession_id = await create_profession(
+        project_id=project_id,
+        position="Оператор",
+        base_rate_net=10000,
+        tax_percentage=13,
+        base_overtime_rate=500,
+        daily_allowance=1000,
+        overtime_rounding=0.5,
+        overtime_threshold=0.25
+    )
+
+    for i in range(5):
+        hours_to = (i + 1) * 2 if i < 4 else None
+        await add_progressive_rate(profession_id, i * 2, hours_to, 500 + i * 100, i + 1)
+
+    for i in range(10):
+        await add_additional_service(profession_id, f"услуга {i}", 1000 + i * 100, 'on_mention', 15, '[]')
+
+    for name in ("текущий обед", "поздний обед", "ужин", "завтрак"):
+        await add_meal_type(profession_id, name, 1.0, '[]')
+
+    return project_id
+
+
+async def four_queries(project_id: int):
+    """Прежний путь get_project_details: четыре отдельных запроса"""
+    profession = await get_profession_by_project(project_id)
+    return (
+        profession,
+        await get_progressive_rates(profession["id"]),
+        await get_additional_services(profession["id"]),
+        await get_meal_types(profession["id"])
+    )
+
+
+async def four_queries_config(project_id: int):
+    """Четыре запроса и сборка ProfessionConfig (работа load_project_snapshot)"""
+    profession, rates, services, meals = await four_queries(project_id)
+    return ProfessionConfig.from_rows(profession, rates, services, meals)
+
+
+async def snapshot_query(project_id: int):
+    """Только PROJECT_SNAPSHOT_SQL, без разбора JSON и сборки конфигурации"""
+    async with get_connection() as db:
+        async with db.execute(PROJECT_SNAPSHOT_SQL, (project_id,)) as cursor:
+            return await cursor.fetchone()
+
+
+async def measure_async(coro_factory, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await coro_factory()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"  {name:<34} median {statistics.median(timings):8.3f} мс   p95 {p95:8.3f} мс")
+    return statistics.median(timings)
+
+
+async def compare(iterations: int, old_name: str, old_factory, new_name: str, new_factory):
+    """Два пути с одинаковым результатом"""
+    old = report(old_name, await measure_async(old_factory, iterations))
+    new = report(new_name, await measure_async(new_factory, iterations))
+    print(f"  Ускорение: x{old / new:.1f}\n")
+
+
+async def main(iterations: int):
+    await init_db()
+    project_id = await seed()
+
+    print(f"⏱ Загрузка конфигурации проекта, {iterations} итераций\n")
+    await compare(
+        iterations,
+        "4 запроса (только SQL)", lambda: four_queries(project_id),
+        "snapshot (только SQL)", lambda: snapshot_query(project_id)
+    )
+    await compare(
+        iterations,
+        "4 запроса + ProfessionConfig", lambda: four_queries_config(project_id),
+        "load_project_snapshot", lambda: load_project_snapshot(project_id)
+    )
+    await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.iterations))
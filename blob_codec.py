@@ -0,0 +1,106 @@
+"""
+Компактное хранение JSON-блобов (shifts.parsed_data, earnings.calculation_details)
+
+Формат определяется первым байтом значения:
+    TEXT          - старый формат: JSON-текст как есть
+    BLOB 0x01 ... - компактный JSON (без пробелов, UTF-8), сжатый zlib
+                    с предустановленным словарём ZDICT_V1
+
+Словарь зафиксирован для версии формата: менять его можно только
+вместе с новым байтом версии (старые значения должны читаться).
+"""
+import json
+import zlib
+
+FORMAT_ZLIB_V1 = 1
+
+# Частые фрагменты наших JSON (ответ парсера, детали расчёта).
+# zlib дешевле ссылается на конец словаря - самое частое в конце.
+ZDICT_V1 = (
+    '{"bracket":"базовая","hours":'
+    '"missing_fields":[],"confidence":0.95}'
+    '{"date":"2025-01-01","start_time":"07:00","end_time":"23:00",'
+    '"services":["ронин"],"meals":["текущий обед","поздний обед"],'
+    '"services":[],"meals":[],"missing_fields":["start_time","end_time"],'
+    '"confidence":0.9,'
+    '{"name":"текущий обед","adds_hours":1.0,"rate_net":'
+    '{"name":"поздний обед","adds_hours":1.0,"rate_net":'
+    '{"name":"ронин","cost_net":,"cost_gross":,"tax":13}'
+    '"rate_gross":,"total_net":,"total_gross":}'
+    '{"bracket":"0-2ч","hours":2.0,"rate_net":'
+    '{"base_hours":12,"total_hours":12.0,"base_overtime_hours":0.0,'
+    '"meal_hours":1.0,"total_overtime_hours":0.0,'
+    '"breakdown":{"base_pay":{"net":,"gross":},'
+    '"overtime":[],"meals":[],"daily_allowance":0,"services":[]}}'
+).encode("utf-8")
+
+_ZLIB_LEVEL = 9
+
+
+class CodecError(ValueError):
+    """Значение не удаётся декодировать (неизвестная версия формата или повреждено)"""
+
+
+def _compact_json(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode(value):
+    """
+    Значение для записи в БД
+
+    Args:
+        value: dict/list или JSON-текст (None - None)
+
+    Returns:
+        bytes в формате FORMAT_ZLIB_V1; текст, который не является
+        JSON, сохраняется как есть
+    """
+    if value is None:
+        return None
+
+    if isinstance(value, (bytes, bytearray)):
+        # Уже закодировано
+        return bytes(value)
+
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return value
+
+    compressor = zlib.compressobj(_ZLIB_LEVEL, zlib.DEFLATED, -15, zdict=ZDICT_V1)
+    packed = compressor.compress(_compact_json(value)) + compressor.flush()
+    return bytes((FORMAT_ZLIB_V1,)) + packed
+
+
+def decode(value):
+    """
+    Значение из БД -> объект Python
+
+    Понимает все форматы: старый JSON-текст, FORMAT_ZLIB_V1, а также
+    уже декодированные dict/list (возвращаются как есть).
+
+    Raises:
+        CodecError: Неизвестная версия формата или повреждённые данные
+    """
+    if value is None or isinstance(value, (dict, list)):
+        return value
+
+    if isinstance(value, str):
+        return json.loads(value) if value else None
+
+    value = bytes(value)
+    if not value:
+        return None
+
+    version = value[0]
+    if version == FORMAT_ZLIB_V1:
+        try:
+            decompressor = zlib.decompressobj(-15, zdict=ZDICT_V1)
+            raw = decompressor.decompress(value[1:]) + decompressor.flush()
+        except zlib.error as e:
+            raise CodecError(f"Повреждённый блоб (формат {version}): {e}")
+        return json.loads(raw)
+
+    raise CodecError(f"Неизвестная версия формата блоба: {version}")
@@ -10,8 +10,12 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import Update
 
 from config import BOT_TOKEN
-from database import init_db
-from handlers import miniapp, start, projects, shifts
+from backup import backup_loop
+from calculator import stale_recompute_loop
+from database import init_db, close_pool, start_writer, stop_writer, wal_checkpoint_loop
+from earnings_memo import earnings_memo
+from handlers import miniapp, start, projects, shifts, diagnostics
+from timings import timings
 
 # Настройка логирования
 logging.basicConfig(
@@ -21,9 +25,21 @@ logging.basicConfig(
 
 async def main():
     """Запуск бота"""
-    # Инициализация БД
+    # Инициализация БД (открывает пул соединений)
     await init_db()
     
+    # Все записи бота - через одну очередь (групповой commit)
+    await start_writer()
+    
+    # Фоновый WAL checkpoint
+    checkpoint_task = asyncio.create_task(wal_checkpoint_loop())
+    
+    # Резервные копии по расписанию (онлайн, без остановки записи)
+    backup_task = asyncio.create_task(backup_loop())
+    
+    # Пересчёт смен, устаревших после изменения настроек профессий
+    stale_task = asyncio.create_task(stale_recompute_loop())
+    
     # Создание бота
     bot = Bot(token=BOT_TOKEN, parse_mode=ParseMode.HTML)
     
@@ -63,11 +79,26 @@ async def main():
     dp.include_router(start.router)    # Потом start
     dp.include_router(projects.router)
     dp.include_router(shifts.router)
+    dp.include_router(diagnostics.router)
     
     # Запуск бота
     logging.info("🚀 Бот запущен с отладочным middleware!")
     logging.info("📍 Все апдейты будут логироваться БЕЗ блокировки обработчиков")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        tasks = (checkpoint_task, backup_task, stale_task)
+        for task in tasks:
+            task.cancel()
+        # Ждём остановки фоновых задач: их записи и чтения не должны
+        # идти после остановки очереди и закрытия пула
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Дописываем очередь записи до закрытия пула
+        await stop_writer()
+        # Закрываем пул соединений (в лог уходит статистика пула)
+        await close_pool()
+        logging.info("Кэш расчётов смен, статистика: %s", earnings_memo.stats())
+        logging.info("Замеры времени, мс:\n%s", timings.dump())
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -2,16 +2,35 @@
 Расчёт заработка по смене
 Статус: ✅ Шаг 6.1 - Обеды добавляют +1 час БАЗОВОЙ переработки
 """
+import asyncio
+import logging
+import time
+
+from config import (
+    SIMULATION_MAX_SCENARIOS, STALE_RECOMPUTE_BATCH, STALE_RECOMPUTE_INTERVAL,
+    STALE_RECOMPUTE_PAUSE
+)
 from database import (
-    get_profession_by_project, 
-    get_progressive_rates, 
-    get_additional_services,
-    get_meal_types,
-    get_shift_meals
+    clear_stale_projects,
+    count_recalc_shifts,
+    count_stale_shifts,
+    get_profession_config,
+    get_shift,
+    get_shift_meals,
+    get_stale_shifts,
+    iter_recalc_shifts,
+    persist_confirmed_shift,
+    save_recalculated_shifts,
+    save_shift_earnings
 )
-import aiosqlite
-from config import DATABASE_PATH
-import json
+from earnings_core import ShiftInput, match_meals
+from earnings_memo import compute_cached
+from earnings_vectorized import compute_many
+from profession_config import MealType, from_row, profession_cache
+from timings import timed
+import blob_codec
+
+logger = logging.getLogger(__name__)
 
 async def calculate_shift_earnings(shift_id: int, project_id: int):
     """
@@ -24,266 +43,427 @@ async def calculate_shift_earnings(shift_id: int, project_id: int):
     Returns:
         tuple: (calculation_details, total_net, total_gross)
     """
-    # 1. Получаем данные смены
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM shifts WHERE id = ?",
-            (shift_id,)
-        ) as cursor:
-            shift = await cursor.fetchone()
+    with timed("calc.calculate_shift_earnings"):
+        # 1. Получаем данные смены
+        with timed("calc.load_shift"):
+            shift = await get_shift(shift_id)
+        
+        if shift is None:
+            raise ValueError(f"Смена с ID {shift_id} не найдена")
+        
+        with timed("calc.load_meals"):
+            shift_meals = await get_shift_meals(shift_id)
+        
+        calculation = await compute_earnings(
+            project_id=project_id,
+            total_hours=shift["total_hours"],
+            parsed_data=shift["parsed_data"],
+            is_expense_day=shift["is_expense_day"],
+            shift_meals=shift_meals
+        )
+        
+        # Переработка, earnings и статус - одной транзакцией
+        with timed("calc.save"):
+            await save_shift_earnings(
+                shift_id=shift_id,
+                overtime_hours=calculation["overtime_hours"],
+                earnings=calculation["earnings"]
+            )
     
-    if shift is None:
-        raise ValueError(f"Смена с ID {shift_id} не найдена")
+    return calculation["details"], calculation["total_net"], calculation["total_gross"]
+
+
+async def save_confirmed_shift(
+    project_id: int,
+    date: str,
+    start_time: str,
+    end_time: str,
+    total_hours: float,
+    original_message: str,
+    parsed_data: str
+):
+    """
+    Расчёт и сохранение новой подтверждённой смены
     
-    # 2. Получаем настройки профессии
-    profession = await get_profession_by_project(project_id)
+    Смена, её обеды, услуги, заработок и статус пишутся одной
+    транзакцией. Если расчёт не удался, смена сохраняется со статусом
+    'confirmed' без заработка, но с обедами из сообщения.
+    
+    Returns:
+        tuple: (shift_id, calculation или None, ошибка расчёта или None)
+    """
+    try:
+        calculation = await compute_earnings(
+            project_id=project_id,
+            total_hours=total_hours,
+            parsed_data=parsed_data
+        )
+        error = None
+    except Exception as e:
+        calculation, error = None, e
+    
+    if calculation is not None:
+        meal_type_ids = calculation["meal_type_ids"]
+    else:
+        meal_type_ids = await match_shift_meals(project_id, total_hours, parsed_data)
+    
+    with timed("calc.save"):
+        shift_id = await persist_confirmed_shift(
+            project_id=project_id,
+            date=date,
+            start_time=start_time,
+            end_time=end_time,
+            total_hours=total_hours,
+            original_message=original_message,
+            parsed_data=parsed_data,
+            overtime_hours=calculation["overtime_hours"] if calculation else 0,
+            meal_type_ids=meal_type_ids,
+            service_ids=calculation["service_ids"] if calculation else (),
+            earnings=calculation["earnings"] if calculation else None
+        )
+    
+    return shift_id, calculation, error
+
+
+async def match_shift_meals(project_id: int, total_hours: float, parsed_data: str = None) -> list:
+    """
+    ID типов обедов, упомянутых в сообщении, без расчёта заработка
+    (смена без расчёта сохраняется с обедами, пересчёт их учтёт)
+    
+    Returns:
+        Список ID ([] - профессия не настроена или не загрузилась)
+    """
+    try:
+        profession = await get_profession_config(project_id)
+    except Exception as e:
+        logger.warning("Обеды смены проекта %s не сопоставлены: %s", project_id, e)
+        return []
     
     if profession is None:
-        raise ValueError("Профессия не настроена для проекта")
+        return []
     
-    total_hours = shift["total_hours"]
-    base_hours = profession["base_shift_hours"]
-    tax_percentage = profession["tax_percentage"]
-    
-    # 3. Базовая оплата
-    base_pay_net = profession["base_rate_net"]
-    base_pay_gross = profession["base_rate_gross"]
-    
-    # === 4. НОВАЯ ЛОГИКА: ОБЕДЫ (считаем отдельно!) ===
-    
-    meal_hours = 0
-    meal_pay_net = 0
-    meal_pay_gross = 0
-    meal_breakdown = []
-    
-    # Получаем обеды смены из БД
-    shift_meals_from_db = await get_shift_meals(shift_id)
-    
-    if shift_meals_from_db:
-        for meal in shift_meals_from_db:
-            meal_hours += meal["adds_overtime_hours"]
-            
-            # ВАЖНО: Обеды оплачиваются по БАЗОВОЙ ставке переработки!
-            meal_hour_net = profession["base_overtime_rate"]
-            meal_hour_gross = round(meal_hour_net / (1 - tax_percentage / 100))
-            
-            meal_pay_net += int(meal["adds_overtime_hours"] * meal_hour_net)
-            meal_pay_gross += int(meal["adds_overtime_hours"] * meal_hour_gross)
-            
-            meal_breakdown.append({
-                "name": meal["name"],
-                "adds_hours": meal["adds_overtime_hours"],
-                "rate_net": meal_hour_net,
-                "rate_gross": meal_hour_gross,
-                "total_net": int(meal["adds_overtime_hours"] * meal_hour_net),
-                "total_gross": int(meal["adds_overtime_hours"] * meal_hour_gross)
-            })
-    
-    # Альтернативно: если обеды ещё не сохранены, получаем из parsed_data
-    if not shift_meals_from_db and shift["parsed_data"]:
+    shift = build_shift_input(total_hours, parsed_data)
+    return [meal_type.id for meal_type in match_meals(profession, shift)]
+
+
+def build_shift_input(
+    total_hours: float,
+    parsed_data=None,
+    is_expense_day: bool = False,
+    shift_meals: list = None
+) -> ShiftInput:
+    """
+    Данные смены для ядра расчёта
+
+    Args:
+        parsed_data: Результат парсинга (обеды и услуги): JSON-текст или
+                     значение shifts.parsed_data в любом формате blob_codec
+        shift_meals: Обеды, уже привязанные к смене (строки meal_types)
+    """
+    parsed = {}
+    if parsed_data:
         try:
-            parsed_data = json.loads(shift["parsed_data"])
-            mentioned_meals = parsed_data.get("meals", [])
-            
-            if mentioned_meals:
-                meal_types = await get_meal_types(profession["id"])
-                
-                for mentioned_meal in mentioned_meals:
-                    for meal_type in meal_types:
-                        meal_name_lower = meal_type["name"].lower()
-                        
-                        if (meal_name_lower in mentioned_meal.lower() or 
-                            mentioned_meal.lower() in meal_name_lower):
-                            
-                            meal_hours += meal_type["adds_overtime_hours"]
-                            
-                            # БАЗОВАЯ ставка для обедов
-                            meal_hour_net = profession["base_overtime_rate"]
-                            meal_hour_gross = round(meal_hour_net / (1 - tax_percentage / 100))
-                            
-                            meal_pay_net += int(meal_type["adds_overtime_hours"] * meal_hour_net)
-                            meal_pay_gross += int(meal_type["adds_overtime_hours"] * meal_hour_gross)
-                            
-                            meal_breakdown.append({
-                                "name": meal_type["name"],
-                                "adds_hours": meal_type["adds_overtime_hours"],
-                                "rate_net": meal_hour_net,
-                                "rate_gross": meal_hour_gross,
-                                "total_net": int(meal_type["adds_overtime_hours"] * meal_hour_net),
-                                "total_gross": int(meal_type["adds_overtime_hours"] * meal_hour_gross)
-                            })
-                            break
-        except json.JSONDecodeError:
+            parsed = blob_codec.decode(parsed_data) or {}
+        except ValueError:
             pass
+
+    return ShiftInput.from_parsed(
+        total_hours,
+        parsed,
+        is_expense_day=is_expense_day,
+        attached_meals=[from_row(MealType, meal) for meal in shift_meals or ()]
+    )
+
+
+async def compute_earnings(
+    project_id: int,
+    total_hours: float,
+    parsed_data: str = None,
+    is_expense_day: bool = False,
+    shift_meals: list = None
+):
+    """
+    Расчёт заработка без записи в БД
+    
+    Загружает конфигурацию профессии (из кэша) и считает
+    earnings_core.compute (через кэш результатов earnings_memo).
+    
+    Args:
+        project_id: ID проекта
+        total_hours: Отработано часов
+        parsed_data: Результат парсинга (обеды и услуги): JSON-текст или
+                     значение shifts.parsed_data в любом формате blob_codec
+        is_expense_day: Начислять ли суточные
+        shift_meals: Обеды, уже привязанные к смене (если есть)
+    
+    Returns:
+        dict: details, total_net, total_gross, overtime_hours,
+              meal_type_ids, service_ids, earnings (строка для таблицы earnings)
+    """
+    with timed("calc.build_input"):
+        shift = build_shift_input(total_hours, parsed_data, is_expense_day, shift_meals)
+    
+    # Настройки профессии (ставки, услуги и обеды - из кэша)
+    with timed("calc.load_profession"):
+        profession = await get_profession_config(project_id)
+    
+    if profession is None:
+        raise ValueError("Профессия не настроена для проекта")
+    
+    with timed("calc.compute"):
+        calculation = compute_cached(profession, shift).to_dict()
+    calculation["earnings"]["calculated_with_version"] = profession.config_version
+    return calculation
+
+
+async def recalculate_project(
+    project_id: int,
+    date_from: str = None,
+    date_to: str = None,
+    progress=None
+):
+    """
+    Пересчёт всех смен проекта (например, после изменения ставок)
+    
+    Конфигурация профессии загружается один раз, смены читаются
+    порциями и считаются в памяти, результат записывается одной
+    транзакцией (save_recalculated_shifts).
+    
+    Args:
+        project_id: ID проекта
+        date_from, date_to: Период YYYY-MM-DD включительно (None - все смены)
+        progress: async-функция progress(done, total), вызывается
+                  в начале и после каждой порции
+    
+    Returns:
+        dict: shifts, total_net, total_gross, seconds
+    """
+    started = time.perf_counter()
+    
+    profession = await get_profession_config(project_id)
+    
+    if profession is None:
+        raise ValueError("Профессия не настроена для проекта")
     
-    # === 5. ПЕРЕРАБОТКИ (БЕЗ обедов - только фактические часы работы) ===
+    total = await count_recalc_shifts(project_id, date_from, date_to)
+    results = []
+    total_net = total_gross = 0
     
-    base_overtime_hours = 0
-    overtime_pay_net = 0
-    overtime_pay_gross = 0
-    overtime_breakdown = []
+    if progress is not None:
+        await progress(0, total)
     
-    # Рассчитываем базовые часы переработки (БЕЗ обедов!)
-    if total_hours > base_hours:
-        overtime_hours_raw = total_hours - base_hours
+    async for shifts, meals in iter_recalc_shifts(project_id, date_from, date_to):
+        for shift in shifts:
+            result = compute_cached(profession, build_shift_input(
+                shift["total_hours"],
+                shift["parsed_data"],
+                shift["is_expense_day"],
+                meals.get(shift["id"])
+            ))
+            results.append((shift["id"], result.overtime_hours, {
+                **result.earnings_row(),
+                "calculated_with_version": profession.config_version
+            }))
+            total_net += result.total_net
+            total_gross += result.total_gross
         
-        # Применяем порог
-        overtime_threshold = profession["overtime_threshold"]
-        if overtime_hours_raw < overtime_threshold:
-            base_overtime_hours = 0
-        else:
-            base_overtime_hours = overtime_hours_raw - overtime_threshold
-            
-            # Применяем округление
-            overtime_rounding = profession["overtime_rounding"]
-            if overtime_rounding > 0:
-                import math
-                base_overtime_hours = math.ceil(base_overtime_hours / overtime_rounding) * overtime_rounding
-    
-    # ВАЖНО: Обеды НЕ попадают в прогрессивные ставки!
-    # Прогрессивные ставки только для фактических часов переработки
-    
-    # Получаем прогрессивные ставки
-    rates = await get_progressive_rates(profession["id"])
-    
-    if rates and base_overtime_hours > 0:
-        # Применяем прогрессивные ставки ТОЛЬКО к фактической переработке
-        remaining_hours = base_overtime_hours
+        if progress is not None:
+            await progress(len(results), total)
+    
+    saved = await save_recalculated_shifts(results)
+    
+    return {
+        "shifts": saved,
+        "total_net": total_net,
+        "total_gross": total_gross,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+
+async def recompute_stale(limit: int = STALE_RECOMPUTE_BATCH) -> int:
+    """
+    Пересчитать порцию устаревших смен (после изменения настроек профессии)
+    
+    Смены записываются с версией настроек, по которой посчитаны. Если
+    настройки в кэше старее версии в БД (изменены другим процессом),
+    конфигурация перечитывается; смена, для которой и после этого нет
+    свежей версии, остаётся до следующей порции.
+    
+    Returns:
+        Сколько смен пересчитано
+    """
+    shifts, meals = await get_stale_shifts(limit)
+    results = []
+    
+    for shift in shifts:
+        profession = await get_profession_config(shift["project_id"])
+        if profession is not None and profession.config_version < shift["config_version"]:
+            profession_cache.invalidate(shift["project_id"])
+            profession = await get_profession_config(shift["project_id"])
+        if profession is None or profession.config_version < shift["config_version"]:
+            continue
         
-        for rate in rates:
-            if remaining_hours <= 0:
-                break
-            
-            hours_to = rate["hours_to"] if rate["hours_to"] else 999
-            bracket_size = hours_to - rate["hours_from"]
-            hours_in_bracket = min(remaining_hours, bracket_size)
-            
-            rate_net = rate["rate"]
-            rate_gross = round(rate_net / (1 - tax_percentage / 100))
-            
-            bracket_pay_gross = round(hours_in_bracket * rate_gross)
-            bracket_pay_net = round(bracket_pay_gross * (1 - tax_percentage / 100))
-            
-            overtime_pay_net += bracket_pay_net
-            overtime_pay_gross += bracket_pay_gross
-            
-            bracket_label = f"{rate['hours_from']:.0f}-{rate['hours_to'] if rate['hours_to'] else '+'}ч"
-            overtime_breakdown.append({
-                "bracket": bracket_label,
-                "hours": round(hours_in_bracket, 2),
-                "rate_net": rate_net,
-                "rate_gross": rate_gross,
-                "total_net": bracket_pay_net,
-                "total_gross": bracket_pay_gross
-            })
-            
-            remaining_hours -= hours_in_bracket
-    elif base_overtime_hours > 0:
-        # Если нет прогрессивных ставок - используем базовую
-        overtime_pay_net = int(base_overtime_hours * profession["base_overtime_rate"])
-        overtime_pay_gross = round(overtime_pay_net / (1 - tax_percentage / 100))
+        result = compute_cached(profession, build_shift_input(
+            shift["total_hours"],
+            shift["parsed_data"],
+            shift["is_expense_day"],
+            meals.get(shift["id"])
+        ))
+        results.append((shift["id"], result.overtime_hours, {
+            **result.earnings_row(),
+            "calculated_with_version": profession.config_version
+        }))
+    
+    saved = await save_recalculated_shifts(results) if results else 0
+    
+    # Порция неполная - других устаревших смен нет: проекты, где
+    # их не осталось, уходят из stale_projects
+    if len(shifts) < limit:
+        await clear_stale_projects()
+    
+    return saved
+
+
+async def stale_recompute_loop(
+    interval: float = STALE_RECOMPUTE_INTERVAL,
+    pause: float = STALE_RECOMPUTE_PAUSE,
+    batch_size: int = STALE_RECOMPUTE_BATCH
+):
+    """
+    Фоновая задача бота: пересчёт устаревших смен небольшими порциями
+    
+    Между порциями - пауза pause (обработка сообщений не ждёт пересчёта),
+    когда пересчитывать нечего - проверка раз в interval секунд.
+    """
+    if interval <= 0:
+        return
+    
+    while True:
+        try:
+            done = await recompute_stale(batch_size)
+        except Exception as e:
+            logger.error("Фоновый пересчёт смен не выполнен: %s", e)
+            done = 0
         
-        overtime_breakdown.append({
-            "bracket": "базовая",
-            "hours": round(base_overtime_hours, 2),
-            "rate_net": profession["base_overtime_rate"],
-            "rate_gross": round(profession["base_overtime_rate"] / (1 - tax_percentage / 100)),
-            "total_net": overtime_pay_net,
-            "total_gross": overtime_pay_gross
-        })
+        if done:
+            logger.info(
+                "Фоновый пересчёт: %s смен, ожидают пересчёта: %s",
+                done, await count_stale_shifts()
+            )
+        await asyncio.sleep(pause if done else interval)
+
+
+def _price_shifts(profession, shifts) -> list:
+    """Суммы по сменам под конфигурацией profession: [(total_net, total_gross, overtime_hours)]"""
+    columns = compute_many(profession, shifts)
+    return [
+        (int(net), int(gross), float(hours))
+        for net, gross, hours in zip(columns["total_net"], columns["total_gross"], columns["overtime_hours"])
+    ]
+
+
+async def simulate_project(
+    project_id: int,
+    scenarios: list,
+    date_from: str = None,
+    date_to: str = None
+):
+    """
+    Что будет, если изменить ставки: пересчёт смен проекта без записи в БД
     
-    # ИТОГО часов переработки (для отображения)
-    total_overtime_hours = base_overtime_hours + meal_hours
+    Смены (как для recalculate_project) читаются один раз, затем каждый
+    сценарий считается в своём потоке (asyncio.to_thread), сценарии -
+    одновременно. Сравнение идёт с расчётом по текущим настройкам
+    профессии (baseline), а не с сохранёнными earnings.
     
-    # Обновляем overtime_hours в смене
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute(
-            "UPDATE shifts SET overtime_hours = ? WHERE id = ?",
-            (total_overtime_hours, shift_id)
-        )
-        await db.commit()
+    Args:
+        project_id: ID проекта
+        scenarios: [{"name": ..., "overrides": {...}}] - переопределения
+                   ProfessionConfig.with_overrides
+        date_from, date_to: Период YYYY-MM-DD включительно (None - все смены)
     
-    # 6. Суточные
-    daily_allowance_pay = 0
-    if shift["is_expense_day"]:
-        daily_allowance_pay = profession["daily_allowance"]
+    Returns:
+        dict: shifts, baseline (итоги), scenarios (итоги, разница
+              с baseline и список изменившихся смен), seconds
     
-    # 7. Дополнительные услуги (БЕЗ обедов!)
-    services_pay_net = 0
-    services_pay_gross = 0
-    services_breakdown = []
+    Raises:
+        ValueError: Профессия не настроена или ошибка в сценарии
+    """
+    started = time.perf_counter()
     
-    if shift["parsed_data"]:
+    if not scenarios:
+        raise ValueError("Нужен хотя бы один сценарий")
+    if len(scenarios) > SIMULATION_MAX_SCENARIOS:
+        raise ValueError(f"Не больше {SIMULATION_MAX_SCENARIOS} сценариев за раз")
+    
+    profession = await get_profession_config(project_id)
+    
+    if profession is None:
+        raise ValueError("Профессия не настроена для проекта")
+    
+    # Конфигурации сценариев проверяются до чтения смен
+    configs = []
+    for number, scenario in enumerate(scenarios, start=1):
+        name = scenario.get("name") or f"Сценарий {number}"
         try:
-            parsed_data = json.loads(shift["parsed_data"])
-            mentioned_services = parsed_data.get("services", [])
-            
-            if mentioned_services:
-                available_services = await get_additional_services(profession["id"])
-                
-                for service in available_services:
-                    service_name_lower = service["name"].lower()
-                    
-                    is_mentioned = any(
-                        service_name_lower in mentioned.lower() or mentioned.lower() in service_name_lower
-                        for mentioned in mentioned_services
-                    )
-                    
-                    if is_mentioned:
-                        service_net = service["cost"]
-                        service_tax = service["tax_percentage"]
-                        service_gross = round(service_net / (1 - service_tax / 100))
-                        
-                        services_pay_net += service_net
-                        services_pay_gross += service_gross
-                        
-                        services_breakdown.append({
-                            "name": service["name"],
-                            "cost_net": service_net,
-                            "cost_gross": service_gross,
-                            "tax": service_tax
-                        })
-        except json.JSONDecodeError:
-            pass
+            configs.append((name, profession.with_overrides(scenario.get("overrides") or {})))
+        except ValueError as e:
+            raise ValueError(f"{name}: {e}")
+    
+    shift_ids, dates, inputs = [], [], []
+    async for shifts, meals in iter_recalc_shifts(project_id, date_from, date_to):
+        for shift in shifts:
+            shift_ids.append(shift["id"])
+            dates.append(shift["date"])
+            inputs.append(build_shift_input(
+                shift["total_hours"],
+                shift["parsed_data"],
+                shift["is_expense_day"],
+                meals.get(shift["id"])
+            ))
     
-    # 8. Итого
-    total_net = base_pay_net + overtime_pay_net + meal_pay_net + daily_allowance_pay + services_pay_net
-    total_gross = base_pay_gross + overtime_pay_gross + meal_pay_gross + daily_allowance_pay + services_pay_gross
-    
-    # 9. Детали расчёта
-    calculation_details = {
-        "base_hours": base_hours,
-        "total_hours": round(total_hours, 2),
-        "base_overtime_hours": round(base_overtime_hours, 2),  # Переработка БЕЗ обедов
-        "meal_hours": round(meal_hours, 2),  # Часы обедов
-        "total_overtime_hours": round(total_overtime_hours, 2),  # Всего переработки
-        "breakdown": {
-            "base_pay": {
-                "net": base_pay_net,
-                "gross": base_pay_gross
-            },
-            "overtime": overtime_breakdown,  # Прогрессивные ставки (БЕЗ обедов)
-            "meals": meal_breakdown,  # Обеды (по базовой ставке)
-            "daily_allowance": daily_allowance_pay,
-            "services": services_breakdown
+    baseline, *priced = await asyncio.gather(
+        asyncio.to_thread(_price_shifts, profession, inputs),
+        *(asyncio.to_thread(_price_shifts, config, inputs) for _, config in configs)
+    )
+    
+    def totals(rows):
+        return {
+            "total_net": sum(row[0] for row in rows),
+            "total_gross": sum(row[1] for row in rows),
+            "overtime_hours": round(sum(row[2] for row in rows), 2)
         }
-    }
     
-    # 10. Сохраняем в таблицу earnings
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("""
-            INSERT INTO earnings (
-                shift_id, base_pay_net, base_pay_gross,
-                overtime_pay, daily_allowance, services_pay,
-                total_net, total_gross, calculation_details
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            shift_id, base_pay_net, base_pay_gross,
-            overtime_pay_gross + meal_pay_gross,  # Сумма переработки + обеды
-            daily_allowance_pay, services_pay_gross,
-            total_net, total_gross, json.dumps(calculation_details, ensure_ascii=False)
-        ))
-        await db.commit()
+    base_totals = totals(baseline)
+    results = []
     
-    return calculation_details, total_net, total_gross
\ No newline at end of file
+    for (name, config), rows in zip(configs, priced):
+        diff = [
+            {
+                "shift_id": shift_id,
+                "date": date,
+                "total_net": net,
+                "total_gross": gross,
+                "delta_net": net - base[0],
+                "delta_gross": gross - base[1]
+            }
+            for shift_id, date, (net, gross, _), base in zip(shift_ids, dates, rows, baseline)
+            if (net, gross) != base[:2]
+        ]
+        scenario_totals = totals(rows)
+        results.append({
+            "name": name,
+            **scenario_totals,
+            "delta_net": scenario_totals["total_net"] - base_totals["total_net"],
+            "delta_gross": scenario_totals["total_gross"] - base_totals["total_gross"],
+            "changed_shifts": len(diff),
+            "diff": diff
+        })
+    
+    return {
+        "project_id": project_id,
+        "shifts": len(inputs),
+        "baseline": base_totals,
+        "scenarios": results,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
@@ -9,4 +9,67 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-DATABASE_PATH = os.getenv("DATABASE_PATH", "data.db")
\ No newline at end of file
+DATABASE_PATH = os.getenv("DATABASE_PATH", "data.db")
+
+# Пул соединений SQLite (database.py)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+# Отчёты api_server.py (статистика, экспорт): отдельный пул только для чтения.
+# Можно указать снапшот-копию БД, чтобы отчёты не касались рабочего файла.
+REPORTING_DATABASE_PATH = os.getenv("REPORTING_DATABASE_PATH", DATABASE_PATH)
+REPORTING_POOL_SIZE = int(os.getenv("REPORTING_POOL_SIZE", "2"))
+
+# Профиль PRAGMA, применяется к каждому соединению SQLite
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))  # байт
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-16000"))  # < 0 - в KiB
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # мс
+
+# Период фонового WAL checkpoint (секунды, 0 - отключить)
+SQLITE_CHECKPOINT_INTERVAL = int(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "300"))
+
+# Резервные копии (backup.py): онлайн-бэкап SQLite небольшими шагами
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", str(24 * 3600)))  # сек, 0 - отключить
+BACKUP_RETENTION = int(os.getenv("BACKUP_RETENTION", "7"))  # сколько копий хранить
+BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "1") == "1"  # gzip
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.01"))  # сек между шагами
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
+
+# Кэш конфигурации профессий (profession_config.py)
+PROFESSION_CACHE_SIZE = int(os.getenv("PROFESSION_CACHE_SIZE", "256"))
+PROFESSION_CACHE_TTL = float(os.getenv("PROFESSION_CACHE_TTL", "60"))  # сек, 0 - без TTL
+
+# Кэш результатов расчёта смен (earnings_memo.py), 0 - выключен
+EARNINGS_MEMO_SIZE = int(os.getenv("EARNINGS_MEMO_SIZE", "4096"))
+
+# Замеры времени горячего пути (timings.py)
+TIMINGS_ENABLED = os.getenv("TIMINGS_ENABLED", "1") == "1"
+
+# Очередь записи в SQLite (один писатель, групповой commit)
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))  # операций в одном commit
+DB_WRITE_MAX_LATENCY = float(os.getenv("DB_WRITE_MAX_LATENCY", "0.002"))  # сек ожидания добора пачки
+
+# Постраничная выдача смен (keyset-пагинация по (date, id))
+SHIFTS_PAGE_SIZE = int(os.getenv("SHIFTS_PAGE_SIZE", "50"))
+SHIFTS_PAGE_MAX = int(os.getenv("SHIFTS_PAGE_MAX", "200"))
+
+# Массовый пересчёт проекта (calculator.recalculate_project)
+RECALC_CHUNK_SIZE = int(os.getenv("RECALC_CHUNK_SIZE", "200"))  # смен в одной порции чтения
+RECALC_JOB_TTL = float(os.getenv("RECALC_JOB_TTL", "3600"))  # сек хранения завершённой задачи (api_server)
+RECALC_JOBS_MAX = int(os.getenv("RECALC_JOBS_MAX", "100"))  # задач в памяти, лишние завершённые - вон
+
+# Фоновый пересчёт устаревших смен после изменения настроек профессии
+STALE_RECOMPUTE_BATCH = int(os.getenv("STALE_RECOMPUTE_BATCH", "50"))  # смен за раз
+STALE_RECOMPUTE_PAUSE = float(os.getenv("STALE_RECOMPUTE_PAUSE", "0.5"))  # сек между порциями
+STALE_RECOMPUTE_INTERVAL = float(os.getenv("STALE_RECOMPUTE_INTERVAL", "30"))  # сек, если пересчитывать нечего; 0 - выключен
+
+# Симуляция ставок (calculator.simulate_project)
+SIMULATION_MAX_SCENARIOS = int(os.getenv("SIMULATION_MAX_SCENARIOS", "8"))
+
+# Ночная сверка earnings (nightly_recompute.py)
+NIGHTLY_WORKERS = int(os.getenv("NIGHTLY_WORKERS", str(os.cpu_count() or 1)))  # процессов
+NIGHTLY_KEEP_RUNS = int(os.getenv("NIGHTLY_KEEP_RUNS", "14"))  # хранить отчётов
@@ -2,270 +2,1887 @@
 Работа с базой данных SQLite
 Статус: 🚧 В разработке - Шаг 6.1: Добавлены таблицы для обедов
 """
+import asyncio
+import base64
+import json
+import logging
+import re
+import time
+from pathlib import Path
+from contextlib import asynccontextmanager
+from dataclasses import fields
+
 import aiosqlite
-from config import DATABASE_PATH
+import blob_codec
+from config import (
+    DATABASE_PATH, DB_POOL_SIZE, REPORTING_DATABASE_PATH, REPORTING_POOL_SIZE,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE, SQLITE_TEMP_STORE, SQLITE_BUSY_TIMEOUT,
+    SQLITE_CHECKPOINT_INTERVAL, SHIFTS_PAGE_SIZE, SHIFTS_PAGE_MAX,
+    DB_WRITE_BATCH_SIZE, DB_WRITE_MAX_LATENCY, RECALC_CHUNK_SIZE, NIGHTLY_KEEP_RUNS,
+    STALE_RECOMPUTE_BATCH
+)
+from earnings_memo import earnings_memo
+from timings import timed, timings
+from profession_config import (
+    ProfessionConfig, ProgressiveRate, AdditionalService, MealType,
+    profession_cache, validate_progressive_rates, MISSING
+)
+
+logger = logging.getLogger(__name__)
+
+# Профиль PRAGMA для каждого соединения (порядок важен: busy_timeout
+# первым, чтобы смена journal_mode подождала чужую блокировку)
+SQLITE_PRAGMAS = {
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": SQLITE_CACHE_SIZE,
+    "temp_store": SQLITE_TEMP_STORE,
+}
+
+# Профиль для соединений только для чтения (отчёты): journal_mode и
+# synchronous задаёт пишущая сторона, query_only - защита от записи
+SQLITE_READ_ONLY_PRAGMAS = {
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+    "query_only": "ON",
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "cache_size": SQLITE_CACHE_SIZE,
+    "temp_store": SQLITE_TEMP_STORE,
+}
+
+# === ПУЛ СОЕДИНЕНИЙ ===
+
+async def _apply_pragmas(conn, pragmas: dict = SQLITE_PRAGMAS):
+    """Применить профиль PRAGMA к соединению"""
+    for name, value in pragmas.items():
+        async with conn.execute(f"PRAGMA {name} = {value}"):
+            pass
+
+async def open_connection(database: str = DATABASE_PATH, read_only: bool = False):
+    """
+    Открыть соединение aiosqlite с профилем PRAGMA и row_factory = Row
+
+    Соединение вне пула (пул, очередь записи, резервное копирование);
+    закрывает вызывающий.
+
+    read_only: URI file:...?mode=ro + PRAGMA query_only - соединение
+    не может взять блокировку записи
+    """
+    if read_only:
+        uri = f"{Path(database).resolve().as_uri()}?mode=ro"
+        conn = aiosqlite.connect(uri, uri=True)
+    else:
+        conn = aiosqlite.connect(database)
+    # Поток-воркер соединения не должен держать процесс при выходе
+    conn.daemon = True
+    await conn
+    conn.row_factory = aiosqlite.Row
+    await _apply_pragmas(conn, SQLITE_READ_ONLY_PRAGMAS if read_only else SQLITE_PRAGMAS)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений aiosqlite
+
+    Соединения (и их потоки-воркеры) открываются один раз и
+    переиспользуются всеми функциями модуля. Пул привязан к event loop,
+    в котором был открыт.
+    """
+
+    def __init__(self, database: str, size: int = DB_POOL_SIZE, read_only: bool = False):
+        self.database = database
+        self.size = max(1, size)
+        self.read_only = read_only
+        self.loop = None
+        self._idle = None
+        self._connections = []
+
+        # Статистика использования
+        self._acquired = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def open(self):
+        """Открыть все соединения пула"""
+        self.loop = asyncio.get_running_loop()
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            conn = await open_connection(self.database, self.read_only)
+            self._connections.append(conn)
+            self._idle.put_nowait(conn)
+
+    async def close(self):
+        """Закрыть все соединения пула"""
+        connections, self._connections = self._connections, []
+        for conn in connections:
+            await conn.close()
+        self.loop = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Взять соединение из пула (ждёт, если все заняты)"""
+        if self._idle.empty():
+            self._waits += 1
+
+        started = time.perf_counter()
+        conn = await self._idle.get()
+        waited = time.perf_counter() - started
+
+        self._acquired += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._in_use += 1
+        self._peak_in_use = max(self._peak_in_use, self._in_use)
+
+        try:
+            yield conn
+        finally:
+            # Незакоммиченные изменения не должны достаться следующему владельцу
+            try:
+                if conn.in_transaction:
+                    await conn.rollback()
+            finally:
+                self._in_use -= 1
+                self._idle.put_nowait(conn)
+
+    def stats(self) -> dict:
+        """Статистика пула: ожидание и использование соединений"""
+        return {
+            "size": self.size,
+            "in_use": self._in_use,
+            "peak_in_use": self._peak_in_use,
+            "acquired": self._acquired,
+            "waits": self._waits,
+            "wait_total_ms": round(self._wait_total * 1000, 3),
+            "wait_avg_ms": round(self._wait_total * 1000 / self._acquired, 3) if self._acquired else 0.0,
+            "wait_max_ms": round(self._wait_max * 1000, 3),
+        }
+
+
+_pool = None
+_transient_connections = 0
+
+async def init_pool(size: int = DB_POOL_SIZE):
+    """Открыть пул соединений в текущем event loop (повторный вызов - no-op)"""
+    global _pool
+    loop = asyncio.get_running_loop()
+
+    if _pool is not None and _pool.loop is loop:
+        return _pool
+
+    if _pool is not None:
+        # Пул остался от другого (уже завершённого) event loop
+        logger.warning("Пул БД открыт в другом event loop, открываем новый")
+
+    _pool = ConnectionPool(DATABASE_PATH, size)
+    await _pool.open()
+    logger.info("Пул БД открыт: %s соединений к %s", _pool.size, DATABASE_PATH)
+    return _pool
+
+async def close_pool():
+    """Закрыть пул соединений (при остановке бота)"""
+    global _pool
+    if _pool is None:
+        return
+
+    pool, _pool = _pool, None
+    logger.info("Пул БД закрывается, статистика: %s", pool.stats())
+
+    # Обновляем статистику планировщика перед остановкой
+    try:
+        async with pool.acquire() as db:
+            await db.execute("PRAGMA optimize")
+    except aiosqlite.Error as e:
+        logger.warning("PRAGMA optimize не выполнен: %s", e)
+
+    await pool.close()
+
+def get_pool_stats() -> dict:
+    """Статистика пула + число временных соединений вне пула"""
+    stats = _pool.stats() if _pool is not None else {}
+    stats["transient_connections"] = _transient_connections
+    return stats
+
+@asynccontextmanager
+async def get_connection():
+    """
+    Соединение для запроса
+
+    Берётся из пула, если он открыт в текущем event loop. Иначе
+    (api_server, отдельные скрипты) открывается временное соединение.
+    """
+    global _transient_connections
+    pool = _pool
+    if pool is not None and pool.loop is asyncio.get_running_loop():
+        async with pool.acquire() as db:
+            yield db
+        return
+
+    _transient_connections += 1
+    db = await open_connection()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+_reporting_pool = None
+
+async def init_reporting_pool(size: int = REPORTING_POOL_SIZE):
+    """
+    Открыть пул соединений только для чтения к REPORTING_DATABASE_PATH
+    в текущем event loop (api_server.py: статистика, экспорт)
+
+    Если отчётную БД открыть нельзя (нет файла реплики, нет прав),
+    отчёты читаются через обычный пул (init_pool).
+    """
+    global _reporting_pool
+    loop = asyncio.get_running_loop()
+
+    if _reporting_pool is not None and _reporting_pool.loop is loop:
+        return _reporting_pool
+
+    pool = ConnectionPool(REPORTING_DATABASE_PATH, size, read_only=True)
+    try:
+        await pool.open()
+    except aiosqlite.Error as e:
+        await pool.close()
+        logger.warning(
+            "Пул отчётов не открыт (%s: %s), отчёты читаются через основной пул",
+            REPORTING_DATABASE_PATH, e
+        )
+        _reporting_pool = await init_pool()
+        return _reporting_pool
+
+    _reporting_pool = pool
+    logger.info(
+        "Пул отчётов открыт: %s соединений к %s (только чтение)",
+        pool.size, REPORTING_DATABASE_PATH
+    )
+    return pool
+
+async def close_reporting_pool():
+    """Закрыть пул отчётов"""
+    global _reporting_pool
+    if _reporting_pool is None:
+        return
+
+    pool, _reporting_pool = _reporting_pool, None
+    if pool is _pool:
+        # Запасной вариант: основной пул закрывает close_pool
+        return
+    logger.info("Пул отчётов закрывается, статистика: %s", pool.stats())
+    await pool.close()
+
+@asynccontextmanager
+async def get_reporting_connection():
+    """
+    Соединение только для чтения для отчётных запросов
+
+    Из пула отчётов, если он открыт в текущем event loop,
+    иначе - временное соединение в режиме mode=ro.
+    """
+    global _transient_connections
+    pool = _reporting_pool
+    if pool is not None and pool.loop is asyncio.get_running_loop():
+        async with pool.acquire() as db:
+            yield db
+        return
+
+    _transient_connections += 1
+    db = await open_connection(REPORTING_DATABASE_PATH, read_only=True)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+def _reader(reporting: bool):
+    """Соединение для чтения: отчётное (только чтение) или обычное"""
+    return get_reporting_connection() if reporting else get_connection()
+
+async def wal_checkpoint(mode: str = "PASSIVE"):
+    """
+    WAL checkpoint: перенос страниц из -wal в основной файл БД
+
+    Returns:
+        tuple: (busy, log_frames, checkpointed_frames)
+    """
+    async with get_connection() as db:
+        async with db.execute(f"PRAGMA wal_checkpoint({mode})") as cursor:
+            return tuple(await cursor.fetchone())
+
+async def wal_checkpoint_loop(interval: int = SQLITE_CHECKPOINT_INTERVAL):
+    """Фоновая задача: периодический PASSIVE checkpoint, чтобы -wal не разрастался"""
+    if interval <= 0:
+        return
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            busy, log_frames, checkpointed = await wal_checkpoint()
+            logger.debug(
+                "WAL checkpoint: busy=%s, frames=%s, checkpointed=%s",
+                busy, log_frames, checkpointed
+            )
+        except aiosqlite.Error as e:
+            logger.warning("WAL checkpoint не выполнен: %s", e)
+
+# === ОЧЕРЕДЬ ЗАПИСИ (один писатель) ===
+
+class WriteQueue:
+    """
+    Единственный писатель в SQLite для процесса бота
+
+    Операции записи - корутины op(db) без commit - ставятся в очередь и
+    выполняются одной задачей на собственном соединении. Всё, что
+    накопилось в очереди (до batch_size операций, добор не дольше
+    max_latency), пишется одной транзакцией BEGIN IMMEDIATE с одним
+    commit. Каждая операция идёт в своём SAVEPOINT: ошибка откатывает
+    только её, остальные операции пачки коммитятся. Результат или
+    исключение возвращается вызывающему через future.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        batch_size: int = DB_WRITE_BATCH_SIZE,
+        max_latency: float = DB_WRITE_MAX_LATENCY
+    ):
+        self.database = database
+        self.batch_size = max(1, batch_size)
+        self.max_latency = max(0.0, max_latency)
+        self.loop = None
+        self._queue = None
+        self._conn = None
+        self._task = None
+
+        # Метрики
+        self._ops = 0
+        self._failed_ops = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._peak_depth = 0
+        self._commit_total = 0.0
+        self._commit_max = 0.0
+        self._wait_total = 0.0
+
+    async def start(self):
+        """Открыть соединение писателя и запустить задачу"""
+        self.loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._conn = await open_connection(self.database)
+        self._task = self.loop.create_task(self._run(), name="db-writer")
+
+    async def stop(self):
+        """Дописать очередь и остановить писателя"""
+        if self._task is None:
+            return
+
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+        await self._conn.close()
+        self._conn = None
+        self.loop = None
+
+    async def submit(self, op):
+        """Поставить операцию в очередь и дождаться её commit"""
+        future = self.loop.create_future()
+        self._queue.put_nowait((op, future, time.perf_counter()))
+        self._peak_depth = max(self._peak_depth, self._queue.qsize())
+        return await future
+
+    async def _next_batch(self):
+        """
+        Пачка операций: первая - без таймаута, остальные - пока есть
+        в очереди или не истёк max_latency
+
+        Returns:
+            (пачка, остановиться_после)
+        """
+        item = await self._queue.get()
+        if item is None:
+            return [], True
+
+        batch = [item]
+        deadline = self.loop.time() + self.max_latency
+
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - self.loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if batch:
+                await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch: list):
+        """Выполнить пачку одной транзакцией и раздать результаты"""
+        db = self._conn
+        started = time.perf_counter()
+        results = []
+
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+
+            for op, future, queued_at in batch:
+                self._wait_total += started - queued_at
+                await db.execute("SAVEPOINT write_op")
+                try:
+                    result = await op(db)
+                except Exception as e:
+                    await db.execute("ROLLBACK TO write_op")
+                    await db.execute("RELEASE write_op")
+                    results.append((False, e))
+                else:
+                    await db.execute("RELEASE write_op")
+                    results.append((True, result))
+
+            await db.commit()
+        except Exception as e:
+            # Ошибка самой транзакции (BEGIN/commit): вся пачка не записана
+            if db.in_transaction:
+                await db.rollback()
+            self._failed_batches += 1
+            logger.error("Пачка записи (%s операций) не записана: %s", len(batch), e)
+            results = [(False, e)] * len(batch)
+
+        elapsed = time.perf_counter() - started
+        self._batches += 1
+        self._ops += len(batch)
+        self._commit_total += elapsed
+        self._commit_max = max(self._commit_max, elapsed)
+        timings.record("db.writer.batch", elapsed)
+
+        for (_, future, _), (ok, value) in zip(batch, results):
+            if not ok:
+                self._failed_ops += 1
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def stats(self) -> dict:
+        """Метрики: глубина очереди, размер пачек, время commit"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "peak_queue_depth": self._peak_depth,
+            "ops": self._ops,
+            "failed_ops": self._failed_ops,
+            "batches": self._batches,
+            "failed_batches": self._failed_batches,
+            "avg_batch_size": round(self._ops / self._batches, 2) if self._batches else 0.0,
+            "commit_avg_ms": round(self._commit_total * 1000 / self._batches, 3) if self._batches else 0.0,
+            "commit_max_ms": round(self._commit_max * 1000, 3),
+            "queue_wait_avg_ms": round(self._wait_total * 1000 / self._ops, 3) if self._ops else 0.0,
+        }
+
+
+_writer = None
+
+async def start_writer():
+    """Запустить очередь записи в текущем event loop (бот)"""
+    global _writer
+    if _writer is not None and _writer.loop is asyncio.get_running_loop():
+        return _writer
+
+    _writer = WriteQueue(DATABASE_PATH)
+    await _writer.start()
+    logger.info(
+        "Очередь записи БД запущена: пачка до %s, добор %s мс",
+        _writer.batch_size, _writer.max_latency * 1000
+    )
+    return _writer
+
+async def stop_writer():
+    """Дописать очередь и остановить писателя (при остановке бота)"""
+    global _writer
+    if _writer is None:
+        return
+
+    writer, _writer = _writer, None
+    await writer.stop()
+    logger.info("Очередь записи БД остановлена, статистика: %s", writer.stats())
+
+def get_writer_stats() -> dict:
+    """Метрики очереди записи ({} - писатель не запущен)"""
+    return _writer.stats() if _writer is not None else {}
+
+async def _write(op):
+    """
+    Выполнить операцию записи op(db) и вернуть её результат
+
+    В процессе бота (очередь запущена в текущем event loop) - через
+    WriteQueue, с групповым commit. Иначе (api_server, скрипты) - сразу,
+    отдельной транзакцией на соединении из get_connection().
+    """
+    writer = _writer
+    if writer is not None and writer.loop is asyncio.get_running_loop():
+        return await writer.submit(op)
+
+    async with get_connection() as db:
+        try:
+            result = await op(db)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    return result
+
+
+# === СХЕМА И МИГРАЦИИ ===
+
+# Агрегаты рассчитанных смен по проекту и месяцу (period = 'YYYY-MM')
+PERIOD_TOTALS_SELECT_SQL = """
+    SELECT
+        s.project_id,
+        substr(s.date, 1, 7) AS period,
+        COUNT(*) AS shift_count,
+        COALESCE(SUM(s.total_hours), 0) AS total_hours,
+        COALESCE(SUM(s.overtime_hours), 0) AS overtime_hours,
+        COALESCE(SUM(e.total_net), 0) AS total_net,
+        COALESCE(SUM(e.total_gross), 0) AS total_gross
+    FROM shifts s
+    LEFT JOIN earnings e ON e.shift_id = s.id
+    WHERE s.status = 'calculated'
+    GROUP BY s.project_id, substr(s.date, 1, 7)
+"""
+
+async def _reencode_blobs(db, chunk: int = 1000):
+    """
+    Миграция: перекодировать JSON-текст parsed_data и calculation_details
+    в компактный формат blob_codec (порциями по chunk строк)
+    """
+    for table, column in (("shifts", "parsed_data"), ("earnings", "calculation_details")):
+        last_id = 0
+        while True:
+            async with db.execute(f"""
+                SELECT id, {column} FROM {table}
+                WHERE id > ? AND typeof({column}) = 'text'
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, chunk)) as cursor:
+                rows = await cursor.fetchall()
+
+            if not rows:
+                break
+
+            await db.executemany(
+                f"UPDATE {table} SET {column} = ? WHERE id = ?",
+                [(blob_codec.encode(row[column]), row["id"]) for row in rows]
+            )
+            last_id = rows[-1]["id"]
+
+# Строка earnings (new) посчитана по версии настроек старее версии
+# профессии проекта (профессия - первая по id, как в PROJECT_SNAPSHOT_SQL)
+_EARNINGS_STALE_SQL = """
+    COALESCE(new.calculated_with_version, 0) < COALESCE((
+        SELECT p.config_version
+        FROM shifts s
+        JOIN professions p ON p.project_id = s.project_id
+        WHERE s.id = new.shift_id
+        ORDER BY p.id
+        LIMIT 1
+    ), 0)
+"""
+
+# Версионированные миграции схемы. Текущая версия хранится в
+# PRAGMA user_version; шаги применяются по порядку, каждый в своей
+# транзакции вместе с обновлением user_version.
+MIGRATIONS = [
+    (1, "Индексы для горячих запросов", [
+        "CREATE INDEX IF NOT EXISTS idx_projects_user_active ON projects(user_id, is_active)",
+        "CREATE INDEX IF NOT EXISTS idx_shifts_project_status_date ON shifts(project_id, status, date)",
+        "CREATE INDEX IF NOT EXISTS idx_professions_project ON professions(project_id)",
+        "CREATE INDEX IF NOT EXISTS idx_progressive_rates_profession ON progressive_rates(profession_id, order_num)",
+        "CREATE INDEX IF NOT EXISTS idx_additional_services_profession ON additional_services(profession_id)",
+        "CREATE INDEX IF NOT EXISTS idx_meal_types_profession ON meal_types(profession_id)",
+        "CREATE INDEX IF NOT EXISTS idx_shift_meals_shift ON shift_meals(shift_id)",
+        "CREATE INDEX IF NOT EXISTS idx_shift_services_shift ON shift_services(shift_id)",
+        "CREATE INDEX IF NOT EXISTS idx_earnings_shift ON earnings(shift_id)",
+    ]),
+    (2, "Одна строка earnings на смену (upsert вместо append)", [
+        "ALTER TABLE earnings ADD COLUMN revision INTEGER NOT NULL DEFAULT 1",
+        # Ревизия оставшейся строки = сколько раз смену уже пересчитывали
+        """
+        UPDATE earnings
+        SET revision = (SELECT COUNT(*) FROM earnings e2 WHERE e2.shift_id = earnings.shift_id)
+        WHERE id IN (SELECT MAX(id) FROM earnings GROUP BY shift_id)
+        """,
+        # Сжатие: оставляем только последний расчёт каждой смены
+        "DELETE FROM earnings WHERE id NOT IN (SELECT MAX(id) FROM earnings GROUP BY shift_id)",
+        "DROP INDEX IF EXISTS idx_earnings_shift",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_earnings_shift ON earnings(shift_id)",
+    ]),
+    (3, "Агрегаты по проекту и месяцу (project_period_totals)", [
+        """
+        CREATE TABLE IF NOT EXISTS project_period_totals (
+            project_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            shift_count INTEGER NOT NULL DEFAULT 0,
+            total_hours REAL NOT NULL DEFAULT 0,
+            overtime_hours REAL NOT NULL DEFAULT 0,
+            total_net INTEGER NOT NULL DEFAULT 0,
+            total_gross INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (project_id, period)
+        ) WITHOUT ROWID
+        """,
+        "INSERT INTO project_period_totals " + PERIOD_TOTALS_SELECT_SQL,
+    ]),
+    (4, "Индекс для ленты смен проекта без фильтра по статусу", [
+        "CREATE INDEX IF NOT EXISTS idx_shifts_project_date ON shifts(project_id, date)",
+    ]),
+    (5, "Полнотекстовый поиск по сообщениям смен (shifts_fts)", [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS shifts_fts USING fts5(
+            original_message,
+            content = 'shifts',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS shifts_fts_insert AFTER INSERT ON shifts BEGIN
+            INSERT INTO shifts_fts (rowid, original_message)
+            VALUES (new.id, new.original_message);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS shifts_fts_delete AFTER DELETE ON shifts BEGIN
+            INSERT INTO shifts_fts (shifts_fts, rowid, original_message)
+            VALUES ('delete', old.id, old.original_message);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS shifts_fts_update AFTER UPDATE OF original_message ON shifts BEGIN
+            INSERT INTO shifts_fts (shifts_fts, rowid, original_message)
+            VALUES ('delete', old.id, old.original_message);
+            INSERT INTO shifts_fts (rowid, original_message)
+            VALUES (new.id, new.original_message);
+        END
+        """,
+        # Индекс по уже существующим сменам
+        "INSERT INTO shifts_fts (shifts_fts) VALUES ('rebuild')",
+    ]),
+    (6, "Компактный формат parsed_data и calculation_details (blob_codec)", [
+        _reencode_blobs,
+    ]),
+    (7, "Отчёт ночной сверки earnings (nightly_recompute.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS drift_runs (
+            run_id TEXT PRIMARY KEY,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            workers INTEGER NOT NULL,
+            projects INTEGER NOT NULL,
+            shifts INTEGER NOT NULL,
+            drifted INTEGER NOT NULL,
+            seconds REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS earnings_drift (
+            run_id TEXT NOT NULL,
+            project_id INTEGER NOT NULL,
+            shift_id INTEGER NOT NULL,
+            stored_net INTEGER,
+            fresh_net INTEGER NOT NULL,
+            stored_gross INTEGER,
+            fresh_gross INTEGER NOT NULL,
+            stored_overtime_hours REAL,
+            fresh_overtime_hours REAL NOT NULL,
+            PRIMARY KEY (run_id, shift_id)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (8, "Версия настроек профессии и версия, с которой рассчитана смена", [
+        "ALTER TABLE professions ADD COLUMN config_version INTEGER NOT NULL DEFAULT 1",
+        "ALTER TABLE earnings ADD COLUMN calculated_with_version INTEGER",
+        # Уже рассчитанные смены считаются актуальными
+        "UPDATE earnings SET calculated_with_version = 1",
+    ]),
+    (9, "Проекты с устаревшими расчётами (stale_projects)", [
+        "CREATE TABLE IF NOT EXISTS stale_projects (project_id INTEGER PRIMARY KEY)",
+        # Новая версия настроек - проект проверяется фоновым пересчётом
+        # (в том числе если версию поднял другой процесс)
+        """
+        CREATE TRIGGER IF NOT EXISTS professions_stale AFTER UPDATE OF config_version ON professions
+        WHEN new.config_version > old.config_version BEGIN
+            INSERT INTO stale_projects (project_id)
+            SELECT new.project_id
+            WHERE new.project_id NOT IN (SELECT project_id FROM stale_projects);
+        END
+        """,
+        # Расчёт записан по старой версии (кэш другого процесса) или без неё
+        f"""
+        CREATE TRIGGER IF NOT EXISTS earnings_stale_insert AFTER INSERT ON earnings
+        WHEN {_EARNINGS_STALE_SQL} BEGIN
+            INSERT INTO stale_projects (project_id)
+            SELECT project_id FROM shifts
+            WHERE id = new.shift_id
+              AND project_id NOT IN (SELECT project_id FROM stale_projects);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS earnings_stale_update AFTER UPDATE OF calculated_with_version ON earnings
+        WHEN {_EARNINGS_STALE_SQL} BEGIN
+            INSERT INTO stale_projects (project_id)
+            SELECT project_id FROM shifts
+            WHERE id = new.shift_id
+              AND project_id NOT IN (SELECT project_id FROM stale_projects);
+        END
+        """,
+        # Проекты, где устаревшие смены уже есть. В триггерах - NOT IN,
+        # а не OR IGNORE: в UPSERT earnings политика конфликта внешнего
+        # запроса заменяет политику INSERT внутри триггера
+        """
+        INSERT OR IGNORE INTO stale_projects (project_id)
+        SELECT DISTINCT s.project_id
+        FROM shifts s
+        JOIN earnings e ON e.shift_id = s.id
+        JOIN professions p ON p.id = (SELECT MIN(p2.id) FROM professions p2 WHERE p2.project_id = s.project_id)
+        WHERE s.status = 'calculated' AND COALESCE(e.calculated_with_version, 0) < p.config_version
+        """,
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+async def get_schema_version(db) -> int:
+    """Текущая версия схемы (PRAGMA user_version)"""
+    async with db.execute("PRAGMA user_version") as cursor:
+        return (await cursor.fetchone())[0]
+
+async def migrate(db):
+    """
+    Применить недостающие миграции
+
+    Args:
+        db: Соединение с БД
+
+    Returns:
+        Версия схемы после миграции
+    """
+    version = await get_schema_version(db)
+
+    for step_version, description, statements in MIGRATIONS:
+        if step_version <= version:
+            continue
+
+        logger.info("Миграция БД %s: %s", step_version, description)
+        await db.execute("BEGIN")
+        try:
+            for statement in statements:
+                # Шаг миграции - SQL или корутина step(db) для переноса данных
+                if callable(statement):
+                    await statement(db)
+                else:
+                    await db.execute(statement)
+            await db.execute(f"PRAGMA user_version = {step_version}")
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        version = step_version
+
+    return version
 
 async def init_db():
-    """Инициализация базы данных"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        # Таблица users
+    """Инициализация базы данных (и пула соединений)"""
+    await init_pool()
+
+    async with get_connection() as db:
+        await create_schema(db)
+
+async def create_schema(db):
+    """Таблицы (CREATE TABLE IF NOT EXISTS) и миграции на соединении db"""
+    # Таблица users
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT,
+            contractor_type TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        )
+    """)
+    
+    # Таблица projects
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS projects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+    
+    # Таблица shifts
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS shifts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            total_hours REAL,
+            overtime_hours REAL DEFAULT 0,
+            is_expense_day BOOLEAN DEFAULT 0,
+            status TEXT DEFAULT 'draft',
+            original_message TEXT,
+            parsed_data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            confirmed_at TIMESTAMP,
+            FOREIGN KEY (project_id) REFERENCES projects(id)
+        )
+    """)
+
+    # Таблица professions
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS professions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            position TEXT,
+            base_rate_net INTEGER NOT NULL,
+            base_rate_gross INTEGER NOT NULL,
+            base_overtime_rate INTEGER DEFAULT 0,
+            daily_allowance INTEGER DEFAULT 0,
+            base_shift_hours REAL DEFAULT 12,
+            break_hours REAL DEFAULT 12,
+            tax_percentage REAL DEFAULT 13,
+            payment_schedule TEXT DEFAULT 'monthly',
+            conditions TEXT,
+            overtime_rounding REAL DEFAULT 0,
+            overtime_threshold REAL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (project_id) REFERENCES projects(id)
+        )
+    """)
+
+    # Таблица progressive_rates
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS progressive_rates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            profession_id INTEGER NOT NULL,
+            hours_from REAL NOT NULL,
+            hours_to REAL,
+            rate INTEGER NOT NULL,
+            order_num INTEGER NOT NULL,
+            FOREIGN KEY (profession_id) REFERENCES professions(id)
+        )
+    """)
+
+    # Таблица additional_services
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS additional_services (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            profession_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            cost INTEGER NOT NULL,
+            tax_percentage REAL DEFAULT 13,
+            application_rule TEXT DEFAULT 'on_mention',
+            linked_service_id INTEGER,
+            keywords TEXT,
+            FOREIGN KEY (profession_id) REFERENCES professions(id),
+            FOREIGN KEY (linked_service_id) REFERENCES additional_services(id)
+        )
+    """)
+    
+    # === НОВЫЕ ТАБЛИЦЫ (Шаг 6.1) ===
+    
+    # Таблица meal_types (типы обедов: текущий, поздний и т.д.)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS meal_types (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            profession_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            adds_overtime_hours REAL DEFAULT 1.0,
+            keywords TEXT,
+            FOREIGN KEY (profession_id) REFERENCES professions(id)
+        )
+    """)
+    
+    # Таблица shift_meals (связь смен и обедов)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS shift_meals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shift_id INTEGER NOT NULL,
+            meal_type_id INTEGER NOT NULL,
+            FOREIGN KEY (shift_id) REFERENCES shifts(id),
+            FOREIGN KEY (meal_type_id) REFERENCES meal_types(id)
+        )
+    """)
+
+    # Таблица shift_services (связь смен и услуг)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS shift_services (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shift_id INTEGER NOT NULL,
+            service_id INTEGER NOT NULL,
+            applied BOOLEAN DEFAULT 1,
+            FOREIGN KEY (shift_id) REFERENCES shifts(id),
+            FOREIGN KEY (service_id) REFERENCES additional_services(id)
+        )
+    """)
+
+    # Таблица earnings
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS earnings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            shift_id INTEGER NOT NULL,
+            base_pay_net INTEGER,
+            base_pay_gross INTEGER,
+            overtime_pay INTEGER DEFAULT 0,
+            daily_allowance INTEGER DEFAULT 0,
+            services_pay INTEGER DEFAULT 0,
+            total_net INTEGER,
+            total_gross INTEGER,
+            calculation_details TEXT,
+            calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (shift_id) REFERENCES shifts(id)
+        )
+    """)
+
+    await db.commit()
+
+    # Индексы и дальнейшие изменения схемы - через миграции
+    await migrate(db)
+
+async def create_user(user_id: int, username: str):
+    """Создание нового пользователя"""
+    async def op(db):
+        await db.execute(
+            "INSERT OR IGNORE INTO users (id, username) VALUES (?, ?)",
+            (user_id, username)
+        )
+
+    await _write(op)
+
+USER_SQL = "SELECT * FROM users WHERE id = ?"
+
+async def get_user(user_id: int):
+    """Получение пользователя по ID"""
+    async with get_connection() as db:
+        async with db.execute(USER_SQL, (user_id,)) as cursor:
+            return await cursor.fetchone()
+
+async def set_contractor_type(user_id: int, contractor_type: str):
+    """Установка типа контрагента пользователя"""
+    async def op(db):
+        await db.execute(
+            "UPDATE users SET contractor_type = ? WHERE id = ?",
+            (contractor_type, user_id)
+        )
+
+    await _write(op)
+
+async def create_project(user_id: int, name: str, description: str = ""):
+    """Создание нового проекта"""
+    async def op(db):
+        cursor = await db.execute(
+            "INSERT INTO projects (user_id, name, description) VALUES (?, ?, ?)",
+            (user_id, name, description)
+        )
+        return cursor.lastrowid
+
+    return await _write(op)
+
+USER_PROJECTS_SQL = "SELECT * FROM projects WHERE user_id = ? ORDER BY created_at DESC"
+ACTIVE_PROJECT_SQL = "SELECT * FROM projects WHERE user_id = ? AND is_active = 1 LIMIT 1"
+
+async def get_user_projects(user_id: int):
+    """Получение всех проектов пользователя"""
+    async with get_connection() as db:
+        async with db.execute(USER_PROJECTS_SQL, (user_id,)) as cursor:
+            return await cursor.fetchall()
+
+async def get_active_project(user_id: int):
+    """Получение активного проекта"""
+    async with get_connection() as db:
+        async with db.execute(ACTIVE_PROJECT_SQL, (user_id,)) as cursor:
+            return await cursor.fetchone()
+
+# === ФУНКЦИИ ДЛЯ РАБОТЫ СО СМЕНАМИ ===
+
+async def create_shift(
+    project_id: int,
+    date: str,
+    start_time: str,
+    end_time: str,
+    total_hours: float,
+    original_message: str,
+    parsed_data: str
+):
+    """Создание новой смены"""
+    async def op(db):
+        cursor = await db.execute("""
+            INSERT INTO shifts (
+                project_id, date, start_time, end_time,
+                total_hours, original_message, parsed_data, status
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, 'draft')
+        """, (
+            project_id, date, start_time, end_time, total_hours,
+            original_message, blob_codec.encode(parsed_data)
+        ))
+        return cursor.lastrowid
+
+    return await _write(op)
+
+async def confirm_shift(shift_id: int):
+    """Подтверждение смены"""
+    async def op(db):
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                username TEXT,
-                contractor_type TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1
-            )
-        """)
-        
-        # Таблица projects
+            UPDATE shifts 
+            SET status = 'confirmed', confirmed_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (shift_id,))
+
+    await _write(op)
+
+SHIFT_SQL = "SELECT * FROM shifts WHERE id = ?"
+
+SHIFT_DETAILS_SQL = """
+    SELECT
+        s.*,
+        e.base_pay_net, e.base_pay_gross, e.overtime_pay,
+        e.daily_allowance, e.services_pay, e.total_net, e.total_gross,
+        e.calculation_details, e.revision, e.calculated_at
+    FROM shifts s
+    LEFT JOIN earnings e ON e.shift_id = s.id
+    WHERE s.id = ?
+"""
+
+async def get_shift(shift_id: int):
+    """Получение смены по ID"""
+    with timed("db.get_shift"):
+        async with get_connection() as db:
+            async with db.execute(SHIFT_SQL, (shift_id,)) as cursor:
+                return await cursor.fetchone()
+
+async def get_shift_details(shift_id: int, reporting: bool = False):
+    """
+    Смена вместе со строкой earnings (поля earnings - None, если не рассчитана)
+
+    parsed_data и calculation_details возвращаются как хранятся в БД,
+    для чтения - blob_codec.decode
+    """
+    async with _reader(reporting) as db:
+        async with db.execute(SHIFT_DETAILS_SQL, (shift_id,)) as cursor:
+            return await cursor.fetchone()
+
+async def get_user_shifts(project_id: int, limit: int = 10, cursor: str = None):
+    """Получение смен проекта (новые первыми, cursor - продолжение ленты)"""
+    shifts, _ = await get_shifts_page(project_id, limit=limit, cursor=cursor, status=None)
+    return shifts
+
+def encode_shift_cursor(date: str, shift_id: int) -> str:
+    """Курсор ленты смен: позиция (date, id) последней выданной смены"""
+    return base64.urlsafe_b64encode(f"{date}|{shift_id}".encode()).decode().rstrip("=")
+
+def decode_shift_cursor(cursor: str):
+    """
+    Разбор курсора ленты смен
+
+    Returns:
+        (date, shift_id)
+
+    Raises:
+        ValueError: Курсор повреждён
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, shift_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return date, int(shift_id)
+    except Exception:
+        raise ValueError(f"Некорректный курсор: {cursor!r}")
+
+# {where} - условия get_shifts_page через AND
+SHIFTS_PAGE_SQL = """
+    SELECT s.*, e.total_net, e.total_gross
+    FROM shifts s
+    LEFT JOIN earnings e ON e.shift_id = s.id
+    WHERE {where}
+    ORDER BY s.date DESC, s.id DESC
+    LIMIT ?
+"""
+
+def _shifts_page_conditions(project_id: int, cursor: str = None, status: str = None, since: str = None):
+    conditions = ["s.project_id = ?"]
+    params = [project_id]
+
+    if status is not None:
+        conditions.append("s.status = ?")
+        params.append(status)
+
+    if since:
+        conditions.append("s.date >= ?")
+        params.append(since)
+
+    if cursor:
+        date, shift_id = decode_shift_cursor(cursor)
+        conditions.append("(s.date, s.id) < (?, ?)")
+        params.extend((date, shift_id))
+
+    return conditions, params
+
+async def get_shifts_page(
+    project_id: int,
+    limit: int = SHIFTS_PAGE_SIZE,
+    cursor: str = None,
+    status: str = 'calculated',
+    since: str = None,
+    reporting: bool = False
+):
+    """
+    Страница ленты смен проекта с заработком (keyset-пагинация по (date, id))
+
+    Стоимость запроса не зависит от номера страницы: продолжение ищется
+    по индексу (project_id, [status,] date), без OFFSET.
+
+    Args:
+        project_id: ID проекта
+        limit: Размер страницы (не больше SHIFTS_PAGE_MAX)
+        cursor: next_cursor предыдущей страницы (None - первая страница)
+        status: Статус смен (None - все смены)
+        since: Только смены с даты YYYY-MM-DD включительно
+        reporting: Читать через пул отчётов (только чтение)
+
+    Returns:
+        (смены, next_cursor) - next_cursor None, если страница последняя
+
+    Raises:
+        ValueError: Некорректный курсор
+    """
+    limit = max(1, min(int(limit), SHIFTS_PAGE_MAX))
+    conditions, params = _shifts_page_conditions(project_id, cursor, status, since)
+
+    async with _reader(reporting) as db:
+        async with db.execute(
+            SHIFTS_PAGE_SQL.format(where=" AND ".join(conditions)), (*params, limit + 1)
+        ) as db_cursor:
+            rows = await db_cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_shift_cursor(rows[-1]["date"], rows[-1]["id"])
+
+    return rows, next_cursor
+
+def build_search_query(query: str) -> str:
+    """
+    Запрос FTS5 из пользовательского текста
+
+    "поздний обед" в кавычках - точная фраза, иначе все слова
+    по префиксу ("обед" найдёт "обеда", "обедом"). Спецсимволы
+    синтаксиса FTS5 из пользовательского текста не передаются.
+
+    Returns:
+        Строка для MATCH ("" - в запросе нет слов)
+    """
+    query = query.strip()
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return ""
+
+    if len(query) > 1 and query[0] == query[-1] == '"':
+        return '"' + " ".join(words) + '"'
+    return " ".join(f'"{word}"*' for word in words)
+
+SEARCH_SHIFTS_SQL = """
+    SELECT
+        s.id, s.date, s.start_time, s.end_time,
+        s.total_hours, s.overtime_hours, s.status,
+        snippet(shifts_fts, 0, '[', ']', '…', 12) AS snippet,
+        bm25(shifts_fts) AS rank
+    FROM shifts_fts
+    JOIN shifts s ON s.id = shifts_fts.rowid
+    WHERE shifts_fts MATCH ? AND s.project_id = ?
+    ORDER BY rank
+    LIMIT ?
+"""
+
+async def search_shifts(
+    project_id: int,
+    query: str,
+    limit: int = 20,
+    reporting: bool = False
+):
+    """
+    Полнотекстовый поиск смен проекта по исходному сообщению
+
+    Args:
+        project_id: ID проекта
+        query: Текст запроса (см. build_search_query)
+        limit: Сколько результатов вернуть (не больше SHIFTS_PAGE_MAX)
+        reporting: Читать через пул отчётов (только чтение)
+
+    Returns:
+        Смены по убыванию релевантности (bm25) с полями
+        snippet (совпадения в [скобках]) и rank
+    """
+    match = build_search_query(query)
+    if not match:
+        return []
+
+    limit = max(1, min(int(limit), SHIFTS_PAGE_MAX))
+
+    async with _reader(reporting) as db:
+        async with db.execute(SEARCH_SHIFTS_SQL, (match, project_id, limit)) as cursor:
+            return await cursor.fetchall()
+
+EXPORT_PROJECT_SQL = "SELECT name FROM projects WHERE id = ?"
+
+EXPORT_SHIFTS_SQL = """
+    SELECT 
+        s.date,
+        s.start_time,
+        s.end_time,
+        s.total_hours,
+        s.overtime_hours,
+        e.total_net,
+        e.total_gross
+    FROM shifts s
+    LEFT JOIN earnings e ON e.shift_id = s.id
+    WHERE s.project_id = ? AND s.status = 'calculated'
+    ORDER BY s.date ASC
+"""
+
+async def get_project_export(project_id: int):
+    """
+    Данные для экспорта проекта в CSV (через пул отчётов, только чтение)
+
+    Returns:
+        (название проекта или None, рассчитанные смены по возрастанию даты)
+    """
+    async with get_reporting_connection() as db:
+        async with db.execute(EXPORT_PROJECT_SQL, (project_id,)) as cursor:
+            project = await cursor.fetchone()
+
+        async with db.execute(EXPORT_SHIFTS_SQL, (project_id,)) as cursor:
+            shifts = await cursor.fetchall()
+
+    return (project["name"] if project else None), shifts
+
+async def delete_shift(shift_id: int):
+    """Удаление смены (вместе с её обедами, услугами и заработком)"""
+    async def op(db):
+        before = await _period_contribution(db, shift_id)
+        await db.execute("DELETE FROM earnings WHERE shift_id = ?", (shift_id,))
+        await db.execute("DELETE FROM shift_meals WHERE shift_id = ?", (shift_id,))
+        await db.execute("DELETE FROM shift_services WHERE shift_id = ?", (shift_id,))
+        await db.execute("DELETE FROM shifts WHERE id = ?", (shift_id,))
+        await _apply_period_delta(db, before, None)
+
+    await _write(op)
+
+# === ЗАПИСЬ РАСЧЁТА СМЕНЫ (одной транзакцией) ===
+
+UPSERT_EARNINGS_SQL = """
+    INSERT INTO earnings (
+        shift_id, base_pay_net, base_pay_gross,
+        overtime_pay, daily_allowance, services_pay,
+        total_net, total_gross, calculation_details, calculated_with_version
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(shift_id) DO UPDATE SET
+        base_pay_net = excluded.base_pay_net,
+        base_pay_gross = excluded.base_pay_gross,
+        overtime_pay = excluded.overtime_pay,
+        daily_allowance = excluded.daily_allowance,
+        services_pay = excluded.services_pay,
+        total_net = excluded.total_net,
+        total_gross = excluded.total_gross,
+        calculation_details = excluded.calculation_details,
+        calculated_with_version = excluded.calculated_with_version,
+        revision = earnings.revision + 1,
+        calculated_at = CURRENT_TIMESTAMP
+"""
+
+
+def _earnings_params(shift_id: int, earnings: dict) -> tuple:
+    return (
+        shift_id, earnings["base_pay_net"], earnings["base_pay_gross"],
+        earnings["overtime_pay"], earnings["daily_allowance"], earnings["services_pay"],
+        earnings["total_net"], earnings["total_gross"],
+        blob_codec.encode(earnings["calculation_details"]),
+        # Версия настроек профессии, по которой считали (None - устаревший расчёт)
+        earnings.get("calculated_with_version")
+    )
+
+
+async def _upsert_earnings(db, shift_id: int, earnings: dict):
+    """
+    Запись расчёта смены в earnings (без commit)
+    
+    У смены одна строка earnings: повторный расчёт перезаписывает её,
+    увеличивает revision и обновляет calculated_at.
+    """
+    # Кодирование calculation_details (blob_codec) и сам UPSERT
+    with timed("db.upsert_earnings"):
+        await db.execute(UPSERT_EARNINGS_SQL, _earnings_params(shift_id, earnings))
+
+PERIOD_CONTRIBUTION_SQL = """
+    SELECT
+        s.id,
+        s.project_id,
+        substr(s.date, 1, 7) AS period,
+        COALESCE(s.total_hours, 0) AS total_hours,
+        COALESCE(s.overtime_hours, 0) AS overtime_hours,
+        COALESCE(e.total_net, 0) AS total_net,
+        COALESCE(e.total_gross, 0) AS total_gross
+    FROM shifts s
+    LEFT JOIN earnings e ON e.shift_id = s.id
+    WHERE s.status = 'calculated' AND s.id IN ({ids})
+"""
+
+# Параметров в одном IN (...) - с запасом под SQLITE_MAX_VARIABLE_NUMBER
+_IN_CHUNK = 500
+
+
+def _chunks(items, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def _period_contribution(db, shift_id: int):
+    """
+    Вклад смены в project_period_totals или None,
+    если смена не рассчитана (не учитывается в агрегатах)
+    """
+    async with db.execute(PERIOD_CONTRIBUTION_SQL.format(ids="?"), (shift_id,)) as cursor:
+        return await cursor.fetchone()
+
+
+async def _period_contributions(db, shift_ids) -> dict:
+    """Вклады нескольких смен: {shift_id: вклад} (только рассчитанные смены)"""
+    contributions = {}
+    for chunk in _chunks(list(shift_ids), _IN_CHUNK):
+        sql = PERIOD_CONTRIBUTION_SQL.format(ids=", ".join("?" * len(chunk)))
+        async with db.execute(sql, chunk) as cursor:
+            for row in await cursor.fetchall():
+                contributions[row["id"]] = row
+    return contributions
+
+
+async def _apply_period_delta(db, before, after):
+    """
+    Применить к project_period_totals разницу вкладов смены (до/после записи).
+    Вызывается внутри транзакции записи смены, commit делает вызывающий.
+    """
+    await _apply_period_deltas(db, [(before, after)])
+
+
+async def _apply_period_deltas(db, pairs):
+    """
+    То же для нескольких смен: pairs - пары вкладов (до, после).
+    Разницы суммируются по (project_id, period) до записи в таблицу.
+    """
+    deltas = {}
+    for before, after in pairs:
+        for row, sign in ((before, -1), (after, 1)):
+            if row is None:
+                continue
+            key = (row["project_id"], row["period"])
+            delta = deltas.setdefault(key, [0, 0.0, 0.0, 0, 0])
+            delta[0] += sign
+            delta[1] += sign * row["total_hours"]
+            delta[2] += sign * row["overtime_hours"]
+            delta[3] += sign * row["total_net"]
+            delta[4] += sign * row["total_gross"]
+
+    for (project_id, period), delta in deltas.items():
+        if not any(delta):
+            continue
+
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS projects (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                description TEXT,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
-        
-        # Таблица shifts
+            INSERT INTO project_period_totals
+                (project_id, period, shift_count, total_hours,
+                 overtime_hours, total_net, total_gross)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(project_id, period) DO UPDATE SET
+                shift_count = shift_count + excluded.shift_count,
+                total_hours = total_hours + excluded.total_hours,
+                overtime_hours = overtime_hours + excluded.overtime_hours,
+                total_net = total_net + excluded.total_net,
+                total_gross = total_gross + excluded.total_gross
+        """, (project_id, period, *delta))
+
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS shifts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER NOT NULL,
-                date DATE NOT NULL,
-                start_time TIME NOT NULL,
-                end_time TIME NOT NULL,
-                total_hours REAL,
-                overtime_hours REAL DEFAULT 0,
-                is_expense_day BOOLEAN DEFAULT 0,
-                status TEXT DEFAULT 'draft',
-                original_message TEXT,
-                parsed_data TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                confirmed_at TIMESTAMP,
-                FOREIGN KEY (project_id) REFERENCES projects(id)
+            DELETE FROM project_period_totals
+            WHERE project_id = ? AND period = ? AND shift_count <= 0
+        """, (project_id, period))
+
+
+async def persist_confirmed_shift(
+    project_id: int,
+    date: str,
+    start_time: str,
+    end_time: str,
+    total_hours: float,
+    original_message: str,
+    parsed_data: str,
+    overtime_hours: float = 0,
+    meal_type_ids: list = (),
+    service_ids: list = (),
+    earnings: dict = None
+):
+    """
+    Сохранение подтверждённой смены одной транзакцией
+
+    Пишет смену, её обеды, услуги, заработок и итоговый статус
+    с единственным commit: при ошибке не остаётся частичных данных.
+
+    Args:
+        overtime_hours: Итого часов переработки (с обедами)
+        meal_type_ids: ID типов обедов смены
+        service_ids: ID применённых услуг
+        earnings: Строка для таблицы earnings (None - расчёта нет,
+                  смена остаётся в статусе 'confirmed')
+
+    Returns:
+        ID созданной смены
+    """
+    status = 'calculated' if earnings is not None else 'confirmed'
+
+    async def op(db):
+        cursor = await db.execute("""
+            INSERT INTO shifts (
+                project_id, date, start_time, end_time,
+                total_hours, overtime_hours, original_message, parsed_data,
+                status, confirmed_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (
+            project_id, date, start_time, end_time,
+            total_hours, overtime_hours, original_message, blob_codec.encode(parsed_data),
+            status
+        ))
+        shift_id = cursor.lastrowid
+
+        if meal_type_ids:
+            await db.executemany(
+                "INSERT INTO shift_meals (shift_id, meal_type_id) VALUES (?, ?)",
+                [(shift_id, meal_type_id) for meal_type_id in meal_type_ids]
             )
-        """)
 
-        # Таблица professions
+        if service_ids:
+            await db.executemany(
+                "INSERT INTO shift_services (shift_id, service_id) VALUES (?, ?)",
+                [(shift_id, service_id) for service_id in service_ids]
+            )
+
+        if earnings is not None:
+            await _upsert_earnings(db, shift_id, earnings)
+            await _apply_period_delta(db, None, await _period_contribution(db, shift_id))
+
+        return shift_id
+
+    # Вместе с ожиданием в очереди записи и commit
+    with timed("db.persist_confirmed_shift"):
+        return await _write(op)
+
+async def save_shift_earnings(shift_id: int, overtime_hours: float, earnings: dict):
+    """
+    Сохранение расчёта существующей смены одной транзакцией
+    (overtime_hours, строка earnings и статус 'calculated')
+    """
+    async def op(db):
+        before = await _period_contribution(db, shift_id)
         await db.execute("""
-            CREATE TABLE IF NOT EXISTS professions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                project_id INTEGER NOT NULL,
-                position TEXT,
-                base_rate_net INTEGER NOT NULL,
-                base_rate_gross INTEGER NOT NULL,
-                base_overtime_rate INTEGER DEFAULT 0,
-                daily_allowance INTEGER DEFAULT 0,
-                base_shift_hours REAL DEFAULT 12,
-                break_hours REAL DEFAULT 12,
-                tax_percentage REAL DEFAULT 13,
-                payment_schedule TEXT DEFAULT 'monthly',
-                conditions TEXT,
-                overtime_rounding REAL DEFAULT 0,
-                overtime_threshold REAL DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (project_id) REFERENCES projects(id)
-            )
-        """)
+            UPDATE shifts
+            SET overtime_hours = ?, status = 'calculated'
+            WHERE id = ?
+        """, (overtime_hours, shift_id))
+        await _upsert_earnings(db, shift_id, earnings)
+        await _apply_period_delta(db, before, await _period_contribution(db, shift_id))
 
-        # Таблица progressive_rates
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS progressive_rates (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                profession_id INTEGER NOT NULL,
-                hours_from REAL NOT NULL,
-                hours_to REAL,
-                rate INTEGER NOT NULL,
-                order_num INTEGER NOT NULL,
-                FOREIGN KEY (profession_id) REFERENCES professions(id)
-            )
-        """)
+    # Вместе с ожиданием в очереди записи и commit
+    with timed("db.save_shift_earnings"):
+        await _write(op)
 
-        # Таблица additional_services
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS additional_services (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                profession_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                cost INTEGER NOT NULL,
-                tax_percentage REAL DEFAULT 13,
-                application_rule TEXT DEFAULT 'on_mention',
-                linked_service_id INTEGER,
-                keywords TEXT,
-                FOREIGN KEY (profession_id) REFERENCES professions(id),
-                FOREIGN KEY (linked_service_id) REFERENCES additional_services(id)
-            )
-        """)
-        
-        # === НОВЫЕ ТАБЛИЦЫ (Шаг 6.1) ===
-        
-        # Таблица meal_types (типы обедов: текущий, поздний и т.д.)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS meal_types (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                profession_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                adds_overtime_hours REAL DEFAULT 1.0,
-                keywords TEXT,
-                FOREIGN KEY (profession_id) REFERENCES professions(id)
-            )
-        """)
-        
-        # Таблица shift_meals (связь смен и обедов)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS shift_meals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                shift_id INTEGER NOT NULL,
-                meal_type_id INTEGER NOT NULL,
-                FOREIGN KEY (shift_id) REFERENCES shifts(id),
-                FOREIGN KEY (meal_type_id) REFERENCES meal_types(id)
-            )
-        """)
+# === МАССОВЫЙ ПЕРЕСЧЁТ ПРОЕКТА ===
 
-        # Таблица shift_services (связь смен и услуг)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS shift_services (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                shift_id INTEGER NOT NULL,
-                service_id INTEGER NOT NULL,
-                applied BOOLEAN DEFAULT 1,
-                FOREIGN KEY (shift_id) REFERENCES shifts(id),
-                FOREIGN KEY (service_id) REFERENCES additional_services(id)
-            )
-        """)
+# Смены, которые пересчитываются вместе с проектом
+RECALC_STATUSES = ('confirmed', 'calculated')
 
-        # Таблица earnings
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS earnings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                shift_id INTEGER NOT NULL,
-                base_pay_net INTEGER,
-                base_pay_gross INTEGER,
-                overtime_pay INTEGER DEFAULT 0,
-                daily_allowance INTEGER DEFAULT 0,
-                services_pay INTEGER DEFAULT 0,
-                total_net INTEGER,
-                total_gross INTEGER,
-                calculation_details TEXT,
-                calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (shift_id) REFERENCES shifts(id)
-            )
-        """)
 
-        await db.commit()
+def _recalc_conditions(project_id: int, date_from: str = None, date_to: str = None):
+    conditions = [
+        "s.project_id = ?",
+        f"s.status IN ({', '.join('?' * len(RECALC_STATUSES))})",
+        "s.total_hours IS NOT NULL"
+    ]
+    params = [project_id, *RECALC_STATUSES]
 
-async def create_user(user_id: int, username: str):
-    """Создание нового пользователя"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute(
-            "INSERT OR IGNORE INTO users (id, username) VALUES (?, ?)",
-            (user_id, username)
-        )
-        await db.commit()
+    if date_from:
+        conditions.append("s.date >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("s.date <= ?")
+        params.append(date_to)
 
-async def get_user(user_id: int):
-    """Получение пользователя по ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM users WHERE id = ?", 
-            (user_id,)
-        ) as cursor:
-            return await cursor.fetchone()
+    return conditions, params
 
-async def create_project(user_id: int, name: str, description: str = ""):
-    """Создание нового проекта"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute(
-            "INSERT INTO projects (user_id, name, description) VALUES (?, ?, ?)",
-            (user_id, name, description)
-        )
-        await db.commit()
-        return cursor.lastrowid
 
-async def get_user_projects(user_id: int):
-    """Получение всех проектов пользователя"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM projects WHERE user_id = ? ORDER BY created_at DESC",
-            (user_id,)
-        ) as cursor:
-            return await cursor.fetchall()
+# {where} - условия _recalc_conditions через AND
+COUNT_RECALC_SHIFTS_SQL = "SELECT COUNT(*) FROM shifts s WHERE {where}"
 
-async def get_active_project(user_id: int):
-    """Получение активного проекта"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
+RECALC_SHIFTS_SQL = """
+    SELECT s.id, s.date, s.total_hours, s.parsed_data, s.is_expense_day
+    FROM shifts s
+    WHERE {where}
+    ORDER BY s.date, s.id
+    LIMIT ?
+"""
+
+
+async def count_recalc_shifts(project_id: int, date_from: str = None, date_to: str = None) -> int:
+    """Сколько смен проекта попадёт в пересчёт (для прогресса)"""
+    conditions, params = _recalc_conditions(project_id, date_from, date_to)
+
+    async with get_connection() as db:
         async with db.execute(
-            "SELECT * FROM projects WHERE user_id = ? AND is_active = 1 LIMIT 1",
-            (user_id,)
+            COUNT_RECALC_SHIFTS_SQL.format(where=" AND ".join(conditions)), params
         ) as cursor:
-            return await cursor.fetchone()
+            return (await cursor.fetchone())[0]
 
-# === ФУНКЦИИ ДЛЯ РАБОТЫ СО СМЕНАМИ ===
 
-async def create_shift(
+async def _attached_meals(db, shift_ids) -> dict:
+    """Обеды, привязанные к сменам: {shift_id: [строки meal_types]}"""
+    meals = {}
+    for chunk in _chunks(list(shift_ids), _IN_CHUNK):
+        async with db.execute(f"""
+            SELECT sm.shift_id, mt.*
+            FROM shift_meals sm
+            JOIN meal_types mt ON sm.meal_type_id = mt.id
+            WHERE sm.shift_id IN ({", ".join("?" * len(chunk))})
+        """, chunk) as cursor:
+            for row in await cursor.fetchall():
+                meals.setdefault(row["shift_id"], []).append(row)
+    return meals
+
+
+async def iter_recalc_shifts(
     project_id: int,
-    date: str,
-    start_time: str,
-    end_time: str,
-    total_hours: float,
-    original_message: str,
-    parsed_data: str
+    date_from: str = None,
+    date_to: str = None,
+    chunk_size: int = RECALC_CHUNK_SIZE
 ):
-    """Создание новой смены"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        cursor = await db.execute("""
-            INSERT INTO shifts (
-                project_id, date, start_time, end_time,
-                total_hours, original_message, parsed_data, status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, 'draft')
-        """, (project_id, date, start_time, end_time, total_hours, original_message, parsed_data))
-        await db.commit()
-        return cursor.lastrowid
+    """
+    Смены проекта для пересчёта порциями по chunk_size (по (date, id))
 
-async def confirm_shift(shift_id: int):
-    """Подтверждение смены"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("""
-            UPDATE shifts 
-            SET status = 'confirmed', confirmed_at = CURRENT_TIMESTAMP
+    Каждая порция читается отдельным запросом (keyset по (date, id)),
+    соединение между порциями не удерживается.
+
+    Args:
+        date_from, date_to: Период YYYY-MM-DD включительно (None - без границы)
+
+    Yields:
+        (смены, {shift_id: [обеды смены]})
+    """
+    conditions, params = _recalc_conditions(project_id, date_from, date_to)
+    last = None
+
+    while True:
+        where = list(conditions)
+        where_params = list(params)
+        if last is not None:
+            where.append("(s.date, s.id) > (?, ?)")
+            where_params.extend(last)
+
+        async with get_connection() as db:
+            async with db.execute(
+                RECALC_SHIFTS_SQL.format(where=" AND ".join(where)), (*where_params, chunk_size)
+            ) as cursor:
+                shifts = await cursor.fetchall()
+
+            if not shifts:
+                return
+
+            meals = await _attached_meals(db, [shift["id"] for shift in shifts])
+
+        yield shifts, meals
+
+        if len(shifts) < chunk_size:
+            return
+        last = (shifts[-1]["date"], shifts[-1]["id"])
+
+
+async def save_recalculated_shifts(results: list) -> int:
+    """
+    Запись результатов массового пересчёта одной транзакцией
+
+    overtime_hours, статус и earnings всех смен пишутся через executemany,
+    project_period_totals обновляется одной суммарной разницей.
+    Смены, удалённые после чтения, пропускаются.
+
+    Args:
+        results: [(shift_id, overtime_hours, earnings)]
+
+    Returns:
+        Сколько смен записано
+    """
+    async def op(db):
+        existing = set()
+        for chunk in _chunks([shift_id for shift_id, _, _ in results], _IN_CHUNK):
+            async with db.execute(f"""
+                SELECT id FROM shifts WHERE id IN ({", ".join("?" * len(chunk))})
+            """, chunk) as cursor:
+                existing.update(row["id"] for row in await cursor.fetchall())
+
+        rows = [result for result in results if result[0] in existing]
+        if not rows:
+            return 0
+
+        ids = [shift_id for shift_id, _, _ in rows]
+        before = await _period_contributions(db, ids)
+
+        await db.executemany("""
+            UPDATE shifts
+            SET overtime_hours = ?, status = 'calculated'
             WHERE id = ?
-        """, (shift_id,))
-        await db.commit()
+        """, [(overtime_hours, shift_id) for shift_id, overtime_hours, _ in rows])
+        await db.executemany(UPSERT_EARNINGS_SQL, [
+            _earnings_params(shift_id, earnings) for shift_id, _, earnings in rows
+        ])
 
-async def get_shift(shift_id: int):
-    """Получение смены по ID"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM shifts WHERE id = ?",
-            (shift_id,)
-        ) as cursor:
-            return await cursor.fetchone()
+        after = await _period_contributions(db, ids)
+        await _apply_period_deltas(db, [
+            (before.get(shift_id), after.get(shift_id)) for shift_id in ids
+        ])
+        return len(rows)
 
-async def get_user_shifts(project_id: int, limit: int = 10):
-    """Получение смен проекта"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM shifts WHERE project_id = ? ORDER BY date DESC, created_at DESC LIMIT ?",
-            (project_id, limit)
-        ) as cursor:
-            return await cursor.fetchall()
+    return await _write(op)
 
-async def delete_shift(shift_id: int):
-    """Удаление смены"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("DELETE FROM shifts WHERE id = ?", (shift_id,))
-        await db.commit()
+# === УСТАРЕВШИЕ РАСЧЁТЫ (config_version) ===
+#
+# Каждое изменение настроек профессии увеличивает professions.config_version.
+# Смена устарела, если её earnings.calculated_with_version меньше версии
+# профессии проекта; смены, которых изменение не касается, получают новую
+# версию сразу в той же транзакции.
+#
+# Проекты, где могут быть устаревшие смены, триггеры (миграция 9) пишут
+# в stale_projects: запросы ниже читают смены только этих проектов (по
+# индексу), а не сверяют версии всех смен. Проект убирается из таблицы,
+# когда устаревших смен в нём не осталось (clear_stale_projects).
+
+# Профессия проекта - первая по id (как в PROJECT_SNAPSHOT_SQL)
+# (CROSS JOIN - stale_projects всегда внешний цикл, без SCAN shifts)
+STALE_SHIFTS_SQL = """
+    FROM stale_projects
+    CROSS JOIN shifts s ON s.project_id = stale_projects.project_id AND s.status = 'calculated'
+    JOIN professions p ON p.id = (
+        SELECT MIN(p2.id) FROM professions p2 WHERE p2.project_id = stale_projects.project_id
+    )
+    JOIN earnings e ON e.shift_id = s.id
+    WHERE s.total_hours IS NOT NULL
+      AND COALESCE(e.calculated_with_version, 0) < p.config_version
+"""
+
+# Устаревшие смены: по всем проектам (фоновый пересчёт) и одного проекта
+GET_STALE_SHIFTS_SQL = f"""
+    SELECT s.id, s.project_id, s.total_hours, s.parsed_data, s.is_expense_day, p.config_version
+    {STALE_SHIFTS_SQL}
+    ORDER BY s.id
+    LIMIT ?
+"""
+COUNT_STALE_SHIFTS_SQL = f"SELECT COUNT(*) {STALE_SHIFTS_SQL}"
+COUNT_PROJECT_STALE_SHIFTS_SQL = f"{COUNT_STALE_SHIFTS_SQL} AND stale_projects.project_id = ?"
+CLEAR_STALE_PROJECTS_SQL = f"""
+    DELETE FROM stale_projects
+    WHERE project_id NOT IN (SELECT stale_projects.project_id {STALE_SHIFTS_SQL})
+"""
+
+
+async def _bump_config_version(db, profession_id: int, affected: str = None, params=()):
+    """
+    Новая версия настроек профессии (без commit)
+
+    Args:
+        affected: SQL-условие по сменам s, которых касается изменение
+                  (None - всех); остальные рассчитанные смены, бывшие
+                  актуальными, получают новую версию и не устаревают
+        params: Параметры условия affected
+    """
+    await db.execute(
+        "UPDATE professions SET config_version = config_version + 1 WHERE id = ?",
+        (profession_id,)
+    )
+    if affected is None:
+        return
+
+    await db.execute(f"""
+        UPDATE earnings
+        SET calculated_with_version = (SELECT config_version FROM professions WHERE id = ?)
+        WHERE calculated_with_version = (SELECT config_version - 1 FROM professions WHERE id = ?)
+          AND shift_id IN (
+              SELECT s.id
+              FROM shifts s
+              JOIN professions p ON p.project_id = s.project_id
+              WHERE p.id = ? AND s.status = 'calculated' AND NOT ({affected})
+          )
+    """, (profession_id, profession_id, profession_id, *params))
+
+
+async def get_stale_shifts(limit: int = STALE_RECOMPUTE_BATCH):
+    """
+    Устаревшие смены для фонового пересчёта (по id)
+
+    Returns:
+        (смены [id, project_id, total_hours, parsed_data, is_expense_day,
+         config_version], {shift_id: [обеды смены]})
+    """
+    async with get_connection() as db:
+        async with db.execute(GET_STALE_SHIFTS_SQL, (limit,)) as cursor:
+            shifts = await cursor.fetchall()
+
+        meals = await _attached_meals(db, [shift["id"] for shift in shifts]) if shifts else {}
+
+    return shifts, meals
+
+
+async def count_stale_shifts(project_id: int = None, reporting: bool = False) -> int:
+    """
+    Сколько рассчитанных смен ждут пересчёта после изменения настроек
+
+    Args:
+        project_id: Только смены проекта (None - все проекты)
+        reporting: Читать через пул отчётов (только чтение)
+    """
+    if project_id is None:
+        sql, params = COUNT_STALE_SHIFTS_SQL, ()
+    else:
+        sql, params = COUNT_PROJECT_STALE_SHIFTS_SQL, (project_id,)
+
+    async with _reader(reporting) as db:
+        async with db.execute(sql, params) as cursor:
+            return (await cursor.fetchone())[0]
+
+
+async def clear_stale_projects() -> int:
+    """
+    Убрать из stale_projects проекты без устаревших смен
+
+    Returns:
+        Сколько проектов убрано
+    """
+    async with get_connection() as db:
+        async with db.execute("SELECT 1 FROM stale_projects LIMIT 1") as cursor:
+            if await cursor.fetchone() is None:
+                return 0
+
+    async def op(db):
+        cursor = await db.execute(CLEAR_STALE_PROJECTS_SQL)
+        return cursor.rowcount
+
+    return await _write(op)
+
+# === НОЧНАЯ СВЕРКА EARNINGS (nightly_recompute.py) ===
+
+async def count_calculated_shifts_by_project() -> dict:
+    """Число рассчитанных смен по проектам с профессией: {project_id: count}"""
+    async with get_connection() as db:
+        async with db.execute("""
+            SELECT s.project_id, COUNT(*) AS shifts
+            FROM shifts s
+            WHERE s.status = 'calculated'
+              AND EXISTS (SELECT 1 FROM professions p WHERE p.project_id = s.project_id)
+            GROUP BY s.project_id
+        """) as cursor:
+            return {row["project_id"]: row["shifts"] for row in await cursor.fetchall()}
+
+
+async def save_drift_report(run: dict, drift: list, keep_runs: int = NIGHTLY_KEEP_RUNS):
+    """
+    Запись результата ночной сверки одной транзакцией
+
+    Старые прогоны сверх keep_runs удаляются вместе с их расхождениями.
+
+    Args:
+        run: run_id, workers, projects, shifts, drifted, seconds
+        drift: [(project_id, shift_id, stored_net, fresh_net, stored_gross,
+                 fresh_gross, stored_overtime_hours, fresh_overtime_hours)]
+    """
+    async def op(db):
+        await db.execute("""
+            INSERT INTO drift_runs (run_id, workers, projects, shifts, drifted, seconds)
+            VALUES (:run_id, :workers, :projects, :shifts, :drifted, :seconds)
+        """, run)
+        await db.executemany("""
+            INSERT INTO earnings_drift (
+                run_id, project_id, shift_id, stored_net, fresh_net,
+                stored_gross, fresh_gross, stored_overtime_hours, fresh_overtime_hours
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(run["run_id"], *row) for row in drift])
+
+        async with db.execute("""
+            SELECT run_id FROM drift_runs
+            ORDER BY started_at DESC, rowid DESC
+            LIMIT -1 OFFSET ?
+        """, (max(1, keep_runs),)) as cursor:
+            old = [row["run_id"] for row in await cursor.fetchall()]
+        for chunk in _chunks(old, _IN_CHUNK):
+            placeholders = ", ".join("?" * len(chunk))
+            await db.execute(f"DELETE FROM earnings_drift WHERE run_id IN ({placeholders})", chunk)
+            await db.execute(f"DELETE FROM drift_runs WHERE run_id IN ({placeholders})", chunk)
+
+    await _write(op)
+
+
+async def get_drift_report(run_id: str = None):
+    """
+    Прогон ночной сверки и его расхождения
+
+    Args:
+        run_id: ID прогона (None - последний)
+
+    Returns:
+        dict строки drift_runs + drift: [строки earnings_drift] или None
+    """
+    async with get_connection() as db:
+        if run_id is None:
+            query, params = "SELECT * FROM drift_runs ORDER BY started_at DESC, rowid DESC LIMIT 1", ()
+        else:
+            query, params = "SELECT * FROM drift_runs WHERE run_id = ?", (run_id,)
+        async with db.execute(query, params) as cursor:
+            run = await cursor.fetchone()
+
+        if run is None:
+            return None
+
+        async with db.execute("""
+            SELECT * FROM earnings_drift
+            WHERE run_id = ?
+            ORDER BY project_id, shift_id
+        """, (run["run_id"],)) as cursor:
+            drift = [dict(row) for row in await cursor.fetchall()]
+
+    return {**dict(run), "drift": drift}
 
 # === ФУНКЦИИ ДЛЯ РАБОТЫ С ПРОФЕССИЯМИ ===
 
@@ -287,7 +1904,7 @@ async def create_profession(
     # Расчёт брутто из нетто
     base_rate_gross = round(base_rate_net / (1 - tax_percentage / 100))
     
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async def op(db):
         cursor = await db.execute("""
             INSERT INTO professions (
                 project_id, position, base_rate_net, base_rate_gross,
@@ -301,17 +1918,19 @@ async def create_profession(
             base_shift_hours, break_hours, payment_schedule, conditions,
             overtime_rounding, overtime_threshold
         ))
-        await db.commit()
         return cursor.lastrowid
 
+    profession_id = await _write(op)
+    
+    profession_cache.invalidate(project_id)
+    return profession_id
+
+PROFESSION_SQL = "SELECT * FROM professions WHERE project_id = ?"
+
 async def get_profession_by_project(project_id: int):
     """Получение настроек профессии по проекту"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM professions WHERE project_id = ?",
-            (project_id,)
-        ) as cursor:
+    async with get_connection() as db:
+        async with db.execute(PROFESSION_SQL, (project_id,)) as cursor:
             return await cursor.fetchone()
 
 async def add_progressive_rate(
@@ -321,23 +1940,49 @@ async def add_progressive_rate(
     rate: int,
     order_num: int
 ):
-    """Добавление прогрессивной ставки переработки"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    """
+    Добавление прогрессивной ставки переработки
+
+    Ступени профессии (вместе с новой, по order_num) проверяются
+    validate_progressive_rates: без разрывов и пересечений.
+
+    Raises:
+        ValueError: Ступень нарушает непрерывность шкалы
+    """
+    async def op(db):
+        async with db.execute("""
+            SELECT hours_from, hours_to, order_num FROM progressive_rates
+            WHERE profession_id = ?
+            ORDER BY order_num
+        """, (profession_id,)) as cursor:
+            existing = await cursor.fetchall()
+
+        # Новая ступень - после существующих с тем же order_num
+        position = sum(1 for r in existing if r["order_num"] <= order_num)
+        brackets = [(r["hours_from"], r["hours_to"]) for r in existing]
+        brackets.insert(position, (hours_from, hours_to))
+        validate_progressive_rates(brackets)
+
         await db.execute("""
             INSERT INTO progressive_rates (
                 profession_id, hours_from, hours_to, rate, order_num
             ) VALUES (?, ?, ?, ?, ?)
         """, (profession_id, hours_from, hours_to, rate, order_num))
-        await db.commit()
+
+        # Ступень меняет оплату только смен с переработкой дальше её начала
+        await _bump_config_version(db, profession_id, "COALESCE(s.overtime_hours, 0) > ?", (hours_from,))
+
+    await _write(op)
+    
+    profession_cache.invalidate_profession(profession_id)
+    earnings_memo.invalidate_profession(profession_id)
+
+PROGRESSIVE_RATES_SQL = "SELECT * FROM progressive_rates WHERE profession_id = ? ORDER BY order_num"
 
 async def get_progressive_rates(profession_id: int):
     """Получение прогрессивных ставок профессии"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM progressive_rates WHERE profession_id = ? ORDER BY order_num",
-            (profession_id,)
-        ) as cursor:
+    async with get_connection() as db:
+        async with db.execute(PROGRESSIVE_RATES_SQL, (profession_id,)) as cursor:
             return await cursor.fetchall()
 
 async def add_additional_service(
@@ -349,23 +1994,28 @@ async def add_additional_service(
     keywords: str = ''
 ):
     """Добавление дополнительной услуги"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async def op(db):
         cursor = await db.execute("""
             INSERT INTO additional_services (
                 profession_id, name, cost, tax_percentage, application_rule, keywords
             ) VALUES (?, ?, ?, ?, ?, ?)
         """, (profession_id, name, cost, tax_percentage, application_rule, keywords))
-        await db.commit()
+        # Упомянутой может оказаться любая смена
+        await _bump_config_version(db, profession_id)
         return cursor.lastrowid
 
+    service_id = await _write(op)
+    
+    profession_cache.invalidate_profession(profession_id)
+    earnings_memo.invalidate_profession(profession_id)
+    return service_id
+
+ADDITIONAL_SERVICES_SQL = "SELECT * FROM additional_services WHERE profession_id = ?"
+
 async def get_additional_services(profession_id: int):
     """Получение дополнительных услуг профессии"""
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM additional_services WHERE profession_id = ?",
-            (profession_id,)
-        ) as cursor:
+    async with get_connection() as db:
+        async with db.execute(ADDITIONAL_SERVICES_SQL, (profession_id,)) as cursor:
             return await cursor.fetchall()
 
 # === НОВЫЕ ФУНКЦИИ (Шаг 6.1): РАБОТА С ОБЕДАМИ ===
@@ -388,15 +2038,27 @@ async def add_meal_type(
     Returns:
         ID созданного типа обеда
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async def op(db):
         cursor = await db.execute("""
             INSERT INTO meal_types (
                 profession_id, name, adds_overtime_hours, keywords
             ) VALUES (?, ?, ?, ?)
         """, (profession_id, name, adds_overtime_hours, keywords))
-        await db.commit()
+        # Смены с привязанными обедами сопоставление упоминаний не проходят
+        await _bump_config_version(
+            db, profession_id,
+            "NOT EXISTS (SELECT 1 FROM shift_meals sm WHERE sm.shift_id = s.id)"
+        )
         return cursor.lastrowid
 
+    meal_type_id = await _write(op)
+    
+    profession_cache.invalidate_profession(profession_id)
+    earnings_memo.invalidate_profession(profession_id)
+    return meal_type_id
+
+MEAL_TYPES_SQL = "SELECT * FROM meal_types WHERE profession_id = ?"
+
 async def get_meal_types(profession_id: int):
     """
     Получение типов обедов профессии
@@ -407,12 +2069,8 @@ async def get_meal_types(profession_id: int):
     Returns:
         Список типов обедов
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM meal_types WHERE profession_id = ?",
-            (profession_id,)
-        ) as cursor:
+    async with get_connection() as db:
+        async with db.execute(MEAL_TYPES_SQL, (profession_id,)) as cursor:
             return await cursor.fetchall()
 
 async def add_shift_meal(shift_id: int, meal_type_id: int):
@@ -423,12 +2081,20 @@ async def add_shift_meal(shift_id: int, meal_type_id: int):
         shift_id: ID смены
         meal_type_id: ID типа обеда
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    async def op(db):
         await db.execute("""
             INSERT INTO shift_meals (shift_id, meal_type_id)
             VALUES (?, ?)
         """, (shift_id, meal_type_id))
-        await db.commit()
+
+    await _write(op)
+
+SHIFT_MEALS_SQL = """
+    SELECT mt.* 
+    FROM shift_meals sm
+    JOIN meal_types mt ON sm.meal_type_id = mt.id
+    WHERE sm.shift_id = ?
+"""
 
 async def get_shift_meals(shift_id: int):
     """
@@ -440,12 +2106,175 @@ async def get_shift_meals(shift_id: int):
     Returns:
         Список обедов с информацией о типе обеда
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("""
-            SELECT mt.* 
-            FROM shift_meals sm
-            JOIN meal_types mt ON sm.meal_type_id = mt.id
-            WHERE sm.shift_id = ?
-        """, (shift_id,)) as cursor:
-            return await cursor.fetchall()
\ No newline at end of file
+    with timed("db.get_shift_meals"):
+        async with get_connection() as db:
+            async with db.execute(SHIFT_MEALS_SQL, (shift_id,)) as cursor:
+                return await cursor.fetchall()
+
+# === КОНФИГУРАЦИЯ ПРОФЕССИИ (кэш) ===
+
+def _json_rows(cls, alias: str) -> str:
+    """json_group_array(json_object(...)) по полям dataclass"""
+    pairs = ", ".join(f"'{f.name}', {alias}.{f.name}" for f in fields(cls))
+    return f"json_group_array(json_object({pairs}))"
+
+# Вся конфигурация профессии проекта одним запросом
+# (порядок элементов в json_group_array не гарантирован - сортируем в Python)
+PROJECT_SNAPSHOT_SQL = f"""
+    SELECT
+        p.*,
+        (SELECT {_json_rows(ProgressiveRate, 'r')}
+         FROM progressive_rates r WHERE r.profession_id = p.id) AS rates_json,
+        (SELECT {_json_rows(AdditionalService, 's')}
+         FROM additional_services s WHERE s.profession_id = p.id) AS services_json,
+        (SELECT {_json_rows(MealType, 'm')}
+         FROM meal_types m WHERE m.profession_id = p.id) AS meals_json
+    FROM professions p
+    WHERE p.project_id = ?
+    ORDER BY p.id
+    LIMIT 1
+"""
+
+# Версия настроек профессии проекта - та же профессия, что в PROJECT_SNAPSHOT_SQL
+PROFESSION_VERSION_SQL = """
+    SELECT id, config_version FROM professions
+    WHERE project_id = ?
+    ORDER BY id
+    LIMIT 1
+"""
+
+def profession_from_snapshot(row):
+    """
+    ProfessionConfig из строки PROJECT_SNAPSHOT_SQL (aiosqlite или sqlite3)
+
+    Returns:
+        ProfessionConfig или None, если строки нет
+    """
+    if row is None:
+        return None
+
+    return ProfessionConfig.from_rows(
+        row,
+        rates=sorted(json.loads(row["rates_json"]), key=lambda r: r["order_num"]),
+        services=sorted(json.loads(row["services_json"]), key=lambda s: s["id"]),
+        meals=sorted(json.loads(row["meals_json"]), key=lambda m: m["id"])
+    )
+
+async def load_project_snapshot(project_id: int):
+    """
+    Загрузка всей конфигурации профессии проекта одним SQL-запросом
+    (профессия + прогрессивные ставки + услуги + обеды)
+    
+    Args:
+        project_id: ID проекта
+    
+    Returns:
+        ProfessionConfig или None, если профессия не настроена
+    """
+    async with get_connection() as db:
+        async with db.execute(PROJECT_SNAPSHOT_SQL, (project_id,)) as cursor:
+            row = await cursor.fetchone()
+    
+    return profession_from_snapshot(row)
+
+async def get_profession_config(project_id: int):
+    """
+    Полная конфигурация профессии проекта (через LRU-кэш)
+    
+    Args:
+        project_id: ID проекта
+    
+    Returns:
+        ProfessionConfig или None, если профессия не настроена
+    """
+    # Кэш своего процесса: настройки, изменённые другим процессом,
+    # видны по версии профессии (один запрос по индексу)
+    async with get_connection() as db:
+        async with db.execute(PROFESSION_VERSION_SQL, (project_id,)) as cursor:
+            row = await cursor.fetchone()
+    
+    config = profession_cache.get(project_id, tuple(row) if row else None)
+    if config is not MISSING:
+        return config
+    
+    generation = profession_cache.generation
+    with timed("db.load_project_snapshot"):
+        config = await load_project_snapshot(project_id)
+    
+    profession_cache.put(project_id, config, generation)
+    return config
+
+
+# === АГРЕГАТЫ ПО ПРОЕКТУ (project_period_totals) ===
+
+PROJECT_TOTALS_SQL = """
+    SELECT period, shift_count, total_hours, overtime_hours,
+           total_net, total_gross
+    FROM project_period_totals
+    WHERE project_id = ?
+    ORDER BY period DESC
+"""
+
+async def get_project_totals(project_id: int, reporting: bool = False) -> dict:
+    """
+    Итоги проекта из project_period_totals (без агрегации по shifts)
+
+    Args:
+        reporting: Читать через пул отчётов (только чтение)
+
+    Returns:
+        {total_shifts, total_hours, total_overtime, total_net, total_gross,
+         periods: [{period, shift_count, ...}] по убыванию периода}
+    """
+    async with _reader(reporting) as db:
+        async with db.execute(PROJECT_TOTALS_SQL, (project_id,)) as cursor:
+            periods = [dict(row) for row in await cursor.fetchall()]
+
+    return {
+        "total_shifts": sum(p["shift_count"] for p in periods),
+        "total_hours": sum(p["total_hours"] for p in periods),
+        "total_overtime": sum(p["overtime_hours"] for p in periods),
+        "total_net": sum(p["total_net"] for p in periods),
+        "total_gross": sum(p["total_gross"] for p in periods),
+        "periods": periods
+    }
+
+
+async def rebuild_period_totals(fix: bool = False) -> list:
+    """
+    Сверить project_period_totals с пересчётом по shifts/earnings
+
+    Args:
+        fix: Перестроить таблицу заново, если найдены расхождения
+
+    Returns:
+        Список расхождений: (project_id, period, сохранено, ожидается)
+    """
+    columns = ("shift_count", "total_hours", "overtime_hours", "total_net", "total_gross")
+
+    async with get_connection() as db:
+        async with db.execute(PERIOD_TOTALS_SELECT_SQL) as cursor:
+            expected = {(r["project_id"], r["period"]): r for r in await cursor.fetchall()}
+        async with db.execute("SELECT * FROM project_period_totals") as cursor:
+            stored = {(r["project_id"], r["period"]): r for r in await cursor.fetchall()}
+
+        mismatches = []
+        for key in sorted(expected.keys() | stored.keys()):
+            want = tuple(expected[key][c] for c in columns) if key in expected else None
+            have = tuple(stored[key][c] for c in columns) if key in stored else None
+
+            if want is None or have is None or any(
+                abs(w - h) > 1e-6 for w, h in zip(want, have)
+            ):
+                mismatches.append((*key, have, want))
+
+    if fix and mismatches:
+        # Через очередь записи: перестройка не пересекается с записью смен
+        async def op(db):
+            await db.execute("DELETE FROM project_period_totals")
+            await db.execute("INSERT INTO project_period_totals " + PERIOD_TOTALS_SELECT_SQL)
+
+        await _write(op)
+        logger.warning(f"project_period_totals перестроена, расхождений: {len(mismatches)}")
+
+    return mismatches
@@ -0,0 +1,204 @@
+"""
+Служебные команды для базы данных
+
+Запуск:
+    python db_tools.py check-totals          # сверить project_period_totals
+    python db_tools.py check-totals --fix    # сверить и перестроить при расхождениях
+    python db_tools.py backup                # резервная копия (онлайн, с проверкой)
+    python db_tools.py list-backups
+    python db_tools.py verify-backup FILE    # integrity_check копии
+    python db_tools.py restore FILE          # восстановить (бот должен быть остановлен)
+    python db_tools.py blob-stats            # размер и скорость чтения JSON-блобов
+    python db_tools.py vacuum                # вернуть освободившееся место на диске
+    python db_tools.py drift                 # последний отчёт ночной сверки earnings
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import backup
+import blob_codec
+from config import DATABASE_PATH
+from database import init_db, close_pool, rebuild_period_totals, get_connection, get_drift_report
+
+
+async def check_totals(fix: bool) -> int:
+    """Сверка агрегатов с shifts/earnings, код возврата 1 при расхождениях"""
+    await init_db()
+    try:
+        mismatches = await rebuild_period_totals(fix=fix)
+    finally:
+        await close_pool()
+
+    if not mismatches:
+        print("✅ project_period_totals совпадает с shifts/earnings")
+        return 0
+
+    print(f"❌ Расхождений: {len(mismatches)}")
+    for project_id, period, have, want in mismatches:
+        print(f"   проект {project_id}, {period}: сохранено {have}, ожидается {want}")
+
+    if fix:
+        print("🔧 project_period_totals перестроена")
+        return 0
+    return 1
+
+
+async def make_backup() -> int:
+    path = await backup.create_backup()
+    removed = backup.apply_retention()
+    print(f"✅ Резервная копия: {path}")
+    if removed:
+        print(f"🗑 Удалено старых копий: {len(removed)}")
+    return 0
+
+
+def show_backups() -> int:
+    backups = backup.list_backups()
+    if not backups:
+        print("Резервных копий нет")
+    for path in backups:
+        print(f"   {path} ({os.path.getsize(path)} байт)")
+    return 0
+
+
+async def verify(path: str) -> int:
+    result = await backup.verify_backup(path)
+    if result == "ok":
+        print(f"✅ {path}: integrity_check ok")
+        return 0
+    print(f"❌ {path}: {result}")
+    return 1
+
+
+async def restore(path: str) -> int:
+    try:
+        target = await backup.restore_backup(path)
+    except backup.BackupError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ {target} восстановлена из {path}")
+    return 0
+
+
+async def blob_stats() -> int:
+    """Размер parsed_data/calculation_details по форматам и время декодирования"""
+    await init_db()
+    try:
+        async with get_connection() as db:
+            for table, column in (("shifts", "parsed_data"), ("earnings", "calculation_details")):
+                async with db.execute(f"""
+                    SELECT typeof({column}) AS kind, COUNT(*) AS rows,
+                           COALESCE(SUM(length(CAST({column} AS BLOB))), 0) AS bytes
+                    FROM {table}
+                    GROUP BY kind
+                """) as cursor:
+                    groups = await cursor.fetchall()
+
+                async with db.execute(
+                    f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL LIMIT 1000"
+                ) as cursor:
+                    sample = [row[0] for row in await cursor.fetchall()]
+
+                print(f"{table}.{column}:")
+                for group in groups:
+                    print(f"   {group['kind']:<6} строк {group['rows']:>8}, байт {group['bytes']:>10}")
+
+                if sample:
+                    started = time.perf_counter()
+                    for value in sample:
+                        blob_codec.decode(value)
+                    elapsed = (time.perf_counter() - started) * 1e6 / len(sample)
+                    print(f"   декодирование: {elapsed:.1f} мкс на значение")
+    finally:
+        await close_pool()
+    return 0
+
+
+async def vacuum() -> int:
+    """VACUUM: после перекодирования блобов файл сам не уменьшается"""
+    await init_db()
+    try:
+        size_before = os.path.getsize(DATABASE_PATH)
+        async with get_connection() as db:
+            await db.execute("VACUUM")
+        print(f"✅ VACUUM: {size_before} → {os.path.getsize(DATABASE_PATH)} байт")
+    finally:
+        await close_pool()
+    return 0
+
+
+async def drift_report() -> int:
+    """Последний прогон nightly_recompute.py и его расхождения"""
+    await init_db()
+    try:
+        report = await get_drift_report()
+    finally:
+        await close_pool()
+
+    if report is None:
+        print("Ночная сверка ещё не запускалась")
+        return 0
+
+    print(
+        f"Сверка {report['run_id']} ({report['started_at']}): смен {report['shifts']}, "
+        f"проектов {report['projects']}, процессов {report['workers']}, {report['seconds']} с"
+    )
+    if not report["drift"]:
+        print("✅ Расхождений нет")
+        return 0
+
+    print(f"❌ Расхождений: {report['drifted']}")
+    for row in report["drift"]:
+        print(
+            f"   проект {row['project_id']}, смена {row['shift_id']}: "
+            f"нетто {row['stored_net']} → {row['fresh_net']}, "
+            f"брутто {row['stored_gross']} → {row['fresh_gross']}, "
+            f"переработка {row['stored_overtime_hours']} → {row['fresh_overtime_hours']}"
+        )
+    return 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Служебные команды для базы данных")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    totals = commands.add_parser("check-totals", help="Сверить project_period_totals")
+    totals.add_argument("--fix", action="store_true", help="Перестроить при расхождениях")
+
+    commands.add_parser("backup", help="Создать резервную копию")
+    commands.add_parser("list-backups", help="Список резервных копий")
+    verify_parser = commands.add_parser("verify-backup", help="Проверить копию")
+    verify_parser.add_argument("path")
+    restore_parser = commands.add_parser("restore", help="Восстановить БД из копии")
+    restore_parser.add_argument("path")
+
+    commands.add_parser("blob-stats", help="Размер и скорость чтения JSON-блобов")
+    commands.add_parser("vacuum", help="VACUUM базы данных")
+    commands.add_parser("drift", help="Последний отчёт ночной сверки earnings")
+
+    args = parser.parse_args()
+
+    if args.command == "check-totals":
+        return asyncio.run(check_totals(args.fix))
+    if args.command == "backup":
+        return asyncio.run(make_backup())
+    if args.command == "list-backups":
+        return show_backups()
+    if args.command == "verify-backup":
+        return asyncio.run(verify(args.path))
+    if args.command == "restore":
+        return asyncio.run(restore(args.path))
+    if args.command == "blob-stats":
+        return asyncio.run(blob_stats())
+    if args.command == "vacuum":
+        return asyncio.run(vacuum())
+    if args.command == "drift":
+        return asyncio.run(drift_report())
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""
+Ядро расчёта заработка по смене
+
+Чистые функции без обращений к БД: на вход - конфигурация профессии
+(ProfessionConfig) и данные смены (ShiftInput), на выход - EarningsResult.
+Загрузка входных данных и запись результата - в calculator.py.
+"""
+import math
+from dataclasses import dataclass, field
+
+from profession_config import ProfessionConfig
+
+
+@dataclass(frozen=True, slots=True)
+class ShiftInput:
+    """Данные смены для расчёта"""
+    total_hours: float
+    meals: tuple = ()           # Обеды из сообщения (названия)
+    services: tuple = ()        # Услуги из сообщения (названия)
+    is_expense_day: bool = False
+    attached_meals: tuple = ()  # MealType, уже привязанные к смене в БД
+
+    @classmethod
+    def from_parsed(cls, total_hours: float, parsed: dict = None,
+                    is_expense_day: bool = False, attached_meals=()):
+        """
+        Собрать из результата парсинга сообщения
+
+        Args:
+            parsed: dict парсера (ключи meals, services)
+        """
+        parsed = parsed or {}
+        return cls(
+            total_hours=total_hours,
+            meals=tuple(parsed.get("meals") or ()),
+            services=tuple(parsed.get("services") or ()),
+            is_expense_day=bool(is_expense_day),
+            attached_meals=tuple(attached_meals)
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class EarningsResult:
+    """Результат расчёта смены"""
+    details: dict
+    base_pay_net: int
+    base_pay_gross: int
+    overtime_pay: int       # Переработка + обеды (брутто)
+    daily_allowance: int
+    services_pay: int       # Услуги (брутто)
+    total_net: int
+    total_gross: int
+    overtime_hours: float   # Переработка с обедами
+    meal_type_ids: tuple
+    service_ids: tuple
+    # details в формате blob_codec (заполняет earnings_memo: один раз на результат)
+    encoded_details: bytes = field(default=None, compare=False, repr=False)
+
+    def earnings_row(self) -> dict:
+        """Строка для таблицы earnings"""
+        return {
+            "base_pay_net": self.base_pay_net,
+            "base_pay_gross": self.base_pay_gross,
+            "overtime_pay": self.overtime_pay,
+            "daily_allowance": self.daily_allowance,
+            "services_pay": self.services_pay,
+            "total_net": self.total_net,
+            "total_gross": self.total_gross,
+            # кодируется при записи (blob_codec), если ещё не закодировано
+            "calculation_details": self.encoded_details or self.details
+        }
+
+    def to_dict(self) -> dict:
+        """Результат в формате calculator.compute_earnings"""
+        return {
+            "details": self.details,
+            "total_net": self.total_net,
+            "total_gross": self.total_gross,
+            "overtime_hours": self.overtime_hours,
+            "meal_type_ids": list(self.meal_type_ids),
+            "service_ids": list(self.service_ids),
+            "earnings": self.earnings_row()
+        }
+
+
+def match_meals(profession: ProfessionConfig, shift: ShiftInput) -> list:
+    """
+    Обеды смены (MealType): уже привязанные к смене в БД, а если их
+    нет - упомянутые в сообщении (по названию или ключевым словам;
+    для каждого упоминания - первый подходящий тип обеда)
+    """
+    if shift.attached_meals:
+        return list(shift.attached_meals)
+
+    matched = []
+    for mentioned_meal in shift.meals:
+        index = profession.meal_matcher.first(mentioned_meal)
+        if index is not None:
+            matched.append(profession.meal_types[index])
+    return matched
+
+
+def match_services(profession: ProfessionConfig, shift: ShiftInput) -> list:
+    """Услуги профессии (AdditionalService), упомянутые в сообщении"""
+    found = set()
+    for mentioned in shift.services:
+        found |= profession.service_matcher.find(mentioned)
+    return [profession.services[index] for index in sorted(found)]
+
+
+def compute(profession: ProfessionConfig, shift: ShiftInput) -> EarningsResult:
+    """
+    Расчёт заработка по смене
+
+    Args:
+        profession: Конфигурация профессии проекта
+        shift: Данные смены
+
+    Returns:
+        EarningsResult
+    """
+    total_hours = shift.total_hours
+    base_hours = profession.base_shift_hours
+    tax_percentage = profession.tax_percentage
+
+    # 3. Базовая оплата
+    base_pay_net = profession.base_rate_net
+    base_pay_gross = profession.base_rate_gross
+
+    # === 4. ОБЕДЫ (считаем отдельно!) ===
+
+    meal_hours = 0
+    meal_pay_net = 0
+    meal_pay_gross = 0
+    meal_breakdown = []
+    meal_type_ids = []
+
+    # ВАЖНО: Обеды оплачиваются по БАЗОВОЙ ставке переработки!
+    meal_hour_net = profession.base_overtime_rate
+    meal_hour_gross = round(meal_hour_net / (1 - tax_percentage / 100))
+
+    def add_meal(meal_type):
+        nonlocal meal_hours, meal_pay_net, meal_pay_gross
+
+        meal_type_ids.append(meal_type.id)
+        meal_hours += meal_type.adds_overtime_hours
+
+        meal_pay_net += int(meal_type.adds_overtime_hours * meal_hour_net)
+        meal_pay_gross += int(meal_type.adds_overtime_hours * meal_hour_gross)
+
+        meal_breakdown.append({
+            "name": meal_type.name,
+            "adds_hours": meal_type.adds_overtime_hours,
+            "rate_net": meal_hour_net,
+            "rate_gross": meal_hour_gross,
+            "total_net": int(meal_type.adds_overtime_hours * meal_hour_net),
+            "total_gross": int(meal_type.adds_overtime_hours * meal_hour_gross)
+        })
+
+    for meal in match_meals(profession, shift):
+        add_meal(meal)
+
+    # === 5. ПЕРЕРАБОТКИ (БЕЗ обедов - только фактические часы работы) ===
+
+    base_overtime_hours = 0
+    overtime_pay_net = 0
+    overtime_pay_gross = 0
+    overtime_breakdown = []
+
+    # Рассчитываем базовые часы переработки (БЕЗ обедов!)
+    if total_hours > base_hours:
+        overtime_hours_raw = total_hours - base_hours
+
+        # Применяем порог
+        overtime_threshold = profession.overtime_threshold
+        if overtime_hours_raw < overtime_threshold:
+            base_overtime_hours = 0
+        else:
+            base_overtime_hours = overtime_hours_raw - overtime_threshold
+
+            # Применяем округление
+            overtime_rounding = profession.overtime_rounding
+            if overtime_rounding > 0:
+                base_overtime_hours = math.ceil(base_overtime_hours / overtime_rounding) * overtime_rounding
+
+    # ВАЖНО: Обеды НЕ попадают в прогрессивные ставки!
+    # Прогрессивные ставки только для фактических часов переработки
+    # (таблица ступеней скомпилирована вместе с конфигурацией)
+    table = profession.bracket_table
+
+    if table and base_overtime_hours > 0:
+        overtime_pay_net, overtime_pay_gross = table.pay(base_overtime_hours)
+        overtime_breakdown = table.breakdown(base_overtime_hours)
+    elif base_overtime_hours > 0:
+        # Если нет прогрессивных ставок - используем базовую
+        overtime_pay_net = int(base_overtime_hours * profession.base_overtime_rate)
+        overtime_pay_gross = round(overtime_pay_net / (1 - tax_percentage / 100))
+
+        overtime_breakdown.append({
+            "bracket": "базовая",
+            "hours": round(base_overtime_hours, 2),
+            "rate_net": profession.base_overtime_rate,
+            "rate_gross": round(profession.base_overtime_rate / (1 - tax_percentage / 100)),
+            "total_net": overtime_pay_net,
+            "total_gross": overtime_pay_gross
+        })
+
+    # ИТОГО часов переработки (для отображения)
+    total_overtime_hours = base_overtime_hours + meal_hours
+
+    # 6. Суточные
+    daily_allowance_pay = profession.daily_allowance if shift.is_expense_day else 0
+
+    # 7. Дополнительные услуги (БЕЗ обедов!)
+    services_pay_net = 0
+    services_pay_gross = 0
+    services_breakdown = []
+    service_ids = []
+
+    for service in match_services(profession, shift):
+        service_ids.append(service.id)
+        service_net = service.cost
+        service_tax = service.tax_percentage
+        service_gross = round(service_net / (1 - service_tax / 100))
+
+        services_pay_net += service_net
+        services_pay_gross += service_gross
+
+        services_breakdown.append({
+            "name": service.name,
+            "cost_net": service_net,
+            "cost_gross": service_gross,
+            "tax": service_tax
+        })
+
+    # 8. Итого
+    total_net = base_pay_net + overtime_pay_net + meal_pay_net + daily_allowance_pay + services_pay_net
+    total_gross = base_pay_gross + overtime_pay_gross + meal_pay_gross + daily_allowance_pay + services_pay_gross
+
+    # 9. Детали расчёта
+    calculation_details = {
+        "base_hours": base_hours,
+        "total_hours": round(total_hours, 2),
+        "base_overtime_hours": round(base_overtime_hours, 2),  # Переработка БЕЗ обедов
+        "meal_hours": round(meal_hours, 2),  # Часы обедов
+        "total_overtime_hours": round(total_overtime_hours, 2),  # Всего переработки
+        "breakdown": {
+            "base_pay": {
+                "net": base_pay_net,
+                "gross": base_pay_gross
+            },
+            "overtime": overtime_breakdown,  # Прогрессивные ставки (БЕЗ обедов)
+            "meals": meal_breakdown,  # Обеды (по базовой ставке)
+            "daily_allowance": daily_allowance_pay,
+            "services": services_breakdown
+        }
+    }
+
+    return EarningsResult(
+        details=calculation_details,
+        base_pay_net=base_pay_net,
+        base_pay_gross=base_pay_gross,
+        overtime_pay=overtime_pay_gross + meal_pay_gross,  # Сумма переработки + обеды
+        daily_allowance=daily_allowance_pay,
+        services_pay=services_pay_gross,
+        total_net=total_net,
+        total_gross=total_gross,
+        overtime_hours=total_overtime_hours,
+        meal_type_ids=tuple(meal_type_ids),
+        service_ids=tuple(service_ids)
+    )
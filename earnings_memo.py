@@ -0,0 +1,114 @@
+"""
+Кэш результатов расчёта смен (LRU)
+
+Большинство смен одной формы: та же длительность, те же обеды и услуги.
+Для такой формы earnings_core.compute считается, а детали расчёта
+кодируются (blob_codec) один раз. Ключ - сама конфигурация профессии
+(сравнение по всем настройкам), длительность в минутах, обеды, услуги
+и суточные.
+
+Результат общий для всех смен одной формы: details не изменять.
+"""
+from collections import OrderedDict
+from dataclasses import replace
+
+import blob_codec
+from config import EARNINGS_MEMO_SIZE
+from earnings_core import EarningsResult, ShiftInput, compute, match_meals, match_services
+from profession_config import ProfessionConfig
+from timings import timed
+
+
+class EarningsMemo:
+    """
+    LRU-кэш EarningsResult по форме смены
+
+    Конфигурация в ключе сравнивается по значению: после изменения
+    настроек (и для гипотетических конфигураций with_overrides с тем же
+    id) старые записи не находятся, перезагруженные из БД те же
+    настройки - находятся. database.py дополнительно сбрасывает записи
+    профессии при изменении настроек.
+    """
+
+    def __init__(self, max_size: int = EARNINGS_MEMO_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # ключ формы -> EarningsResult
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0   # Длительность не в целых минутах - без кэша
+        self.invalidations = 0
+
+    @staticmethod
+    def key(profession: ProfessionConfig, shift: ShiftInput):
+        """Ключ формы смены или None, если смену нельзя кэшировать"""
+        minutes = round(shift.total_hours * 60)
+        if minutes / 60 != shift.total_hours:
+            return None
+
+        return (
+            profession,
+            minutes,
+            tuple(match_meals(profession, shift)),
+            tuple(service.id for service in match_services(profession, shift)),
+            bool(shift.is_expense_day)
+        )
+
+    def compute(self, profession: ProfessionConfig, shift: ShiftInput) -> EarningsResult:
+        """earnings_core.compute через кэш"""
+        if self.max_size <= 0:
+            return compute(profession, shift)
+
+        key = self.key(profession, shift)
+        if key is None:
+            self.bypassed += 1
+            return compute(profession, shift)
+
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        with timed("core.compute"):
+            result = compute(profession, shift)
+        with timed("core.encode_details"):
+            result = replace(result, encoded_details=blob_codec.encode(result.details))
+
+        self._entries[key] = result
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+        return result
+
+    def invalidate_profession(self, profession_id: int = None):
+        """Сбросить результаты профессии (None - весь кэш)"""
+        self.invalidations += 1
+
+        if profession_id is None:
+            self._entries.clear()
+            return
+
+        for key in [key for key in self._entries if key[0].id == profession_id]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+earnings_memo = EarningsMemo()
+
+
+def compute_cached(profession: ProfessionConfig, shift: ShiftInput) -> EarningsResult:
+    """Расчёт смены через общий кэш earnings_memo"""
+    return earnings_memo.compute(profession, shift)
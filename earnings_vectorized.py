@@ -0,0 +1,184 @@
+"""
+Векторизованный расчёт заработка (NumPy) для больших пересчётов
+
+Считает суммы сразу по массиву смен одной профессии: порог и округление
+переработки, прогрессивные ставки, перевод нетто/брутто, обеды,
+суточные и услуги. Арифметика та же, что в earnings_core.compute
+(float64, банковское округление round), поэтому суммы совпадают
+до рубля. Детали расчёта (breakdown) не строятся: для записи смены
+в БД по-прежнему нужен earnings_core.
+
+NumPy есть в requirements.txt, но без него модуль работает:
+compute_many считает через earnings_core по одной смене (с
+предупреждением в логе при первом таком расчёте).
+"""
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from earnings_core import compute, match_meals, match_services
+from profession_config import ProfessionConfig
+
+logger = logging.getLogger(__name__)
+
+HAS_NUMPY = np is not None
+_numpy_warned = False
+
+# Колонки результата (одноимённые полям EarningsResult)
+COLUMNS = (
+    "base_pay_net", "base_pay_gross", "overtime_pay", "daily_allowance",
+    "services_pay", "total_net", "total_gross", "overtime_hours"
+)
+
+
+def shift_arrays(profession: ProfessionConfig, shifts) -> dict:
+    """
+    Входные массивы compute_arrays по списку ShiftInput
+
+    Обеды и услуги сопоставляются по названиям (как в earnings_core),
+    оплата обедов округляется по каждому обеду отдельно.
+    """
+    tax_k = 1 - profession.tax_percentage / 100
+    meal_hour_net = profession.base_overtime_rate
+    meal_hour_gross = round(meal_hour_net / tax_k)
+
+    columns = {
+        "total_hours": [], "meal_hours": [], "meal_net": [], "meal_gross": [],
+        "is_expense_day": [], "services_net": [], "services_gross": []
+    }
+
+    for shift in shifts:
+        meal_hours = meal_net = meal_gross = 0
+        for meal in match_meals(profession, shift):
+            meal_hours += meal.adds_overtime_hours
+            meal_net += int(meal.adds_overtime_hours * meal_hour_net)
+            meal_gross += int(meal.adds_overtime_hours * meal_hour_gross)
+
+        services_net = services_gross = 0
+        for service in match_services(profession, shift):
+            services_net += service.cost
+            services_gross += round(service.cost / (1 - service.tax_percentage / 100))
+
+        columns["total_hours"].append(shift.total_hours)
+        columns["meal_hours"].append(meal_hours)
+        columns["meal_net"].append(meal_net)
+        columns["meal_gross"].append(meal_gross)
+        columns["is_expense_day"].append(shift.is_expense_day)
+        columns["services_net"].append(services_net)
+        columns["services_gross"].append(services_gross)
+
+    return columns
+
+
+def compute_arrays(
+    profession: ProfessionConfig,
+    total_hours,
+    meal_hours,
+    meal_net,
+    meal_gross,
+    is_expense_day,
+    services_net,
+    services_gross
+) -> dict:
+    """
+    Расчёт по массивам смен одной профессии
+
+    Args:
+        total_hours: Отработано часов
+        meal_hours, meal_net, meal_gross: Часы и оплата обедов смены
+        is_expense_day: Начислять ли суточные
+        services_net, services_gross: Сумма услуг смены
+
+    Returns:
+        {колонка из COLUMNS: numpy-массив}
+    """
+    if np is None:
+        raise RuntimeError("Для векторизованного расчёта нужен NumPy")
+
+    total_hours = np.asarray(total_hours, dtype=np.float64)
+    meal_hours = np.asarray(meal_hours, dtype=np.float64)
+    meal_net = np.asarray(meal_net, dtype=np.int64)
+    meal_gross = np.asarray(meal_gross, dtype=np.int64)
+    is_expense_day = np.asarray(is_expense_day, dtype=bool)
+    services_net = np.asarray(services_net, dtype=np.int64)
+    services_gross = np.asarray(services_gross, dtype=np.int64)
+    size = len(total_hours)
+
+    tax_k = 1 - profession.tax_percentage / 100
+
+    # Переработка без обедов: порог и округление вверх
+    raw = total_hours - profession.base_shift_hours
+    threshold = profession.overtime_threshold
+    overtime = np.where(
+        (total_hours > profession.base_shift_hours) & (raw >= threshold),
+        raw - threshold,
+        0.0
+    )
+    if profession.overtime_rounding > 0:
+        overtime = np.ceil(overtime / profession.overtime_rounding) * profession.overtime_rounding
+
+    table = profession.bracket_table
+
+    if table:
+        # Прогрессивные ставки: searchsorted по скомпилированной таблице
+        # и одно умножение на ставку ступени
+        active = overtime > 0
+        paid = np.minimum(overtime, table.end)
+        bracket = np.clip(np.searchsorted(table.starts, paid, side="left") - 1, 0, None)
+        partial_gross = np.round(
+            (paid - np.asarray(table.starts)[bracket]) * np.asarray(table.rates_gross)[bracket]
+        )
+        overtime_gross = np.where(
+            active, np.asarray(table.cum_gross)[bracket] + partial_gross, 0
+        ).astype(np.int64)
+        overtime_net = np.where(
+            active, np.asarray(table.cum_net)[bracket] + np.round(partial_gross * table.tax_k), 0
+        ).astype(np.int64)
+    else:
+        overtime_net = np.trunc(overtime * profession.base_overtime_rate)
+        overtime_gross = np.round(overtime_net / tax_k).astype(np.int64)
+        overtime_net = overtime_net.astype(np.int64)
+
+    daily_allowance = np.where(is_expense_day, profession.daily_allowance, 0).astype(np.int64)
+    base_pay_net = np.full(size, profession.base_rate_net, dtype=np.int64)
+    base_pay_gross = np.full(size, profession.base_rate_gross, dtype=np.int64)
+
+    return {
+        "base_pay_net": base_pay_net,
+        "base_pay_gross": base_pay_gross,
+        "overtime_pay": overtime_gross + meal_gross,
+        "daily_allowance": daily_allowance,
+        "services_pay": services_gross,
+        "total_net": base_pay_net + overtime_net + meal_net + daily_allowance + services_net,
+        "total_gross": base_pay_gross + overtime_gross + meal_gross + daily_allowance + services_gross,
+        "overtime_hours": overtime + meal_hours
+    }
+
+
+def _warn_no_numpy():
+    """Предупреждение о расчёте без NumPy (один раз на процесс)"""
+    global _numpy_warned
+    if not _numpy_warned:
+        _numpy_warned = True
+        logger.warning("NumPy не установлен: compute_many считает смены по одной (медленнее)")
+
+
+def compute_many(profession: ProfessionConfig, shifts) -> dict:
+    """
+    Суммы по списку ShiftInput одной профессии
+
+    Returns:
+        {колонка из COLUMNS: значения по сменам} - numpy-массивы,
+        а без NumPy - списки (расчёт через earnings_core)
+    """
+    shifts = list(shifts)
+
+    if np is None:
+        _warn_no_numpy()
+        results = [compute(profession, shift) for shift in shifts]
+        return {column: [getattr(r, column) for r in results] for column in COLUMNS}
+
+    return compute_arrays(profession, **shift_arrays(profession, shifts))
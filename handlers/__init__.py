@@ -1,6 +1,6 @@
 """
 Пакет обработчиков команд
 """
-from . import start, projects, shifts, miniapp
+from . import start, projects, shifts, miniapp, diagnostics
 
-__all__ = ['start', 'projects', 'shifts', 'miniapp']
\ No newline at end of file
+__all__ = ['start', 'projects', 'shifts', 'miniapp', 'diagnostics']
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""
+Служебные команды: замеры времени горячего пути
+"""
+from html import escape
+
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+
+from earnings_memo import earnings_memo
+from timings import timings
+
+router = Router()
+
+@router.message(Command("timings"))
+async def cmd_timings(message: Message, command: CommandObject):
+    """
+    Замеры расчёта и записи смен (timings.py)
+
+    /timings - гистограммы в мс (среднее, p50, p95, p99, максимум)
+    /timings reset - сбросить замеры
+    """
+    if (command.args or "").strip() == "reset":
+        timings.reset()
+        await message.answer("🧹 Замеры сброшены")
+        return
+
+    memo = earnings_memo.stats()
+    await message.answer(
+        f"⏱ Замеры, мс\n<pre>{escape(timings.dump())}</pre>\n"
+        f"Кэш расчётов: попаданий {memo['hits']}, промахов {memo['misses']} "
+        f"({memo['hit_rate']:.0%})"
+    )
@@ -1,15 +1,19 @@
 """
 Обработчики для работы с проектами
 """
+import time
+from datetime import datetime
 from aiogram import Router, F
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database import (
     create_project, get_user, create_profession,
-    add_progressive_rate, add_additional_service
+    add_progressive_rate, add_additional_service,
+    get_active_project
 )
+from calculator import recalculate_project
 
 router = Router()
 
@@ -17,6 +21,60 @@ class NewProjectStates(StatesGroup):
     waiting_for_name = State()
     waiting_for_description = State()
 
+# Не чаще одного обновления сообщения о прогрессе в секунду (лимиты Telegram)
+RECALC_PROGRESS_INTERVAL = 1.0
+
+@router.message(Command("recalculate"))
+async def cmd_recalculate(message: Message, command: CommandObject):
+    """
+    Пересчёт смен активного проекта (после изменения ставок)
+
+    /recalculate - все смены
+    /recalculate 2025-01-01 2025-01-31 - смены за период
+    """
+    project = await get_active_project(message.from_user.id)
+    
+    if project is None:
+        await message.answer("❌ Нет активного проекта")
+        return
+    
+    dates = (command.args or "").split()
+    try:
+        if len(dates) > 2:
+            raise ValueError
+        for date in dates:
+            datetime.strptime(date, "%Y-%m-%d")
+    except ValueError:
+        await message.answer(
+            "❌ Формат: /recalculate [ГГГГ-ММ-ДД [ГГГГ-ММ-ДД]]"
+        )
+        return
+    
+    date_from = dates[0] if dates else None
+    date_to = dates[1] if len(dates) > 1 else None
+    
+    status = await message.answer(f"🔄 Пересчёт смен проекта «{project['name']}»...")
+    last_update = time.monotonic()
+    
+    async def progress(done, total):
+        nonlocal last_update
+        if time.monotonic() - last_update < RECALC_PROGRESS_INTERVAL:
+            return
+        last_update = time.monotonic()
+        await status.edit_text(f"🔄 Пересчёт смен: {done} из {total}...")
+    
+    try:
+        result = await recalculate_project(project["id"], date_from, date_to, progress=progress)
+    except ValueError as e:
+        await status.edit_text(f"❌ {e}")
+        return
+    
+    await status.edit_text(
+        f"✅ Пересчитано смен: {result['shifts']}\n\n"
+        f"💰 Итого: {result['total_net']:,}₽ (нетто) / {result['total_gross']:,}₽ (брутто)\n"
+        f"⏱ {result['seconds']} с"
+    )
+
 #@router.message(Command("new_project"))
 #async def cmd_new_project(message: Message, state: FSMContext):
 #    """Создание нового проекта"""
@@ -6,14 +6,9 @@ from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from datetime import datetime
 import json
-import aiosqlite
-from config import DATABASE_PATH
-from database import (  # ИСПРАВЛЕНО!
-    get_active_project, get_user, create_shift, confirm_shift,
-    get_meal_types, add_shift_meal
-)
+from database import get_active_project, get_user, get_profession_config
 from parser import parse_shift_message
-from calculator import calculate_shift_earnings
+from calculator import save_confirmed_shift
 
 router = Router()
 
@@ -47,14 +42,26 @@ async def handle_text_message(message: Message):
     current_date = now.strftime("%Y-%m-%d")
     current_time = now.strftime("%H:%M")
     
+    # Контекст парсера - из настроек профессии проекта (кэш)
+    profession = await get_profession_config(project["id"])
+    
+    if profession is not None:
+        base_hours = profession.base_shift_hours
+        services = [service.name for service in profession.services]
+        meals = [meal.name for meal in profession.meal_types]
+    else:
+        base_hours = 12
+        services = ["ронин"]
+        meals = ["обед", "текущий обед", "поздний обед"]
+    
     # Парсим сообщение (с поддержкой обедов!)
     result = await parse_shift_message(
         message=message.text,
         current_date=current_date,
         current_time=current_time,
-        base_hours=12,  # TODO: Брать из настроек проекта
-        services=["ронин"],  # TODO: Брать из БД (БЕЗ обедов!)
-        meals=["обед", "текущий обед", "поздний обед"]  # НОВОЕ: список обедов!
+        base_hours=base_hours,
+        services=services,  # БЕЗ обедов!
+        meals=meals  # НОВОЕ: список обедов!
     )
     
     # Удаляем сообщение о процессе
@@ -170,8 +177,9 @@ async def confirm_shift_callback(callback: CallbackQuery):
     data = pending_shifts[callback.from_user.id]
     result = data["result"]
     
-    # Создаём смену в БД
-    shift_id = await create_shift(
+    # Расчёт и сохранение смены (смена, обеды, услуги, заработок и статус -
+    # одной транзакцией)
+    shift_id, calculation, error = await save_confirmed_shift(
         project_id=data["project_id"],
         date=result["date"],
         start_time=result["start_time"],
@@ -181,51 +189,10 @@ async def confirm_shift_callback(callback: CallbackQuery):
         parsed_data=json.dumps(result, ensure_ascii=False)
     )
     
-    # Подтверждаем смену
-    await confirm_shift(shift_id)
-    
-    # === НОВОЕ: Сохраняем обеды в shift_meals! ===
-    
-    if result.get("meals"):
-        # Получаем типы обедов из БД
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                "SELECT id FROM professions WHERE project_id = ?",
-                (data["project_id"],)
-            ) as cursor:
-                profession = await cursor.fetchone()
-        
-        if profession:
-            meal_types = await get_meal_types(profession["id"])
-            
-            # Связываем обеды со сменой
-            for mentioned_meal in result["meals"]:
-                for meal_type in meal_types:
-                    meal_name_lower = meal_type["name"].lower()
-                    
-                    # Проверяем совпадение
-                    if (meal_name_lower in mentioned_meal.lower() or 
-                        mentioned_meal.lower() in meal_name_lower):
-                        
-                        await add_shift_meal(shift_id, meal_type["id"])
-                        break  # Нашли совпадение, переходим к следующему
-    
-    # === Запускаем расчёт ===
-    
-    try:
-        details, total_net, total_gross = await calculate_shift_earnings(
-            shift_id=shift_id,
-            project_id=data["project_id"]
-        )
-        
-        # Обновляем статус смены на "calculated"
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            await db.execute(
-                "UPDATE shifts SET status = 'calculated' WHERE id = ?",
-                (shift_id,)
-            )
-            await db.commit()
+    if error is None:
+        details = calculation["details"]
+        total_net = calculation["total_net"]
+        total_gross = calculation["total_gross"]
         
         # === НОВАЯ КАРТОЧКА РАСЧЁТА С ОБЕДАМИ! ===
         
@@ -300,7 +267,7 @@ async def confirm_shift_callback(callback: CallbackQuery):
         
         await callback.message.edit_text(text)
         
-    except Exception as e:
+    else:
         date_obj = datetime.strptime(result["date"], "%Y-%m-%d")
         date_str = date_obj.strftime("%d.%m.%Y")
         
@@ -308,7 +275,7 @@ async def confirm_shift_callback(callback: CallbackQuery):
             f"✅ Смена #{shift_id} подтверждена!\n\n"
             f"📅 Дата: {date_str}\n"
             f"⏱ Часов: {data['total_hours']:.1f} ч\n\n"
-            f"⚠️ Ошибка расчёта: {str(e)}\n\n"
+            f"⚠️ Ошибка расчёта: {str(error)}\n\n"
             f"Смена сохранена, но заработок не рассчитан."
         )
     
@@ -5,9 +5,7 @@ from aiogram import Router
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.filters import Command
 from aiogram.filters.callback_data import CallbackData
-from database import create_user, get_user
-import aiosqlite
-from config import DATABASE_PATH
+from database import create_user, get_user, set_contractor_type
 
 router = Router()
 
@@ -64,12 +62,7 @@ async def contractor_type_selected(
         return
     
     # Обновляем тип контрагента в БД
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute(
-            "UPDATE users SET contractor_type = ? WHERE id = ?",
-            (callback_data.type, callback.from_user.id)
-        )
-        await db.commit()
+    await set_contractor_type(callback.from_user.id, callback_data.type)
     
     await callback.message.edit_text(
         "✅ Отлично! Теперь создайте ваш первый проект.\n\n"
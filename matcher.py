@@ -0,0 +1,176 @@
+"""
+Сопоставление упомянутых обедов и услуг с настройками профессии
+
+Строится один раз на профессию (кэшируется в ProfessionConfig) из
+названий и колонки keywords. Тексты нормализуются (регистр, ё/е,
+пунктуация и пробелы), после чего:
+    - вхождения названий и ключевых слов в упоминание ищет автомат
+      Ахо-Корасик - один проход по тексту упоминания;
+    - обратное направление (упоминание - часть названия, "обед" для
+      "текущий обед") - поиск упоминания в словаре подстрок названий,
+      без прохода по всем названиям.
+
+Названия сопоставляются в обе стороны, как и раньше; ключевые слова -
+только как вхождение в упоминание. Для first совпадения ранжируются:
+точное название, затем самое длинное совпавшее название, затем
+ключевые слова (при равенстве - первый по порядку настроек).
+"""
+import json
+import re
+from collections import deque
+from functools import lru_cache
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=4096)
+def normalize(text: str) -> str:
+    """
+    Нормализованные токены через пробел: "Текущий  обед!" -> "текущий обед"
+    (упоминания повторяются - результат кэшируется)
+    """
+    if not text:
+        return ""
+    return " ".join(_TOKEN_RE.findall(text.lower().replace("ё", "е")))
+
+
+def parse_keywords(raw) -> list:
+    """Колонка keywords (JSON-список или строка через запятую) -> список"""
+    if not raw:
+        return []
+    if isinstance(raw, (list, tuple)):
+        return [str(k) for k in raw]
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        return [k.strip() for k in raw.split(",") if k.strip()]
+    if isinstance(value, str):
+        return [value]
+    return [str(k) for k in value] if isinstance(value, list) else []
+
+
+class Matcher:
+    """
+    Поиск элементов (обедов или услуг), упомянутых в тексте
+
+    Элементы задаются по порядку: (название, ключевые слова);
+    find возвращает номера найденных элементов.
+    """
+
+    __slots__ = ("_goto", "_fail", "_out", "_names", "_within", "_found", "size")
+
+    # Сколько результатов find помнить (упоминания повторяются)
+    FOUND_CACHE_SIZE = 1024
+
+    def __init__(self, items):
+        self._goto = [{}]   # узел -> {символ: узел}
+        self._fail = [0]
+        self._out = [set()]  # узел -> (номер элемента, это название?) для шаблонов, заканчивающихся здесь
+        self._names = []     # нормализованные названия по номеру элемента
+        self._within = {}    # подстрока названия -> номера элементов, в чьих названиях она есть
+        self._found = {}     # нормализованный текст -> (find, first)
+        self.size = 0
+
+        for index, (name, keywords) in enumerate(items):
+            self.size += 1
+            name = normalize(name)
+            self._names.append(name)
+            if name:
+                self._add(name, (index, True))
+                self._index_substrings(name, index)
+            for keyword in map(normalize, keywords):
+                if keyword and keyword != name:
+                    self._add(keyword, (index, False))
+
+        self._build()
+        self._within = {text: tuple(sorted(indexes)) for text, indexes in self._within.items()}
+
+    def _index_substrings(self, name: str, index: int):
+        # Названия короткие: все O(длина²) подстрок дешевле прохода
+        # по всем названиям на каждое упоминание
+        for start in range(len(name)):
+            for end in range(start + 1, len(name) + 1):
+                self._within.setdefault(name[start:end], set()).add(index)
+
+    def _add(self, pattern: str, output: tuple):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            node = next_node
+        self._out[node].add(output)
+
+    def _build(self):
+        """Ссылки неудач (обход в ширину)"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] |= self._out[self._fail[child]]
+
+    def _lookup(self, text: str) -> tuple:
+        text = normalize(text)
+
+        found = self._found.get(text)
+        if found is None:
+            if len(self._found) >= self.FOUND_CACHE_SIZE:
+                self._found.clear()
+            ranks = self._scan(text) if text else {}
+            found = self._found[text] = (
+                frozenset(ranks),
+                min(ranks, key=lambda index: (ranks[index], index)) if ranks else None
+            )
+        return found
+
+    def _scan(self, text: str) -> dict:
+        """
+        Поиск по нормализованному тексту: {номер элемента: ранг}
+
+        Ранг (меньше - лучше): (0, 0) - точное название, (1, -длина) -
+        название в тексте или текст в названии, (2, 0) - ключевое слово.
+        """
+        ranks = {}
+
+        def hit(index, rank):
+            if index not in ranks or rank < ranks[index]:
+                ranks[index] = rank
+
+        for index in self._within.get(text, ()):
+            name = self._names[index]
+            hit(index, (0, 0) if text == name else (1, -len(name)))
+
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for index, is_name in self._out[node]:
+                hit(index, (1, -len(self._names[index])) if is_name else (2, 0))
+
+        return ranks
+
+    def find(self, text: str) -> frozenset:
+        """Номера элементов, упомянутых в text"""
+        return self._lookup(text)[0]
+
+    def first(self, text: str):
+        """
+        Номер лучшего найденного элемента или None: точное название,
+        затем самое длинное название, затем ключевое слово
+        """
+        return self._lookup(text)[1]
+
+    @classmethod
+    def for_items(cls, items):
+        """Matcher по MealType/AdditionalService (name, keywords)"""
+        return cls([(item.name, parse_keywords(item.keywords)) for item in items])
@@ -18,8 +18,11 @@ console.log('Project ID:', projectId);
 const API_URL = '/api';
 
 // Глобальные переменные
-let allShifts = []; // Все смены
+let allShifts = []; // Загруженные смены (все страницы)
 let currentFilter = 'all'; // Текущий фильтр
+let nextCursor = null; // Курсор следующей страницы (null - страниц больше нет)
+let isLoading = false;
+let pendingReset = false; // Фильтр сменился во время загрузки - перезагрузить после неё
 
 // Устанавливаем название
 document.getElementById('project-title').textContent = `📊 ${projectName}`;
@@ -38,7 +41,7 @@ document.querySelectorAll('.filter-btn').forEach(btn => {
         
         // Применяем фильтр
         currentFilter = this.dataset.filter;
-        displayShifts(allShifts);
+        loadShifts(true);
         
         console.log('🔍 Фильтр:', currentFilter);
     });
@@ -63,22 +66,16 @@ document.getElementById('export-csv-btn').addEventListener('click', function() {
     tg.showAlert('CSV файл скачивается...');
 });
 
-// Функция загрузки статистики
+// Функция загрузки статистики (итоги + первая страница смен)
 async function loadStatistics() {
     console.log('🔄 Загружаю статистику...');
     
     try {
-        const response = await fetch(`${API_URL}/projects/${projectId}/statistics`);
-        
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}`);
-        }
-        
-        const data = await response.json();
+        const data = await fetchShiftsPage(null);
         console.log('✅ Статистика загружена:', data);
         
-        // Сохраняем все смены глобально
         allShifts = data.shifts;
+        nextCursor = data.next_cursor;
         
         displaySummary(data.statistics);
         displayShifts(allShifts);
@@ -90,6 +87,65 @@ async function loadStatistics() {
     }
 }
 
+// Запрос страницы смен (cursor = null - первая страница)
+async function fetchShiftsPage(cursor) {
+    const params = new URLSearchParams();
+    
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    
+    const since = getSinceDate(currentFilter);
+    if (since) {
+        params.set('since', since);
+    }
+    
+    const response = await fetch(`${API_URL}/projects/${projectId}/statistics?${params}`);
+    
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+    }
+    
+    return response.json();
+}
+
+// Функция загрузки смен (reset - заново, с первой страницы)
+async function loadShifts(reset) {
+    if (isLoading) {
+        // Новый фильтр не теряем: загрузим его, когда текущий запрос завершится
+        if (reset) {
+            pendingReset = true;
+        }
+        return;
+    }
+    isLoading = true;
+    
+    try {
+        const data = await fetchShiftsPage(reset ? null : nextCursor);
+        
+        // Ответ для прежнего фильтра не показываем
+        if (pendingReset) {
+            return;
+        }
+        
+        allShifts = reset ? data.shifts : allShifts.concat(data.shifts);
+        nextCursor = data.next_cursor;
+        
+        displayShifts(allShifts);
+        
+    } catch (error) {
+        console.error('❌ Ошибка загрузки смен:', error);
+        tg.showAlert('Ошибка загрузки смен');
+    } finally {
+        isLoading = false;
+        
+        if (pendingReset) {
+            pendingReset = false;
+            loadShifts(true);
+        }
+    }
+}
+
 // Функция отображения общей статистики
 function displaySummary(stats) {
     const container = document.getElementById('stats-summary');
@@ -119,10 +175,10 @@ function displaySummary(stats) {
     container.innerHTML = html;
 }
 
-// Функция фильтрации смен по периоду
-function filterShiftsByPeriod(shifts, filter) {
+// Начальная дата периода фильтра (YYYY-MM-DD) или null
+function getSinceDate(filter) {
     if (filter === 'all') {
-        return shifts;
+        return null;
     }
     
     const now = new Date();
@@ -135,33 +191,29 @@ function filterShiftsByPeriod(shifts, filter) {
     } else if (filter === 'month') {
         daysAgo = 30;
     } else {
-        return shifts;
+        return null;
     }
     
     const cutoffDate = new Date(today);
     cutoffDate.setDate(cutoffDate.getDate() - daysAgo);
     
-    return shifts.filter(shift => {
-        const shiftDate = new Date(shift.date);
-        return shiftDate >= cutoffDate;
-    });
+    const month = String(cutoffDate.getMonth() + 1).padStart(2, '0');
+    const day = String(cutoffDate.getDate()).padStart(2, '0');
+    return `${cutoffDate.getFullYear()}-${month}-${day}`;
 }
 
 // Функция отображения списка смен
 function displayShifts(shifts) {
     const container = document.getElementById('shifts-list');
     
-    // Применяем фильтр
-    const filteredShifts = filterShiftsByPeriod(shifts, currentFilter);
-    
-    if (filteredShifts.length === 0) {
+    if (shifts.length === 0) {
         container.innerHTML = '<p class="hint">Смен за этот период нет</p>';
         return;
     }
     
     let html = '<div class="shifts-table">';
     
-    filteredShifts.forEach(shift => {
+    shifts.forEach(shift => {
         const date = new Date(shift.date).toLocaleDateString('ru-RU');
         const overtime = shift.overtime_hours > 0 
             ? `<span class="overtime-badge">+${shift.overtime_hours}ч</span>` 
@@ -172,14 +224,24 @@ function displayShifts(shifts) {
                 <div class="shift-date">${date}</div>
                 <div class="shift-time">${shift.start_time} - ${shift.end_time}</div>
                 <div class="shift-hours">${shift.total_hours}ч ${overtime}</div>
-                <div class="shift-earnings">${shift.total_net.toLocaleString()}₽</div>
+                <div class="shift-earnings">${(shift.total_net || 0).toLocaleString()}₽</div>
             </div>
         `;
     });
     
     html += '</div>';
     
+    // Кнопка следующей страницы
+    if (nextCursor) {
+        html += '<button type="button" class="load-more-btn" id="load-more-btn">Загрузить ещё</button>';
+    }
+    
     container.innerHTML = html;
+    
+    const loadMoreBtn = document.getElementById('load-more-btn');
+    if (loadMoreBtn) {
+        loadMoreBtn.addEventListener('click', () => loadShifts(false));
+    }
 }
 
 console.log('🚀 Страница статистики готова');
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""
+Ночная сверка earnings: пересчёт всех рассчитанных смен всех проектов
+
+Сохранённые earnings сравниваются со свежим расчётом по текущим
+настройкам профессии; расхождения пишутся в earnings_drift, итоги
+прогона - в drift_runs. В БД смен ничего не меняется.
+
+Проекты делятся на шарды (по числу смен) и считаются в отдельных
+процессах (ProcessPoolExecutor): бот и его event loop не нагружаются.
+Каждый процесс читает БД своим соединением sqlite3 только для чтения.
+
+Запуск:
+    python nightly_recompute.py               # NIGHTLY_WORKERS процессов
+    python nightly_recompute.py --workers 4
+"""
+import argparse
+import asyncio
+import logging
+import sqlite3
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from calculator import build_shift_input
+from config import DATABASE_PATH, NIGHTLY_WORKERS, RECALC_CHUNK_SIZE
+from database import (
+    PROJECT_SNAPSHOT_SQL, SQLITE_READ_ONLY_PRAGMAS, init_db, close_pool,
+    count_calculated_shifts_by_project, profession_from_snapshot, save_drift_report
+)
+from earnings_vectorized import compute_many
+
+logger = logging.getLogger(__name__)
+
+# Допуск для overtime_hours (float); суммы сравниваются точно
+OVERTIME_TOLERANCE = 1e-6
+
+
+def make_shards(counts: dict, workers: int) -> list:
+    """
+    Разбить проекты на шарды с примерно равным числом смен
+
+    Жадно: проекты по убыванию числа смен, каждый - в самый лёгкий шард.
+
+    Args:
+        counts: {project_id: число смен}
+
+    Returns:
+        [[project_id, ...]] - не больше workers непустых шардов
+    """
+    shards = [[] for _ in range(max(1, min(workers, len(counts))))]
+    loads = [0] * len(shards)
+
+    for project_id, shifts in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        lightest = loads.index(min(loads))
+        shards[lightest].append(project_id)
+        loads[lightest] += shifts
+
+    return [shard for shard in shards if shard]
+
+
+def _connect_read_only(database: str):
+    """Соединение sqlite3 только для чтения (для процесса-воркера)"""
+    conn = sqlite3.connect(f"{Path(database).resolve().as_uri()}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    for name, value in SQLITE_READ_ONLY_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def _load_profession(conn, project_id: int):
+    """ProfessionConfig проекта (как database.load_project_snapshot) или None"""
+    return profession_from_snapshot(conn.execute(PROJECT_SNAPSHOT_SQL, (project_id,)).fetchone())
+
+
+def _check_project(conn, project_id: int, chunk_size: int):
+    """
+    Сверка рассчитанных смен проекта
+
+    Смены, earnings которых посчитаны по старой версии настроек
+    (calculated_with_version < config_version), пропускаются: они ждут
+    фонового пересчёта (recompute_stale) и расхождением не считаются.
+
+    Returns:
+        (число смен, [строки earnings_drift без run_id])
+    """
+    profession = _load_profession(conn, project_id)
+    if profession is None:
+        return 0, []
+
+    meals = {}
+    for row in conn.execute("""
+        SELECT sm.shift_id, mt.*
+        FROM shift_meals sm
+        JOIN meal_types mt ON sm.meal_type_id = mt.id
+        JOIN shifts s ON s.id = sm.shift_id
+        WHERE s.project_id = ? AND s.status = 'calculated'
+    """, (project_id,)):
+        meals.setdefault(row["shift_id"], []).append(row)
+
+    cursor = conn.execute("""
+        SELECT s.id, s.total_hours, s.parsed_data, s.is_expense_day, s.overtime_hours,
+               e.total_net, e.total_gross
+        FROM shifts s
+        LEFT JOIN earnings e ON e.shift_id = s.id
+        WHERE s.project_id = ? AND s.status = 'calculated' AND s.total_hours IS NOT NULL
+          AND (e.shift_id IS NULL OR COALESCE(e.calculated_with_version, 0) >= ?)
+        ORDER BY s.id
+    """, (project_id, profession.config_version))
+
+    checked = 0
+    drift = []
+
+    while rows := cursor.fetchmany(chunk_size):
+        fresh = compute_many(profession, [
+            build_shift_input(row["total_hours"], row["parsed_data"], row["is_expense_day"], meals.get(row["id"]))
+            for row in rows
+        ])
+
+        for row, net, gross, overtime in zip(
+            rows, fresh["total_net"], fresh["total_gross"], fresh["overtime_hours"]
+        ):
+            net, gross, overtime = int(net), int(gross), float(overtime)
+            stored_overtime = row["overtime_hours"]
+            if (
+                row["total_net"] != net
+                or row["total_gross"] != gross
+                or stored_overtime is None
+                or abs(stored_overtime - overtime) > OVERTIME_TOLERANCE
+            ):
+                drift.append((
+                    project_id, row["id"],
+                    row["total_net"], net,
+                    row["total_gross"], gross,
+                    stored_overtime, overtime
+                ))
+
+        checked += len(rows)
+
+    return checked, drift
+
+
+def check_shard(database: str, project_ids: list, chunk_size: int = RECALC_CHUNK_SIZE) -> dict:
+    """
+    Сверка шарда проектов (выполняется в процессе-воркере)
+
+    Returns:
+        dict: projects, shifts, drift, seconds
+    """
+    started = time.perf_counter()
+    conn = _connect_read_only(database)
+
+    shifts = 0
+    drift = []
+    try:
+        for project_id in project_ids:
+            checked, project_drift = _check_project(conn, project_id, chunk_size)
+            shifts += checked
+            drift.extend(project_drift)
+    finally:
+        conn.close()
+
+    return {
+        "projects": len(project_ids),
+        "shifts": shifts,
+        "drift": drift,
+        "seconds": time.perf_counter() - started
+    }
+
+
+async def run_nightly(workers: int = NIGHTLY_WORKERS, database: str = DATABASE_PATH) -> dict:
+    """
+    Ночная сверка всех проектов
+
+    Шарды считаются в ProcessPoolExecutor, результаты объединяются
+    и записываются одной транзакцией (save_drift_report). Пул БД
+    (init_db) должен быть открыт.
+
+    Returns:
+        dict строки drift_runs (run_id, workers, projects, shifts, drifted, seconds)
+    """
+    started = time.perf_counter()
+
+    counts = await count_calculated_shifts_by_project()
+    shards = make_shards(counts, workers)
+    logger.info(
+        "Сверка: проектов %s, смен %s, шардов %s",
+        len(counts), sum(counts.values()), len(shards)
+    )
+
+    drift = []
+    shifts = 0
+
+    if shards:
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+            results = await asyncio.gather(*(
+                loop.run_in_executor(pool, check_shard, database, shard) for shard in shards
+            ))
+
+        for number, result in enumerate(results, start=1):
+            logger.info(
+                "Шард %s: проектов %s, смен %s, расхождений %s за %.2f с (%.0f смен/с)",
+                number, result["projects"], result["shifts"], len(result["drift"]),
+                result["seconds"], result["shifts"] / result["seconds"] if result["seconds"] else 0
+            )
+            shifts += result["shifts"]
+            drift.extend(result["drift"])
+
+    seconds = time.perf_counter() - started
+    run = {
+        "run_id": uuid.uuid4().hex,
+        "workers": len(shards),
+        "projects": len(counts),
+        "shifts": shifts,
+        "drifted": len(drift),
+        "seconds": round(seconds, 3)
+    }
+    await save_drift_report(run, drift)
+
+    logger.info(
+        "Сверка %s: смен %s, расхождений %s за %.2f с (%.0f смен/с)",
+        run["run_id"], shifts, len(drift), seconds, shifts / seconds if seconds else 0
+    )
+    return run
+
+
+async def main(workers: int) -> int:
+    await init_db()
+    try:
+        run = await run_nightly(workers)
+    finally:
+        await close_pool()
+
+    if run["drifted"]:
+        print(f"❌ Расхождений: {run['drifted']} из {run['shifts']} смен (отчёт {run['run_id']})")
+        return 1
+    print(f"✅ Все {run['shifts']} смен совпадают с расчётом")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Ночная сверка earnings")
+    parser.add_argument("--workers", type=int, default=NIGHTLY_WORKERS, help="Число процессов")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args.workers)))
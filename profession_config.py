@@ -0,0 +1,463 @@
+"""
+Конфигурация профессии проекта
+Неизменяемый снимок настроек (профессия + ставки + услуги + обеды),
+скомпилированная таблица прогрессивных ставок и LRU-кэш снимков по project_id
+"""
+import math
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields, replace
+
+from config import PROFESSION_CACHE_SIZE, PROFESSION_CACHE_TTL
+from matcher import Matcher
+
+
+def from_row(cls, row):
+    """Собрать dataclass из строки БД (лишние колонки игнорируются)"""
+    row = dict(row)
+    return cls(**{f.name: row.get(f.name) for f in fields(cls)})
+
+
+def _to_dict(obj) -> dict:
+    return {f.name: getattr(obj, f.name) for f in fields(obj)}
+
+
+@dataclass(frozen=True, slots=True)
+class ProgressiveRate:
+    """Прогрессивная ставка переработки"""
+    id: int
+    profession_id: int
+    hours_from: float
+    hours_to: float
+    rate: int
+    order_num: int
+
+
+def validate_progressive_rates(brackets):
+    """
+    Проверка ступеней прогрессивных ставок
+
+    Ступени должны идти подряд от 0 часов переработки: без разрывов,
+    без пересечений и пустых ступеней; открытой (hours_to = None)
+    может быть только последняя.
+
+    Args:
+        brackets: Пары (hours_from, hours_to) в порядке order_num
+
+    Raises:
+        ValueError: Описание первой ошибки
+    """
+    expected_from = 0
+    previous = None
+
+    for hours_from, hours_to in brackets:
+        if previous is not None and previous[1] is None:
+            raise ValueError(
+                f"Ступень {hours_from}-{hours_to or '+'}ч после открытой ступени {previous[0]}+ч"
+            )
+        if hours_from > expected_from:
+            raise ValueError(f"Разрыв в прогрессивных ставках: {expected_from}-{hours_from}ч")
+        if hours_from < expected_from:
+            raise ValueError(
+                f"Ступень {hours_from}-{hours_to or '+'}ч пересекается с предыдущей (до {expected_from}ч)"
+            )
+        if hours_to is not None and hours_to <= hours_from:
+            raise ValueError(f"Пустая ступень: {hours_from}-{hours_to}ч")
+
+        expected_from = hours_to
+        previous = (hours_from, hours_to)
+
+
+@dataclass(frozen=True, slots=True)
+class BracketTable:
+    """
+    Прогрессивные ставки, скомпилированные в накопительную таблицу
+
+    Ступени идут подряд от 0 часов переработки (как при расчёте
+    по строкам: учитывается длина ступени hours_to - hours_from).
+    starts[i] - начало ступени i, cum_net/cum_gross[i] - оплата всех
+    ступеней до неё; оплата переработки - bisect и одно умножение.
+    Часы сверх последней закрытой ступени не оплачиваются.
+    """
+    starts: tuple       # Начало ступени (часы переработки)
+    sizes: tuple        # Длина ступени (inf - открытая)
+    rates_net: tuple
+    rates_gross: tuple  # round(rate / (1 - tax/100))
+    cum_net: tuple
+    cum_gross: tuple
+    labels: tuple       # "0-2ч", "4-+ч" (для деталей расчёта)
+    tax_k: float        # 1 - tax/100
+
+    @classmethod
+    def compile(cls, rates, tax_percentage: float):
+        """
+        Собрать таблицу из ProgressiveRate (по order_num)
+
+        Ступени нулевой и отрицательной длины (из данных, записанных до
+        проверки в add_progressive_rate) пропускаются; ступени после
+        открытой недостижимы и тоже не попадают в таблицу.
+        """
+        tax_k = 1 - tax_percentage / 100
+        columns = ([], [], [], [], [], [], [])
+        start = cum_net = cum_gross = 0
+
+        for rate in rates:
+            size = rate.hours_to - rate.hours_from if rate.hours_to else math.inf
+            if size <= 0:
+                continue
+
+            rate_gross = round(rate.rate / tax_k)
+            label = f"{rate.hours_from:.0f}-{rate.hours_to if rate.hours_to else '+'}ч"
+            for column, value in zip(columns, (start, size, rate.rate, rate_gross, cum_net, cum_gross, label)):
+                column.append(value)
+
+            if size == math.inf:
+                break
+
+            bracket_gross = round(size * rate_gross)
+            cum_gross += bracket_gross
+            cum_net += round(bracket_gross * tax_k)
+            start += size
+
+        return cls(*(tuple(column) for column in columns), tax_k=tax_k)
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    @property
+    def end(self) -> float:
+        """Конец последней ступени (inf - открытая)"""
+        return self.starts[-1] + self.sizes[-1]
+
+    def locate(self, hours: float) -> int:
+        """Номер ступени, в которую попадает hours > 0 часов переработки"""
+        return bisect_left(self.starts, hours) - 1
+
+    def pay(self, hours: float):
+        """Оплата hours часов переработки: (нетто, брутто)"""
+        if hours <= 0 or not self.starts:
+            return 0, 0
+
+        hours = min(hours, self.end)
+        i = self.locate(hours)
+        partial_gross = round((hours - self.starts[i]) * self.rates_gross[i])
+        return (
+            self.cum_net[i] + round(partial_gross * self.tax_k),
+            self.cum_gross[i] + partial_gross
+        )
+
+    def breakdown(self, hours: float) -> list:
+        """Детали по ступеням для calculation_details"""
+        if hours <= 0 or not self.starts:
+            return []
+
+        hours = min(hours, self.end)
+        last = self.locate(hours)
+        result = []
+        for i in range(last + 1):
+            bracket_hours = self.sizes[i] if i < last else hours - self.starts[i]
+            bracket_gross = round(bracket_hours * self.rates_gross[i])
+            result.append({
+                "bracket": self.labels[i],
+                "hours": round(bracket_hours, 2),
+                "rate_net": self.rates_net[i],
+                "rate_gross": self.rates_gross[i],
+                "total_net": round(bracket_gross * self.tax_k),
+                "total_gross": bracket_gross
+            })
+        return result
+
+
+@dataclass(frozen=True, slots=True)
+class AdditionalService:
+    """Дополнительная услуга"""
+    id: int
+    profession_id: int
+    name: str
+    cost: int
+    tax_percentage: float
+    application_rule: str
+    linked_service_id: int
+    keywords: str
+
+
+@dataclass(frozen=True, slots=True)
+class MealType:
+    """Тип обеда"""
+    id: int
+    profession_id: int
+    name: str
+    adds_overtime_hours: float
+    keywords: str
+
+
+# Поля ProfessionConfig, которых нет в строке professions
+_NESTED = ("progressive_rates", "services", "meal_types")
+_DERIVED = ("bracket_table", "meal_matcher", "service_matcher", "_hash")
+
+# Поля, которые можно подменить в гипотетической конфигурации (with_overrides)
+OVERRIDABLE = (
+    "base_rate_net", "base_rate_gross", "base_overtime_rate", "daily_allowance",
+    "base_shift_hours", "tax_percentage", "overtime_rounding", "overtime_threshold",
+    "progressive_rates"
+)
+
+
+def _check_number(name: str, value, allow_none: bool = False):
+    """Значение настройки: конечное неотрицательное число (bool - не число)"""
+    if value is None and allow_none:
+        return value
+    if (
+        isinstance(value, bool)
+        or not isinstance(value, (int, float))
+        or not math.isfinite(value)
+        or value < 0
+    ):
+        raise ValueError(f"{name}: нужно неотрицательное число, получено {value!r}")
+    return value
+
+
+@dataclass(frozen=True, slots=True)
+class ProfessionConfig:
+    """Полная конфигурация профессии проекта (неизменяемая)"""
+    id: int
+    project_id: int
+    position: str
+    base_rate_net: int
+    base_rate_gross: int
+    base_overtime_rate: int
+    daily_allowance: int
+    base_shift_hours: float
+    break_hours: float
+    tax_percentage: float
+    payment_schedule: str
+    conditions: str
+    overtime_rounding: float
+    overtime_threshold: float
+    created_at: str
+    # Номер изменения настроек (professions.config_version)
+    config_version: int = 1
+    progressive_rates: tuple = ()
+    services: tuple = ()
+    meal_types: tuple = ()
+    # Скомпилированные progressive_rates (строится в __post_init__,
+    # кэшируется вместе с конфигурацией)
+    bracket_table: BracketTable = field(default=None, compare=False, repr=False)
+    # Поиск упомянутых обедов и услуг (matcher.py), строится там же
+    meal_matcher: Matcher = field(default=None, compare=False, repr=False)
+    service_matcher: Matcher = field(default=None, compare=False, repr=False)
+    # hash() по сравниваемым полям, считается один раз: конфигурация -
+    # часть ключа earnings_memo (совпадение проверяется сравнением полей)
+    _hash: int = field(default=None, init=False, compare=False, repr=False)
+
+    def __post_init__(self):
+        if self.bracket_table is None:
+            object.__setattr__(
+                self, "bracket_table",
+                BracketTable.compile(self.progressive_rates, self.tax_percentage)
+            )
+        if self.meal_matcher is None:
+            object.__setattr__(self, "meal_matcher", Matcher.for_items(self.meal_types))
+        if self.service_matcher is None:
+            object.__setattr__(self, "service_matcher", Matcher.for_items(self.services))
+        object.__setattr__(self, "_hash", hash(tuple(
+            getattr(self, f.name) for f in fields(self) if f.compare
+        )))
+
+    def __hash__(self):
+        return self._hash
+
+    @classmethod
+    def from_rows(cls, profession, rates=(), services=(), meals=()):
+        """
+        Собрать конфигурацию из строк БД
+
+        Args:
+            profession: Строка professions
+            rates: Строки progressive_rates (по order_num)
+            services: Строки additional_services
+            meals: Строки meal_types
+        """
+        row = dict(profession)
+        values = {
+            f.name: row.get(f.name)
+            for f in fields(cls)
+            if f.name not in _NESTED + _DERIVED
+        }
+        return cls(
+            **values,
+            progressive_rates=tuple(from_row(ProgressiveRate, r) for r in rates),
+            services=tuple(from_row(AdditionalService, s) for s in services),
+            meal_types=tuple(from_row(MealType, m) for m in meals)
+        )
+
+    def with_overrides(self, overrides: dict):
+        """
+        Гипотетическая конфигурация: та же профессия с другими настройками
+
+        Таблица ставок строится заново, поиск обедов и услуг
+        (от переопределений не зависит) берётся готовый.
+        Если меняются base_rate_net или tax_percentage без base_rate_gross,
+        брутто пересчитывается, как в create_profession.
+
+        Args:
+            overrides: {поле из OVERRIDABLE: значение}; progressive_rates -
+                       список {"hours_from", "hours_to", "rate"} по порядку
+
+        Raises:
+            ValueError: Неизвестное поле, значение не неотрицательное число
+                        или ошибка в шкале ставок
+        """
+        if not isinstance(overrides, dict):
+            raise ValueError("Переопределения - объект {поле: значение}")
+        unknown = sorted(set(overrides) - set(OVERRIDABLE))
+        if unknown:
+            raise ValueError(f"Нельзя изменить: {', '.join(unknown)}")
+
+        values = {
+            name: value if name == "progressive_rates" else _check_number(name, value)
+            for name, value in overrides.items()
+        }
+
+        if "progressive_rates" in values:
+            try:
+                rates = tuple(
+                    ProgressiveRate(
+                        id=None,
+                        profession_id=self.id,
+                        hours_from=_check_number("hours_from", rate["hours_from"]),
+                        hours_to=_check_number("hours_to", rate.get("hours_to"), allow_none=True),
+                        rate=_check_number("rate", rate["rate"]),
+                        order_num=order_num
+                    )
+                    for order_num, rate in enumerate(values["progressive_rates"], start=1)
+                )
+            except (KeyError, TypeError, AttributeError):
+                raise ValueError("Ступень ставок: нужны hours_from, hours_to и rate")
+            validate_progressive_rates([(r.hours_from, r.hours_to) for r in rates])
+            values["progressive_rates"] = rates
+
+        tax_percentage = values.get("tax_percentage", self.tax_percentage)
+        if tax_percentage >= 100:
+            raise ValueError("Налог должен быть меньше 100%")
+        if "base_rate_gross" not in values and ("base_rate_net" in values or "tax_percentage" in values):
+            base_rate_net = values.get("base_rate_net", self.base_rate_net)
+            values["base_rate_gross"] = round(base_rate_net / (1 - tax_percentage / 100))
+
+        return replace(self, **values, bracket_table=None)
+
+    def profession_dict(self) -> dict:
+        """Поля профессии (как строка professions)"""
+        result = _to_dict(self)
+        for key in _NESTED + _DERIVED:
+            del result[key]
+        return result
+
+    def to_dict(self) -> dict:
+        """Конфигурация в формате API (/api/projects/<id>)"""
+        return {
+            "profession": self.profession_dict(),
+            "progressive_rates": [_to_dict(r) for r in self.progressive_rates],
+            "services": [_to_dict(s) for s in self.services],
+            "meals": [_to_dict(m) for m in self.meal_types]
+        }
+
+
+# Маркер промаха кэша (None - валидное значение: профессия не настроена)
+MISSING = object()
+
+
+def version_of(config):
+    """(id, config_version) конфигурации или None - для сверки с БД"""
+    return None if config is None else (config.id, config.config_version)
+
+
+class ProfessionConfigCache:
+    """
+    LRU-кэш ProfessionConfig по project_id
+
+    Записи сбрасываются явно при изменении настроек (database.py). Запись
+    из другого процесса (api_server.py) видна по версии: get сверяет
+    (id, config_version) профессии из БД с закэшированной, при
+    расхождении - промах. TTL - запасная граница жизни записи.
+    """
+
+    def __init__(self, max_size: int = PROFESSION_CACHE_SIZE, ttl: float = PROFESSION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # project_id -> (config, loaded_at)
+
+        # Растёт при каждой инвалидации: загрузка, начатая до неё,
+        # не должна положить в кэш устаревшие данные
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, project_id: int, version=MISSING):
+        """
+        Конфигурация из кэша или MISSING
+
+        Args:
+            version: (id, config_version) профессии проекта в БД или None
+                     (профессии нет); MISSING - не сверять
+        """
+        entry = self._entries.get(project_id)
+
+        if (
+            entry is None
+            or (self.ttl > 0 and time.monotonic() - entry[1] > self.ttl)
+            or (version is not MISSING and version_of(entry[0]) != version)
+        ):
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(project_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, project_id: int, config, generation: int = None):
+        """Положить конфигурацию (если с начала загрузки не было инвалидаций)"""
+        if generation is not None and generation != self.generation:
+            return
+
+        self._entries[project_id] = (config, time.monotonic())
+        self._entries.move_to_end(project_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, project_id: int = None):
+        """Сбросить конфигурацию проекта (None - весь кэш)"""
+        self.generation += 1
+        self.invalidations += 1
+
+        if project_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(project_id, None)
+
+    def invalidate_profession(self, profession_id: int):
+        """Сбросить конфигурацию по ID профессии"""
+        self.generation += 1
+        self.invalidations += 1
+
+        for project_id, (config, _) in list(self._entries.items()):
+            if config is not None and config.id == profession_id:
+                del self._entries[project_id]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+profession_cache = ProfessionConfigCache()
@@ -0,0 +1,89 @@
+"""
+Тест резервного копирования (онлайн-бэкап, проверка, восстановление)
+"""
+import asyncio
+import gzip
+import os
+import tempfile
+from database import (
+    init_db, close_pool, start_writer, stop_writer,
+    create_user, create_project, create_shift, get_user_shifts
+)
+import backup
+
+async def test():
+    print("🧪 Тест резервного копирования\n")
+
+    await init_db()
+    await start_writer()
+
+    await create_user(777003, "backup_test")
+    project_id = await create_project(777003, "Бэкап", "")
+    for i in range(200):
+        await create_shift(project_id, f"2026-06-{1 + i % 28:02d}", "09:00", "21:00", 12, "x" * 500, "{}")
+
+    backup_dir = tempfile.mkdtemp(prefix="test_backup_")
+
+    # Бэкап мелкими шагами, пока бот пишет смены
+    print("1. Бэкап во время записи...")
+    stop = asyncio.Event()
+
+    async def writer():
+        written = 0
+        while not stop.is_set():
+            await create_shift(project_id, "2026-07-01", "09:00", "21:00", 12, "во время бэкапа", "{}")
+            written += 1
+        return written
+
+    writer_task = asyncio.create_task(writer())
+    path = await backup.create_backup(backup_dir=backup_dir, pages=4, sleep=0.001)
+    stop.set()
+    written = await writer_task
+
+    assert path.endswith(".db.gz"), path
+    with gzip.open(path) as f:
+        assert f.read(16) == b"SQLite format 3\x00", "Копия - не файл SQLite"
+    print(f"   ✅ {os.path.basename(path)}, смен записано во время бэкапа: {written}\n")
+
+    print("2. Проверка копии...")
+    assert await backup.verify_backup(path) == "ok"
+    print("   ✅ integrity_check ok\n")
+
+    print("3. Хранение копий...")
+    for _ in range(3):
+        await asyncio.sleep(1.1)  # имя копии - с точностью до секунды
+        await backup.create_backup(backup_dir=backup_dir, compress=False)
+    removed = backup.apply_retention(backup_dir, keep=2)
+    assert len(backup.list_backups(backup_dir)) == 2
+    assert path in removed, "Удалена не самая старая копия"
+    print(f"   ✅ Удалено {len(removed)}, осталось 2\n")
+
+    await stop_writer()
+
+    print("4. Восстановление...")
+    latest = backup.list_backups(backup_dir)[0]
+    restored = os.path.join(backup_dir, "restored.db")
+    await backup.restore_backup(latest, restored)
+    assert backup.integrity_check(restored) == "ok"
+    print("   ✅ Восстановлено и проверено\n")
+
+    print("5. Повреждённая копия не восстанавливается...")
+    broken = os.path.join(backup_dir, "data-broken.db")
+    with open(latest, "rb") as src, open(broken, "wb") as dst:
+        data = bytearray(src.read())
+        data[100:4096] = b"\xff" * (4096 - 100)
+        dst.write(data)
+    try:
+        await backup.restore_backup(broken, restored)
+    except backup.BackupError as e:
+        print(f"   ✅ Отклонена: {e}\n")
+    else:
+        raise AssertionError("Повреждённая копия восстановлена")
+
+    shifts = await get_user_shifts(project_id, limit=1)
+    assert shifts, "Рабочая БД не должна пострадать"
+
+    await close_pool()
+    print("✅ Все тесты пройдены!")
+
+asyncio.run(test())
@@ -0,0 +1,103 @@
+"""
+Тест компактного формата JSON-блобов (blob_codec) и миграции 6
+"""
+import asyncio
+import json
+import os
+import tempfile
+import aiosqlite
+import blob_codec
+from database import init_db, close_pool, migrate, get_schema_version, SCHEMA_VERSION
+
+PARSED = {
+    "date": "2026-01-12", "start_time": "07:00", "end_time": "23:00",
+    "services": ["ронин"], "meals": ["текущий обед"],
+    "confidence": 0.95, "missing_fields": []
+}
+DETAILS = {
+    "base_hours": 12, "total_hours": 16.0, "base_overtime_hours": 4.0,
+    "meal_hours": 1.0, "total_overtime_hours": 5.0,
+    "breakdown": {
+        "base_pay": {"net": 10000, "gross": 11494},
+        "overtime": [{"bracket": "0-2ч", "hours": 2.0, "rate_net": 500, "rate_gross": 575,
+                      "total_net": 1000, "total_gross": 1149}],
+        "meals": [{"name": "текущий обед", "adds_hours": 1.0, "rate_net": 833,
+                   "rate_gross": 958, "total_net": 833, "total_gross": 958}],
+        "daily_allowance": 1000,
+        "services": [{"name": "ронин", "cost_net": 3000, "cost_gross": 3529, "tax": 15}]
+    }
+}
+
+def test_codec():
+    print("1. Кодек...")
+    for obj in (PARSED, DETAILS):
+        text = json.dumps(obj, ensure_ascii=False)
+        blob = blob_codec.encode(text)
+        assert blob[0] == blob_codec.FORMAT_ZLIB_V1
+        assert blob_codec.decode(blob) == obj, "Значение изменилось"
+        assert blob_codec.decode(text) == obj, "Старый формат не читается"
+        assert blob_codec.encode(obj) == blob, "dict и JSON-текст кодируются по-разному"
+        print(f"   {len(text.encode())} → {len(blob)} байт")
+        assert len(blob) * 3 < len(text.encode()), "Сжатие хуже ожидаемого"
+
+    assert blob_codec.encode(None) is None and blob_codec.decode(None) is None
+    assert blob_codec.encode("не JSON") == "не JSON"
+
+    try:
+        blob_codec.decode(b"\x7f{}")
+    except blob_codec.CodecError:
+        pass
+    else:
+        raise AssertionError("Неизвестная версия формата не отклонена")
+    print("   ✅ Кодек работает\n")
+
+async def test_migration():
+    print("2. Миграция старых строк...")
+    await init_db()
+    await close_pool()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="test_blob_"), "v5.db")
+    async with aiosqlite.connect(path) as db:
+        db.row_factory = aiosqlite.Row
+        await db.execute("""
+            CREATE TABLE shifts (
+                id INTEGER PRIMARY KEY, project_id INTEGER, status TEXT,
+                total_hours REAL, parsed_data TEXT
+            )
+        """)
+        await db.execute("CREATE TABLE earnings (id INTEGER PRIMARY KEY, shift_id INTEGER, calculation_details TEXT)")
+        await db.execute("CREATE TABLE professions (id INTEGER PRIMARY KEY, project_id INTEGER)")
+        await db.executemany(
+            "INSERT INTO shifts (id, parsed_data) VALUES (?, ?)",
+            [(i, json.dumps(PARSED, ensure_ascii=False, indent=2)) for i in range(1, 2501)]
+        )
+        await db.executemany(
+            "INSERT INTO earnings (shift_id, calculation_details) VALUES (?, ?)",
+            [(i, json.dumps(DETAILS, ensure_ascii=False)) for i in range(1, 2501)]
+        )
+        await db.execute("INSERT INTO shifts (id, parsed_data) VALUES (9999, NULL)")
+        await db.execute("PRAGMA user_version = 5")
+        await db.commit()
+
+        async with db.execute("SELECT SUM(length(CAST(parsed_data AS BLOB))) FROM shifts") as cursor:
+            before = (await cursor.fetchone())[0]
+
+        await migrate(db)
+        assert await get_schema_version(db) == SCHEMA_VERSION
+
+        async with db.execute("SELECT typeof(parsed_data) AS kind, COUNT(*) FROM shifts GROUP BY kind") as cursor:
+            kinds = dict(tuple(row) for row in await cursor.fetchall())
+        assert kinds == {"blob": 2500, "null": 1}, kinds
+
+        async with db.execute("SELECT SUM(length(parsed_data)) FROM shifts") as cursor:
+            after = (await cursor.fetchone())[0]
+
+        async with db.execute("SELECT calculation_details FROM earnings WHERE shift_id = 7") as cursor:
+            assert blob_codec.decode((await cursor.fetchone())[0]) == DETAILS
+
+    print(f"   parsed_data: {before} → {after} байт")
+    print("   ✅ Старые строки перекодированы\n")
+
+test_codec()
+asyncio.run(test_migration())
+print("✅ Все тесты пройдены!")
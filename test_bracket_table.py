@@ -0,0 +1,99 @@
+"""
+Тест скомпилированной таблицы прогрессивных ставок (BracketTable)
+и проверки шкалы в add_progressive_rate
+"""
+import asyncio
+import os
+import random
+import tempfile
+
+# Ступени ставок проверяются на временной БД, а не на data.db
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_brackets_"), "data.db")
+
+from database import (
+    init_db, close_pool, create_user, create_project, create_profession,
+    add_progressive_rate, get_progressive_rates
+)
+from profession_config import BracketTable, ProgressiveRate, validate_progressive_rates
+
+def walk_brackets(rates, tax_percentage, hours):
+    """Эталон: прежний расчёт - проход по ступеням (hours_to None = 999)"""
+    net = gross = 0
+    remaining = hours
+    for rate in rates:
+        if remaining <= 0:
+            break
+        hours_to = rate.hours_to if rate.hours_to else 999
+        hours_in_bracket = min(remaining, hours_to - rate.hours_from)
+        rate_gross = round(rate.rate / (1 - tax_percentage / 100))
+        bracket_gross = round(hours_in_bracket * rate_gross)
+        gross += bracket_gross
+        net += round(bracket_gross * (1 - tax_percentage / 100))
+        remaining -= hours_in_bracket
+    return net, gross
+
+async def test():
+    print("🧪 Тест таблицы прогрессивных ставок\n")
+
+    # 1. Таблица совпадает с проходом по ступеням
+    rnd = random.Random(19)
+    checked = 0
+    for _ in range(500):
+        tax = rnd.choice((0, 6, 13, 15))
+        rates, hours_from = [], 0
+        for order_num in range(1, rnd.randint(1, 6) + 1):
+            hours_to = hours_from + rnd.choice((0.5, 1, 2, 2.5, 4))
+            rates.append(ProgressiveRate(order_num, 1, hours_from, hours_to, rnd.randrange(300, 2000, 50), order_num))
+            hours_from = hours_to
+        if rnd.random() < 0.6:
+            rates[-1] = ProgressiveRate(rates[-1].id, 1, rates[-1].hours_from, None, rates[-1].rate, rates[-1].order_num)
+
+        table = BracketTable.compile(rates, tax)
+        for _ in range(50):
+            hours = rnd.choice((rnd.randint(1, 96) / 4, rnd.uniform(0.01, 30)))
+            assert table.pay(hours) == walk_brackets(rates, tax, hours), (rates, tax, hours)
+            checked += 1
+    print(f"1. BracketTable.pay совпадает с проходом по ступеням ({checked} случаев) ✅")
+
+    # 2. Проверка шкалы
+    validate_progressive_rates([(0, 2), (2, 4), (4, None)])
+    for brackets, reason in (
+        ([(0, 2), (3, None)], "Разрыв"),
+        ([(0, 2), (1, None)], "пересекается"),
+        ([(1, 2)], "Разрыв"),
+        ([(0, None), (2, 4)], "после открытой"),
+        ([(0, 2), (2, 2)], "Пустая"),
+    ):
+        try:
+            validate_progressive_rates(brackets)
+        except ValueError as e:
+            assert reason in str(e), (brackets, e)
+        else:
+            raise AssertionError(f"Шкала {brackets} прошла проверку")
+    print("2. Разрывы, пересечения и пустые ступени отклоняются ✅")
+
+    # 3. add_progressive_rate не записывает ступень с ошибкой
+    await init_db()
+    await create_user(777006, "bracket_test")
+    project_id = await create_project(777006, "Шкала", "")
+    profession_id = await create_profession(project_id, "Оператор", 10000, 13)
+
+    await add_progressive_rate(profession_id, 0, 2, 500, 1)
+    await add_progressive_rate(profession_id, 2, 4, 600, 2)
+    try:
+        await add_progressive_rate(profession_id, 5, None, 700, 3)
+    except ValueError as e:
+        print(f"3. add_progressive_rate: {e} ✅")
+    else:
+        raise AssertionError("Ступень с разрывом записана")
+
+    await add_progressive_rate(profession_id, 4, None, 700, 3)
+    rates = await get_progressive_rates(profession_id)
+    assert [(r["hours_from"], r["hours_to"]) for r in rates] == [(0, 2), (2, 4), (4, None)], rates
+    print("4. Корректная ступень записана ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
@@ -0,0 +1,83 @@
+"""
+Тест очереди записи (один писатель, групповой commit)
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+# Смены и проекты теста - во временной БД, а не в data.db
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_writer_"), "data.db")
+
+from database import (
+    init_db, close_pool, start_writer, stop_writer, get_writer_stats,
+    create_user, create_project, create_shift, confirm_shift, get_shift,
+    persist_confirmed_shift, get_project_totals, _write
+)
+
+async def test():
+    print("🧪 Тест очереди записи\n")
+
+    await init_db()
+    await start_writer()
+
+    user_id = 777001
+    await create_user(user_id, "writer_test")
+    project_id = await create_project(user_id, "Очередь записи", "")
+    print(f"1. Проект #{project_id} создан через очередь\n")
+
+    # Много одновременных записей - должны собраться в пачки
+    print("2. 50 одновременных смен...")
+    earnings = {
+        "base_pay_net": 1000, "base_pay_gross": 1150, "overtime_pay": 0,
+        "daily_allowance": 0, "services_pay": 0,
+        "total_net": 1000, "total_gross": 1150,
+        "calculation_details": json.dumps({})
+    }
+    shift_ids = await asyncio.gather(*[
+        persist_confirmed_shift(
+            project_id, f"2026-03-{1 + i % 28:02d}", "09:00", "21:00", 12,
+            "тест", "{}", earnings=earnings
+        )
+        for i in range(50)
+    ])
+    assert len(set(shift_ids)) == 50, "ID смен должны быть уникальны"
+
+    stats = get_writer_stats()
+    print(f"   Пачек: {stats['batches']}, средний размер: {stats['avg_batch_size']}")
+    print(f"   Пиковая глубина очереди: {stats['peak_queue_depth']}")
+    print(f"   Commit: avg {stats['commit_avg_ms']} мс, max {stats['commit_max_ms']} мс\n")
+    assert stats["avg_batch_size"] > 1, "Записи не группируются в один commit"
+
+    totals = await get_project_totals(project_id)
+    assert totals["total_shifts"] == 50, totals
+    assert totals["total_net"] == 50 * 1000, totals
+
+    # Ошибка одной операции не откатывает соседей по пачке
+    print("3. Ошибка одной операции в пачке...")
+
+    async def broken(db):
+        await db.execute("UPDATE shifts SET status = 'broken' WHERE project_id = ?", (project_id,))
+        raise RuntimeError("сбой операции")
+
+    draft_id = await create_shift(project_id, "2026-04-01", "09:00", "21:00", 12, "тест", "{}")
+    results = await asyncio.gather(
+        _write(broken),
+        confirm_shift(draft_id),
+        return_exceptions=True
+    )
+    assert isinstance(results[0], RuntimeError), results
+    assert results[1] is None, results
+
+    shift = await get_shift(draft_id)
+    assert shift["status"] == "confirmed", shift["status"]
+    shift = await get_shift(shift_ids[0])
+    assert shift["status"] == "calculated", "Изменения упавшей операции не откатились"
+    print("   ✅ Откатилась только упавшая операция\n")
+
+    await stop_writer()
+    await close_pool()
+
+    print("✅ Все тесты пройдены!")
+
+asyncio.run(test())
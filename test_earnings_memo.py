@@ -0,0 +1,95 @@
+"""
+Тест кэша результатов расчёта (earnings_memo)
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+# Профессия и настройки теста - во временной БД, а не в data.db
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_memo_"), "data.db")
+
+from database import (
+    init_db, close_pool, create_user, create_project, create_profession,
+    add_progressive_rate, add_meal_type, add_additional_service,
+    load_project_snapshot, get_profession_config
+)
+from earnings_core import ShiftInput, compute
+from earnings_memo import EarningsMemo, earnings_memo
+import blob_codec
+
+async def test():
+    print("🧪 Тест кэша результатов расчёта\n")
+
+    await init_db()
+
+    await create_user(777007, "memo_test")
+    project_id = await create_project(777007, "Кэш расчётов", "")
+    profession_id = await create_profession(
+        project_id=project_id,
+        position="Оператор",
+        base_rate_net=10000,
+        tax_percentage=13,
+        base_overtime_rate=500,
+        overtime_rounding=0.5
+    )
+    await add_progressive_rate(profession_id, 0, 2, 500, 1)
+    await add_progressive_rate(profession_id, 2, None, 700, 2)
+    await add_meal_type(profession_id, "текущий обед", 1.0, '[]')
+    await add_additional_service(profession_id, "ронин", 3000, 'on_mention', 15, '[]')
+
+    profession = await get_profession_config(project_id)
+    memo = EarningsMemo(max_size=16)
+
+    # 1. Одна форма смены - один расчёт
+    shift = ShiftInput(total_hours=(23 * 60 - 7 * 60) / 60, meals=("текущий обед",), services=("ронин",))
+    first = memo.compute(profession, shift)
+    for _ in range(9):
+        assert memo.compute(profession, shift) is first
+    assert json.dumps(first.to_dict()["details"]) == json.dumps(compute(profession, shift).details)
+    assert blob_codec.decode(first.earnings_row()["calculation_details"]) == first.details
+    stats = memo.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (9, 1, 0.9), stats
+    print(f"1. Повторная форма из кэша, детали закодированы один раз: {stats} ✅")
+
+    # 2. Другая форма - другой результат
+    other = memo.compute(profession, ShiftInput(total_hours=16, meals=("текущий обед",)))
+    assert other.total_net != first.total_net
+    assert memo.compute(profession, ShiftInput(total_hours=16, meals=("текущий обед",), is_expense_day=True)) is not other
+    print("2. Услуги и суточные входят в ключ ✅")
+
+    # 3. Длительность не в целых минутах - без кэша
+    odd = ShiftInput(total_hours=12.3456789)
+    assert memo.compute(profession, odd).total_net == compute(profession, odd).total_net
+    assert memo.stats()["bypassed"] == 1
+    print("3. Дробные минуты считаются без кэша ✅")
+
+    # 4. Перезагрузка тех же настроек - та же конфигурация в ключе
+    reloaded = await load_project_snapshot(project_id)
+    assert reloaded is not profession and reloaded == profession and hash(reloaded) == hash(profession)
+    assert memo.compute(reloaded, shift) is first
+    print("4. Перезагрузка тех же настроек - попадание в кэш ✅")
+
+    # 4a. Гипотетическая конфигурация с тем же id и config_version - свой ключ
+    raised = profession.with_overrides({"base_overtime_rate": profession.base_overtime_rate + 100})
+    assert raised.id == profession.id and raised.config_version == profession.config_version
+    assert raised != profession
+    assert memo.compute(raised, shift).total_net == compute(raised, shift).total_net != first.total_net
+    assert memo.compute(profession, shift) is first
+    print("4a. Сценарий with_overrides не берёт результаты настоящей конфигурации ✅")
+
+    # 5. Изменение настроек профессии - новая версия и сброс кэша
+    earnings_memo.compute(profession, shift)
+    assert earnings_memo.stats()["size"] >= 1
+    await add_meal_type(profession_id, "поздний обед", 1.0, '[]')
+    assert earnings_memo.stats()["size"] == 0, earnings_memo.stats()
+
+    changed = await get_profession_config(project_id)
+    assert changed != profession
+    print("5. Изменение настроек сбрасывает кэш ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
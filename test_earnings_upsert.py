@@ -0,0 +1,107 @@
+"""
+Тест одной строки earnings на смену
+Миграция 2 сжимает дубли старых БД, повторный расчёт - upsert с revision
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import aiosqlite
+
+# Тест считает строки earnings: работает на своей временной БД
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_upsert_"), "data.db")
+
+from database import (
+    init_db, close_pool, migrate, get_schema_version, SCHEMA_VERSION,
+    create_user, create_project, create_shift, save_shift_earnings,
+    get_shift_details, get_connection, get_project_totals
+)
+
+def earnings(total_net: int) -> dict:
+    return {
+        "base_pay_net": total_net, "base_pay_gross": total_net + 100,
+        "overtime_pay": 0, "daily_allowance": 0, "services_pay": 0,
+        "total_net": total_net, "total_gross": total_net + 100,
+        "calculation_details": {"total_net": total_net}
+    }
+
+async def test_migration():
+    print("1. Миграция дублей earnings...")
+
+    # БД версии 1: append-only earnings, у смены 1 три расчёта
+    path = os.path.join(tempfile.mkdtemp(prefix="test_upsert_v1_"), "v1.db")
+    async with aiosqlite.connect(path) as db:
+        db.row_factory = aiosqlite.Row
+        await db.execute("""
+            CREATE TABLE shifts (
+                id INTEGER PRIMARY KEY, project_id INTEGER, date DATE,
+                total_hours REAL, overtime_hours REAL DEFAULT 0,
+                status TEXT DEFAULT 'draft', original_message TEXT, parsed_data TEXT
+            )
+        """)
+        await db.execute("""
+            CREATE TABLE earnings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, shift_id INTEGER NOT NULL,
+                base_pay_net INTEGER, base_pay_gross INTEGER, overtime_pay INTEGER DEFAULT 0,
+                daily_allowance INTEGER DEFAULT 0, services_pay INTEGER DEFAULT 0,
+                total_net INTEGER, total_gross INTEGER, calculation_details TEXT,
+                calculated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        await db.execute("CREATE TABLE professions (id INTEGER PRIMARY KEY, project_id INTEGER)")
+        await db.executemany(
+            "INSERT INTO shifts (id, project_id, date, total_hours, status) VALUES (?, 1, '2026-02-01', 12, 'calculated')",
+            [(1,), (2,)]
+        )
+        await db.executemany(
+            "INSERT INTO earnings (shift_id, total_net, total_gross) VALUES (?, ?, ?)",
+            [(1, 100, 110), (2, 500, 550), (1, 200, 220), (1, 300, 330)]
+        )
+        await db.execute("PRAGMA user_version = 1")
+        await db.commit()
+
+        await migrate(db)
+        assert await get_schema_version(db) == SCHEMA_VERSION
+
+        async with db.execute("SELECT shift_id, total_net, revision FROM earnings ORDER BY shift_id") as cursor:
+            rows = [tuple(row) for row in await cursor.fetchall()]
+        assert rows == [(1, 300, 3), (2, 500, 1)], rows
+
+        async with db.execute("SELECT total_net, total_gross FROM project_period_totals") as cursor:
+            assert tuple(await cursor.fetchone()) == (800, 880)
+
+        try:
+            await db.execute("INSERT INTO earnings (shift_id, total_net) VALUES (1, 1)")
+        except sqlite3.IntegrityError:
+            pass
+        else:
+            raise AssertionError("Вторая строка earnings смены вставилась")
+
+    print("   ✅ Остался последний расчёт, revision = число расчётов\n")
+
+async def test_upsert():
+    print("2. Повторный расчёт смены...")
+    await init_db()
+
+    await create_user(777010, "upsert_test")
+    project_id = await create_project(777010, "Upsert", "")
+    shift_id = await create_shift(project_id, "2026-02-01", "07:00", "21:00", 14, "смена", "{}")
+
+    for revision, total_net in enumerate((1000, 1500, 1200), start=1):
+        await save_shift_earnings(shift_id, 2.0, earnings(total_net))
+        details = await get_shift_details(shift_id)
+        assert details["revision"] == revision and details["total_net"] == total_net, dict(details)
+
+    async with get_connection() as db:
+        async with db.execute("SELECT COUNT(*) FROM earnings WHERE shift_id = ?", (shift_id,)) as cursor:
+            assert (await cursor.fetchone())[0] == 1
+
+    totals = await get_project_totals(project_id)
+    assert totals["total_net"] == 1200, totals
+
+    await close_pool()
+    print("   ✅ Одна строка, revision растёт, итоги по последнему расчёту\n")
+
+asyncio.run(test_migration())
+asyncio.run(test_upsert())
+print("✅ Все тесты пройдены!")
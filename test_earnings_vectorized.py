@@ -0,0 +1,132 @@
+"""
+Тест векторизованного расчёта (earnings_vectorized)
+Случайные профессии и смены: суммы должны совпадать с earnings_core.compute
+"""
+import logging
+import random
+import earnings_vectorized
+from earnings_core import ShiftInput, compute
+from earnings_vectorized import HAS_NUMPY, COLUMNS, compute_many
+from profession_config import (
+    ProfessionConfig, ProgressiveRate, AdditionalService, MealType
+)
+
+PROFESSIONS = 300
+SHIFTS_PER_PROFESSION = 200
+
+MEAL_NAMES = ("текущий обед", "поздний обед", "ужин", "завтрак")
+SERVICE_NAMES = ("ронин", "кран", "генератор", "камера")
+
+def random_profession(rnd: random.Random) -> ProfessionConfig:
+    tax = rnd.choice((0, 6, 13, 15, 13.5))
+    base_rate_net = rnd.randrange(3000, 30000, 500)
+
+    rates = []
+    if rnd.random() < 0.8:
+        hours_from = 0
+        for order_num in range(1, rnd.randint(1, 5) + 1):
+            hours_to = hours_from + rnd.choice((1, 2, 2.5, 3, 4))
+            rates.append(ProgressiveRate(order_num, 1, hours_from, hours_to, rnd.randrange(300, 2000, 50), order_num))
+            hours_from = hours_to
+        # Последняя ступень открытая ("4+ч")
+        if rnd.random() < 0.7:
+            last = rates[-1]
+            rates[-1] = ProgressiveRate(last.id, 1, last.hours_from, None, last.rate, last.order_num)
+
+    return ProfessionConfig(
+        id=1,
+        project_id=1,
+        position="Оператор",
+        base_rate_net=base_rate_net,
+        base_rate_gross=round(base_rate_net / (1 - tax / 100)),
+        base_overtime_rate=rnd.randrange(300, 1500, 50),
+        daily_allowance=rnd.choice((0, 500, 1000)),
+        base_shift_hours=rnd.choice((8, 10, 11, 12)),
+        break_hours=12,
+        tax_percentage=tax,
+        payment_schedule="monthly",
+        conditions="",
+        overtime_rounding=rnd.choice((0, 0.25, 0.5, 1)),
+        overtime_threshold=rnd.choice((0, 0.25, 0.5)),
+        created_at="",
+        progressive_rates=tuple(rates),
+        services=tuple(
+            AdditionalService(i + 1, 1, name, rnd.randrange(500, 5000, 100), rnd.choice((13, 15)), 'on_mention', None, '[]')
+            for i, name in enumerate(SERVICE_NAMES) if rnd.random() < 0.6
+        ),
+        meal_types=tuple(
+            MealType(i + 1, 1, name, rnd.choice((0.5, 1.0, 1.5)), '[]')
+            for i, name in enumerate(MEAL_NAMES) if rnd.random() < 0.7
+        )
+    )
+
+def random_shift(rnd: random.Random) -> ShiftInput:
+    # Время смены с точностью до минуты, иногда - произвольная дробь
+    if rnd.random() < 0.8:
+        total_hours = rnd.randint(4 * 60, 24 * 60) / 60
+    else:
+        total_hours = rnd.uniform(4, 24)
+
+    return ShiftInput(
+        total_hours=total_hours,
+        meals=tuple(rnd.sample(MEAL_NAMES, rnd.randint(0, 2))),
+        services=tuple(rnd.sample(SERVICE_NAMES, rnd.randint(0, 2))),
+        is_expense_day=rnd.random() < 0.3
+    )
+
+def test():
+    print("🧪 Тест векторизованного расчёта\n")
+
+    if not HAS_NUMPY:
+        print("⚠️ NumPy не установлен - тест пропущен")
+        return
+
+    rnd = random.Random(20251231)
+    checked = 0
+
+    for _ in range(PROFESSIONS):
+        profession = random_profession(rnd)
+        shifts = [random_shift(rnd) for _ in range(SHIFTS_PER_PROFESSION)]
+
+        vectorized = compute_many(profession, shifts)
+
+        for i, shift in enumerate(shifts):
+            scalar = compute(profession, shift)
+            for column in COLUMNS:
+                expected = getattr(scalar, column)
+                actual = vectorized[column][i]
+                assert actual == expected, (
+                    f"{column}: {actual} != {expected}\n{profession}\n{shift}"
+                )
+            checked += 1
+
+    print(f"1. {checked} смен ({PROFESSIONS} профессий): суммы совпадают ✅")
+
+    # Пустой список
+    empty = compute_many(random_profession(rnd), [])
+    assert all(len(values) == 0 for values in empty.values())
+    print("2. Пустой список смен ✅")
+
+    # Без NumPy - расчёт по одной смене, предупреждение один раз
+    profession = random_profession(rnd)
+    shifts = [random_shift(rnd) for _ in range(20)]
+    vectorized = compute_many(profession, shifts)
+    numpy = earnings_vectorized.np
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = warnings.append
+    earnings_vectorized.logger.addHandler(handler)
+    earnings_vectorized.np = None
+    try:
+        for _ in range(3):
+            fallback = compute_many(profession, shifts)
+    finally:
+        earnings_vectorized.np = numpy
+        earnings_vectorized.logger.removeHandler(handler)
+    assert all(list(fallback[column]) == list(vectorized[column]) for column in COLUMNS)
+    assert len(warnings) == 1, warnings
+    print("3. Без NumPy: те же суммы, одно предупреждение в логе ✅")
+
+    print("\n✅ Все тесты пройдены!")
+
+test()
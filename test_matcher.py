@@ -0,0 +1,84 @@
+"""
+Тест сопоставления обедов и услуг (matcher.py)
+"""
+import random
+from matcher import Matcher, normalize, parse_keywords
+
+def naive_find(items, text):
+    """Эталон: вхождение названия/ключевого слова в текст или текста в название"""
+    text = normalize(text)
+    if not text:
+        return set()
+    found = set()
+    for index, (name, keywords) in enumerate(items):
+        name = normalize(name)
+        patterns = [name] + [normalize(k) for k in keywords]
+        if text in name or any(p and p in text for p in patterns):
+            found.add(index)
+    return found
+
+def test():
+    print("🧪 Тест сопоставления обедов и услуг\n")
+
+    # 1. Нормализация и ключевые слова
+    assert normalize("  Текущий,  ОБЕД! ") == "текущий обед"
+    assert normalize("Ёлка") == "елка"
+    assert parse_keywords('["обед", "текущий обед"]') == ["обед", "текущий обед"]
+    assert parse_keywords("ронин, стабилизатор") == ["ронин", "стабилизатор"]
+    assert parse_keywords("") == [] and parse_keywords(None) == []
+    print("1. Нормализация и разбор keywords ✅")
+
+    # 2. Обеды: первый подходящий по порядку настроек
+    meals = Matcher([
+        ("текущий обед", ["текущий"]),
+        ("поздний обед", ["поздний", "ужин"]),
+    ])
+    assert meals.first("Текущий обед") == 0
+    assert meals.first("поздний  обед") == 1
+    assert meals.first("обед") == 0            # упоминание - часть названия
+    assert meals.first("был ужин") == 1        # ключевое слово
+    assert meals.first("завтрак") is None
+    assert meals.first("") is None
+    print("2. Обеды: название, часть названия, ключевое слово ✅")
+
+    # 2a. Название важнее ключевого слова другого обеда
+    meals = Matcher([("текущий обед", ["обед", "текущий"]), ("поздний обед", ["поздний"])])
+    assert meals.first("поздний обед") == 1     # точное название
+    assert meals.first("был поздний обед") == 1 # название, а не ключевое "обед"
+    assert meals.first("текущий обед") == 0
+    assert meals.first("обед") == 0             # точное ключевое слово и часть обоих названий
+    assert meals.find("поздний обед") == {0, 1}
+    meals = Matcher([("обед", []), ("поздний обед", [])])
+    assert meals.first("поздний обед") == 1     # точное название
+    assert meals.first("очень поздний обед") == 1  # самое длинное название
+    print("2a. Точное и самое длинное название важнее ключевых слов ✅")
+
+    # 3. Услуги: вхождение в текст, регистр и пунктуация
+    services = Matcher([("ронин", []), ("кран", ["автокран"]), ("генератор", [])])
+    assert services.find("РОНИН!") == {0}
+    assert services.find("работал с ронином и автокраном") == {0, 1}
+    assert services.find("камера") == set()
+    print("3. Услуги ✅")
+
+    # 4. Совпадает с наивным перебором на случайных данных
+    rnd = random.Random(21)
+    alphabet = "абвг д,"
+    checked = 0
+    for _ in range(2000):
+        items = [
+            (
+                "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 8))),
+                ["".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 4)))] if rnd.random() < 0.5 else []
+            )
+            for _ in range(rnd.randint(1, 6))
+        ]
+        matcher = Matcher(items)
+        for _ in range(20):
+            text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 12)))
+            assert matcher.find(text) == naive_find(items, text), (items, text)
+            checked += 1
+    print(f"4. Совпадает с перебором ({checked} случаев) ✅")
+
+    print("\n✅ Все тесты пройдены!")
+
+test()
@@ -0,0 +1,97 @@
+"""
+Тест ночной сверки earnings (nightly_recompute.py)
+Расхождения находятся в нескольких процессах, смены не изменяются
+"""
+import asyncio
+import os
+import tempfile
+
+# Итоги сверки - по всем проектам БД: тест работает на своей временной БД
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_nightly_"), "data.db")
+
+from database import (
+    init_db, close_pool, add_additional_service, get_connection,
+    get_drift_report, get_project_totals, count_stale_shifts
+)
+from calculator import recalculate_project
+from nightly_recompute import make_shards, run_nightly
+from testkit import LUNCH, seed_project
+
+async def test():
+    print("🧪 Тест ночной сверки earnings\n")
+
+    # 1. Шарды по числу смен
+    shards = make_shards({1: 100, 2: 60, 3: 50, 4: 10}, 2)
+    assert sorted(map(sorted, shards)) == [[1, 4], [2, 3]], shards
+    assert make_shards({1: 5}, 4) == [[1]]
+    assert make_shards({}, 4) == []
+    print("1. Проекты делятся на шарды поровну по сменам ✅")
+
+    await init_db()
+
+    projects = []
+    for n in range(3):
+        project_id, profession_id, _, _ = await seed_project(
+            777008, f"Сверка {n}", 15,
+            lambda i: (f"2026-03-{i + 1:02d}", 11 + i % 6, [LUNCH] if i % 4 == 0 else [], i % 5 == 0),
+            base_rate_net=10000 + n * 1000,
+            overtime_rounding=0.5
+        )
+        await recalculate_project(project_id)
+        projects.append((project_id, profession_id))
+
+    # 2. Свежий расчёт совпадает с сохранённым
+    run = await run_nightly(workers=2)
+    assert run["shifts"] == 45 and run["projects"] == 3 and run["workers"] == 2, run
+    assert run["drifted"] == 0, run
+    print(f"2. {run['shifts']} смен в {run['workers']} процессах за {run['seconds']} с, расхождений нет ✅")
+
+    # 3. Изменение ставок без пересчёта и испорченная строка earnings
+    changed_project, changed_profession = projects[1]
+    async with get_connection() as db:
+        await db.execute("UPDATE progressive_rates SET rate = rate + 100 WHERE profession_id = ?", (changed_profession,))
+        async with db.execute("""
+            SELECT e.shift_id FROM earnings e JOIN shifts s ON s.id = e.shift_id
+            WHERE s.project_id = ? ORDER BY e.shift_id LIMIT 1
+        """, (projects[0][0],)) as cursor:
+            broken_shift = (await cursor.fetchone())[0]
+        await db.execute("UPDATE earnings SET total_net = total_net + 1 WHERE shift_id = ?", (broken_shift,))
+        async with db.execute("""
+            SELECT COUNT(*) FROM shifts WHERE project_id = ? AND total_hours > 12
+        """, (changed_project,)) as cursor:
+            with_overtime = (await cursor.fetchone())[0]
+        await db.commit()
+
+    totals_before = await get_project_totals(changed_project)
+    run = await run_nightly(workers=3)
+    report = await get_drift_report()
+
+    assert report["run_id"] == run["run_id"] and report["drifted"] == len(report["drift"]), report
+    drifted = {(row["project_id"], row["shift_id"]) for row in report["drift"]}
+    assert (projects[0][0], broken_shift) in drifted, drifted
+    assert sum(1 for project_id, _ in drifted if project_id == changed_project) == with_overtime, drifted
+    assert all(row["fresh_net"] > row["stored_net"] for row in report["drift"] if row["project_id"] == changed_project)
+    assert await get_project_totals(changed_project) == totals_before
+    print(f"3. Найдено расхождений: {run['drifted']} (ставки изменены, earnings испорчены) ✅")
+
+    # 4. Отчёты прогонов хранятся отдельно
+    first = await get_drift_report(report["run_id"])
+    assert first["drifted"] == run["drifted"]
+    print("4. Отчёт прогона читается по run_id ✅")
+
+    # 5. Смены, ждущие фонового пересчёта (config_version), не расхождение
+    stale_project, stale_profession = projects[2]
+    await add_additional_service(stale_profession, "ронин", 3000, keywords='[]')
+    assert await count_stale_shifts(stale_project) == 15
+    run = await run_nightly(workers=2)
+    report = await get_drift_report()
+    assert run["shifts"] == 30, run
+    assert all(row["project_id"] != stale_project for row in report["drift"]), report
+    print("5. Устаревшие смены (ждут пересчёта) пропускаются ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+if __name__ == "__main__":
+    asyncio.run(test())
@@ -0,0 +1,89 @@
+"""
+Тест агрегатов project_period_totals
+Инкрементальные итоги после вставки, изменения и удаления смен
+совпадают с полным пересчётом (rebuild_period_totals)
+"""
+import asyncio
+import os
+import tempfile
+
+# Сверка идёт по всем проектам БД: тест работает на своей временной БД
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_totals_"), "data.db")
+
+from database import (
+    init_db, close_pool, start_writer, stop_writer, get_writer_stats,
+    create_user, create_project, create_shift, confirm_shift,
+    persist_confirmed_shift, save_shift_earnings, save_recalculated_shifts,
+    delete_shift, get_connection, get_project_totals, rebuild_period_totals
+)
+
+def earnings(total_net: int) -> dict:
+    return {
+        "base_pay_net": total_net, "base_pay_gross": total_net + 100,
+        "overtime_pay": 0, "daily_allowance": 0, "services_pay": 0,
+        "total_net": total_net, "total_gross": total_net + 100,
+        "calculation_details": {}
+    }
+
+async def assert_consistent(step: str):
+    mismatches = await rebuild_period_totals()
+    assert not mismatches, (step, mismatches)
+
+async def test():
+    print("🧪 Тест агрегатов project_period_totals\n")
+
+    await init_db()
+    await start_writer()
+
+    await create_user(777011, "totals_test")
+    projects = [await create_project(777011, f"Итоги {n}", "") for n in range(2)]
+
+    # 1. Вставка: рассчитанные смены в разных месяцах и проектах
+    shift_ids = []
+    for i in range(12):
+        project_id = projects[i % 2]
+        shift_ids.append(await persist_confirmed_shift(
+            project_id, f"2026-0{1 + i % 3}-{i + 1:02d}", "07:00", "21:00", 12 + i % 4,
+            "смена", "{}", overtime_hours=i % 4, earnings=earnings(10000 + i * 100)
+        ))
+    draft = await create_shift(projects[0], "2026-01-20", "07:00", "21:00", 14, "черновик", "{}")
+    await confirm_shift(draft)
+    await assert_consistent("вставка")
+    totals = await get_project_totals(projects[0])
+    assert totals["total_shifts"] == 6, totals
+    print("1. Вставка смен ✅")
+
+    # 2. Изменение: расчёт смены, пересчёт со сменой сумм и переработки
+    await save_shift_earnings(draft, 2.0, earnings(15000))
+    await save_shift_earnings(shift_ids[0], 3.5, earnings(11111))
+    written = await save_recalculated_shifts([
+        (shift_id, 1.0, earnings(20000 + shift_id)) for shift_id in shift_ids[1:6]
+    ])
+    assert written == 5
+    await assert_consistent("изменение")
+    print("2. Изменение и пересчёт смен ✅")
+
+    # 3. Удаление: последняя смена месяца убирает и её итоги
+    for shift_id in shift_ids[::3] + [draft]:
+        await delete_shift(shift_id)
+    await assert_consistent("удаление")
+    print("3. Удаление смен ✅")
+
+    # 4. Починка (fix=True) идёт через очередь записи
+    async with get_connection() as db:
+        await db.execute("UPDATE project_period_totals SET total_net = total_net + 1")
+        await db.execute("DELETE FROM project_period_totals WHERE project_id = ?", (projects[1],))
+        await db.commit()
+    ops = get_writer_stats()["ops"]
+    mismatches = await rebuild_period_totals(fix=True)
+    assert mismatches, "Расхождения не найдены"
+    assert get_writer_stats()["ops"] == ops + 1, get_writer_stats()
+    await assert_consistent("починка")
+    print(f"4. Перестройка через очередь записи, расхождений было: {len(mismatches)} ✅")
+
+    await stop_writer()
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
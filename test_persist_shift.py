@@ -0,0 +1,102 @@
+"""
+Тест сохранения подтверждённой смены (persist_confirmed_shift)
+Смена, обеды, заработок и итоги пишутся одной транзакцией:
+ошибка записи откатывает всё, ошибка расчёта - только заработок
+"""
+import asyncio
+import json
+import os
+import tempfile
+
+# Тест считает строки таблиц: работает на своей временной БД
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_persist_"), "data.db")
+
+import calculator
+import database
+from database import init_db, close_pool, get_connection, get_project_totals, get_shift_details
+from calculator import save_confirmed_shift
+from testkit import seed_project
+
+PARSED = json.dumps({"meals": ["текущий обед"], "services": []}, ensure_ascii=False)
+
+async def rows(project_id) -> dict:
+    """Число строк смен проекта: {таблица: count}"""
+    result = {}
+    async with get_connection() as db:
+        for table, sql in (
+            ("shifts", "SELECT COUNT(*) FROM shifts WHERE project_id = ?"),
+            ("shift_meals", """
+                SELECT COUNT(*) FROM shift_meals sm
+                JOIN shifts s ON s.id = sm.shift_id WHERE s.project_id = ?
+            """),
+            ("earnings", """
+                SELECT COUNT(*) FROM earnings e
+                JOIN shifts s ON s.id = e.shift_id WHERE s.project_id = ?
+            """),
+        ):
+            async with db.execute(sql, (project_id,)) as cursor:
+                result[table] = (await cursor.fetchone())[0]
+    return result
+
+async def save(project_id):
+    return await save_confirmed_shift(project_id, "2026-05-01", "07:00", "23:00", 14, "смена", PARSED)
+
+async def test():
+    print("🧪 Тест сохранения подтверждённой смены\n")
+
+    await init_db()
+    project_id, _, meal_type_id, _ = await seed_project(777013, "Сохранение", 0, None)
+
+    # 1. Расчёт удался: смена, обед, заработок и итоги
+    shift_id, calculation, error = await save(project_id)
+    assert error is None and calculation["meal_type_ids"] == [meal_type_id], (error, calculation)
+    assert (await get_shift_details(shift_id))["status"] == "calculated"
+    assert await rows(project_id) == {"shifts": 1, "shift_meals": 1, "earnings": 1}
+    totals = await get_project_totals(project_id)
+    assert totals["total_shifts"] == 1 and totals["total_net"] == calculation["total_net"], totals
+    print("1. Смена рассчитана и сохранена ✅")
+
+    # 2. Ошибка записи после вставки смены, обедов и заработка - откат всего
+    apply_period_delta = database._apply_period_delta
+
+    async def failing_delta(db, before, after):
+        await apply_period_delta(db, before, after)
+        raise RuntimeError("сбой записи итогов")
+
+    database._apply_period_delta = failing_delta
+    try:
+        await save(project_id)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("Ошибка записи не дошла до вызывающего")
+    finally:
+        database._apply_period_delta = apply_period_delta
+
+    assert await rows(project_id) == {"shifts": 1, "shift_meals": 1, "earnings": 1}, await rows(project_id)
+    assert await get_project_totals(project_id) == totals
+    print("2. Ошибка записи: смена, обеды, заработок и итоги откатились ✅")
+
+    # 3. Ошибка расчёта: смена 'confirmed' без заработка, обеды привязаны
+    compute_earnings = calculator.compute_earnings
+
+    async def failing_compute(**kwargs):
+        raise RuntimeError("сбой расчёта")
+
+    calculator.compute_earnings = failing_compute
+    try:
+        shift_id, calculation, error = await save(project_id)
+    finally:
+        calculator.compute_earnings = compute_earnings
+
+    assert calculation is None and isinstance(error, RuntimeError), (calculation, error)
+    assert (await get_shift_details(shift_id))["status"] == "confirmed"
+    assert await rows(project_id) == {"shifts": 2, "shift_meals": 2, "earnings": 1}, await rows(project_id)
+    assert await get_project_totals(project_id) == totals
+    print("3. Ошибка расчёта: смена без заработка, обед привязан ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
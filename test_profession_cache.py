@@ -0,0 +1,66 @@
+"""
+Тест кэша конфигурации профессий (ProfessionConfigCache)
+Изменения настроек из другого процесса видны сразу, без ожидания TTL
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+
+# Другой процесс пишет прямо в файл БД: тест работает на своей временной БД
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_profession_cache_"), "data.db")
+
+from config import DATABASE_PATH
+from database import init_db, close_pool, create_user, create_project, get_profession_config
+from profession_config import profession_cache
+from testkit import seed_project
+
+def other_process(*statements):
+    """Запись отдельным соединением sqlite3, мимо кэша этого процесса"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    with conn:
+        for sql, params in statements:
+            conn.execute(sql, params)
+    conn.close()
+
+async def test():
+    print("🧪 Тест кэша конфигурации профессий\n")
+
+    await init_db()
+    project_id, profession_id, _, _ = await seed_project(777014, "Кэш профессии", 0, None)
+
+    # 1. Повторное чтение - из кэша
+    config = await get_profession_config(project_id)
+    hits = profession_cache.hits
+    assert await get_profession_config(project_id) is config
+    assert profession_cache.hits == hits + 1
+    print("1. Повторное чтение - попадание в кэш ✅")
+
+    # 2. Другой процесс добавил услугу и увеличил config_version
+    other_process(
+        ("INSERT INTO additional_services (profession_id, name, cost) VALUES (?, 'ронин', 3000)", (profession_id,)),
+        ("UPDATE professions SET config_version = config_version + 1 WHERE id = ?", (profession_id,)),
+    )
+    changed = await get_profession_config(project_id)
+    assert changed.config_version == config.config_version + 1, changed.config_version
+    assert [service.name for service in changed.services] == ["ронин"], changed.services
+    assert await get_profession_config(project_id) is changed
+    print("2. Изменение настроек другим процессом видно сразу ✅")
+
+    # 3. Проект без профессии (None в кэше), профессию создал другой процесс
+    await create_user(777015, "cache_test")
+    empty_project = await create_project(777015, "Без профессии", "")
+    assert await get_profession_config(empty_project) is None
+    other_process((
+        "INSERT INTO professions (project_id, position, base_rate_net, base_rate_gross, tax_percentage) "
+        "VALUES (?, 'Оператор', 10000, 11494, 13)", (empty_project,)
+    ),)
+    created = await get_profession_config(empty_project)
+    assert created is not None and created.project_id == empty_project, created
+    print("3. Профессия, созданная другим процессом, видна сразу ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
@@ -0,0 +1,140 @@
+"""
+Тест планов запросов (EXPLAIN QUERY PLAN)
+Падает, если запрос из api_server.py или calculator.py сканирует таблицу целиком
+(или, для постраничной выдачи, сортирует результат вместо чтения по индексу)
+
+Запросы берутся из констант database.py - те же строки, что выполняются в коде
+"""
+import asyncio
+import os
+import tempfile
+
+# Не трогать общую data.db, если database импортируется здесь впервые
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_plans_"), "data.db")
+
+import aiosqlite
+
+from database import (
+    create_schema, get_schema_version, SCHEMA_VERSION,
+    encode_shift_cursor, _shifts_page_conditions, _recalc_conditions,
+    USER_SQL, USER_PROJECTS_SQL, ACTIVE_PROJECT_SQL,
+    PROFESSION_SQL, PROGRESSIVE_RATES_SQL, ADDITIONAL_SERVICES_SQL, MEAL_TYPES_SQL,
+    PROJECT_SNAPSHOT_SQL, PROFESSION_VERSION_SQL,
+    SHIFT_MEALS_SQL, SHIFT_SQL, SHIFT_DETAILS_SQL,
+    UPSERT_EARNINGS_SQL, PERIOD_CONTRIBUTION_SQL,
+    COUNT_RECALC_SHIFTS_SQL, RECALC_SHIFTS_SQL,
+    GET_STALE_SHIFTS_SQL, COUNT_STALE_SHIFTS_SQL, COUNT_PROJECT_STALE_SHIFTS_SQL,
+    PROJECT_TOTALS_SQL, SHIFTS_PAGE_SQL, SEARCH_SHIFTS_SQL,
+    EXPORT_PROJECT_SQL, EXPORT_SHIFTS_SQL
+)
+
+def where(conditions_and_params) -> str:
+    conditions, _ = conditions_and_params
+    return " AND ".join(conditions)
+
+CURSOR = encode_shift_cursor("2026-01-31", 1)
+RECALC_WHERE = where(_recalc_conditions(1, "2026-01-01", "2026-01-31"))
+
+# Запросы горячих путей: (откуда, SQL)
+QUERIES = [
+    # database.py (вызывается из api_server.py и calculator.py)
+    ("get_user", USER_SQL),
+    ("get_user_projects", USER_PROJECTS_SQL),
+    ("get_active_project", ACTIVE_PROJECT_SQL),
+    ("get_profession_by_project", PROFESSION_SQL),
+    ("get_progressive_rates", PROGRESSIVE_RATES_SQL),
+    ("get_additional_services", ADDITIONAL_SERVICES_SQL),
+    ("get_meal_types", MEAL_TYPES_SQL),
+    ("load_project_snapshot", PROJECT_SNAPSHOT_SQL),
+    ("get_profession_config: версия", PROFESSION_VERSION_SQL),
+    ("get_shift_meals", SHIFT_MEALS_SQL),
+    ("get_shift", SHIFT_SQL),
+    ("get_shift_details", SHIFT_DETAILS_SQL),
+
+    # Запись расчёта смены и вклад в project_period_totals
+    ("_upsert_earnings", UPSERT_EARNINGS_SQL),
+    ("_period_contribution", PERIOD_CONTRIBUTION_SQL.format(ids="?")),
+    ("_period_contributions", PERIOD_CONTRIBUTION_SQL.format(ids="?, ?, ?")),
+
+    # calculator.py: массовый пересчёт (продолжение - по (date, id), как в iter_recalc_shifts)
+    ("count_recalc_shifts", COUNT_RECALC_SHIFTS_SQL.format(where=RECALC_WHERE)),
+    ("iter_recalc_shifts", RECALC_SHIFTS_SQL.format(where=f"{RECALC_WHERE} AND (s.date, s.id) > (?, ?)")),
+
+    # calculator.py: фоновый пересчёт устаревших смен, api_server.py: статистика
+    ("get_stale_shifts", GET_STALE_SHIFTS_SQL),
+    ("count_stale_shifts", COUNT_STALE_SHIFTS_SQL),
+    ("count_stale_shifts: проект", COUNT_PROJECT_STALE_SHIFTS_SQL),
+
+    # api_server.py: статистика
+    ("get_project_totals", PROJECT_TOTALS_SQL),
+    ("get_shifts_page: первая страница", SHIFTS_PAGE_SQL.format(
+        where=where(_shifts_page_conditions(1, status="calculated"))
+    )),
+    ("get_shifts_page: по курсору с периодом", SHIFTS_PAGE_SQL.format(
+        where=where(_shifts_page_conditions(1, CURSOR, "calculated", "2026-01-01"))
+    )),
+    ("get_user_shifts", SHIFTS_PAGE_SQL.format(where=where(_shifts_page_conditions(1, CURSOR)))),
+
+    # api_server.py: поиск (FTS5)
+    ("search_shifts", SEARCH_SHIFTS_SQL),
+
+    # api_server.py: экспорт в CSV
+    ("export: проект", EXPORT_PROJECT_SQL),
+    ("export: смены", EXPORT_SHIFTS_SQL),
+]
+
+# Таблица, которую читать целиком можно: в ней только проекты с
+# устаревшими расчётами, смены этих проектов читаются по индексу
+SCAN_ALLOWED = {"SCAN stale_projects"}
+
+# Keyset-пагинация: порядок выдачи должен браться из индекса, без сортировки
+NO_SORT = {
+    "get_shifts_page: первая страница",
+    "get_shifts_page: по курсору с периодом",
+    "get_user_shifts",
+    "iter_recalc_shifts",
+}
+
+async def explain(db, sql: str):
+    """Строки плана запроса (detail)"""
+    params = (1,) * sql.count("?")
+    async with db.execute(f"EXPLAIN QUERY PLAN {sql}", params) as cursor:
+        return [row["detail"] for row in await cursor.fetchall()]
+
+async def test():
+    print("🧪 Тест планов запросов\n")
+
+    # Своя пустая БД и своё соединение, а не DATABASE_PATH: при запуске
+    # вместе с другими тестами database уже импортирован с чужим путём,
+    # а в общей БД после PRAGMA optimize (close_pool) есть sqlite_stat1
+    path = os.path.join(tempfile.mkdtemp(prefix="test_plans_schema_"), "plans.db")
+    async with aiosqlite.connect(path) as db:
+        db.row_factory = aiosqlite.Row
+        await create_schema(db)
+
+        version = await get_schema_version(db)
+        print(f"Версия схемы: {version}")
+        assert version == SCHEMA_VERSION, f"Схема не мигрирована: {version} != {SCHEMA_VERSION}"
+
+        failed = []
+        for name, sql in QUERIES:
+            plan = await explain(db, sql)
+            # Поиск по индексу FTS5 выглядит как SCAN виртуальной таблицы
+            scans = [
+                step for step in plan
+                if step.startswith("SCAN ") and step not in SCAN_ALLOWED
+                and not ("VIRTUAL TABLE INDEX" in step and ":M" in step)
+            ]
+            if name in NO_SORT:
+                scans += [step for step in plan if "TEMP B-TREE" in step]
+
+            if scans:
+                print(f"   ❌ {name}: {'; '.join(scans)}")
+                failed.append(name)
+            else:
+                print(f"   ✅ {name}: {'; '.join(plan) or '-'}")
+
+    assert not failed, f"Полное сканирование таблиц в запросах: {', '.join(failed)}"
+    print("\n✅ Все запросы используют индексы!")
+
+asyncio.run(test())
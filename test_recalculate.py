@@ -0,0 +1,71 @@
+"""
+Тест массового пересчёта проекта (recalculate_project)
+Результат должен совпадать с пересчётом смен по одной
+"""
+import asyncio
+import os
+import tempfile
+
+# Смены проекта пересчитываются на временной БД, а не в data.db
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_recalc_"), "data.db")
+
+from database import init_db, close_pool, get_connection, rebuild_period_totals
+from calculator import calculate_shift_earnings, recalculate_project
+from profession_config import profession_cache
+from testkit import LUNCH, earnings_of, seed_project
+
+async def test():
+    print("🧪 Тест массового пересчёта проекта\n")
+
+    await init_db()
+
+    # Смены в трёх месяцах, часть с обедами
+    project_id, profession_id, _, shift_ids = await seed_project(
+        777005, "Пересчёт", 30,
+        lambda i: (f"2026-0{1 + i % 3}-{1 + i // 3:02d}", 12 + i % 7, [LUNCH] if i % 4 == 0 else [], i % 5 == 0),
+        overtime_rounding=0.5,
+        overtime_threshold=0.25
+    )
+
+    # Половина смен уже рассчитана по старым ставкам
+    for shift_id in shift_ids[::2]:
+        await calculate_shift_earnings(shift_id, project_id)
+
+    # Новые ставки
+    async with get_connection() as db:
+        await db.execute("UPDATE progressive_rates SET rate = rate + 100 WHERE profession_id = ?", (profession_id,))
+        await db.commit()
+    profession_cache.invalidate(project_id)
+
+    calls = []
+
+    async def progress(done, total):
+        calls.append((done, total))
+
+    result = await recalculate_project(project_id, progress=progress)
+    bulk = await earnings_of(shift_ids)
+    print(f"1. Пересчитано смен: {result['shifts']} за {result['seconds']} с ✅")
+    assert result["shifts"] == len(shift_ids), result
+    assert calls and calls[-1] == (len(shift_ids), len(shift_ids)), calls
+
+    # Эталон - пересчёт по одной смене
+    for shift_id in shift_ids:
+        await calculate_shift_earnings(shift_id, project_id)
+    single = await earnings_of(shift_ids)
+    assert bulk == single, "Массовый пересчёт расходится с пересчётом по одной смене"
+    print("2. Совпадает с calculate_shift_earnings ✅")
+
+    mismatches = await rebuild_period_totals()
+    assert not mismatches, mismatches
+    print("3. project_period_totals согласована ✅")
+
+    # Период: только январь
+    result = await recalculate_project(project_id, "2026-01-01", "2026-01-31")
+    assert result["shifts"] == 10, result
+    print("4. Пересчёт за период ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
@@ -0,0 +1,65 @@
+"""
+Тест отчётных соединений (только чтение)
+"""
+import asyncio
+import sqlite3
+import database
+from database import (
+    init_db, close_pool, init_reporting_pool, close_reporting_pool,
+    get_reporting_connection, create_user, create_project, create_shift,
+    get_project_export, get_shifts_page
+)
+
+async def test():
+    print("🧪 Тест отчётных соединений\n")
+
+    await init_db()
+    await init_reporting_pool()
+
+    await create_user(777002, "reporting_test")
+    project_id = await create_project(777002, "Отчёты", "")
+    await create_shift(project_id, "2026-05-01", "09:00", "21:00", 12, "тест", "{}")
+
+    # Чтение работает
+    name, shifts = await get_project_export(project_id)
+    assert name == "Отчёты", name
+    page, _ = await get_shifts_page(project_id, status=None, reporting=True)
+    assert len(page) == 1, page
+    print("1. Чтение через пул отчётов ✅")
+
+    # Запись запрещена
+    async with get_reporting_connection() as db:
+        async with db.execute("PRAGMA query_only") as cursor:
+            assert (await cursor.fetchone())[0] == 1, "query_only не включён"
+        try:
+            await db.execute("DELETE FROM shifts WHERE project_id = ?", (project_id,))
+        except sqlite3.OperationalError as e:
+            print(f"2. Запись отклонена: {e} ✅")
+        else:
+            raise AssertionError("Отчётное соединение позволило запись")
+
+    _, shifts = await get_project_export(project_id)
+    page, _ = await get_shifts_page(project_id, status=None)
+    assert len(page) == 1, "Смена удалена через отчётное соединение"
+
+    await close_reporting_pool()
+
+    # Отчётная БД недоступна - отчёты через основной пул
+    replica = database.REPORTING_DATABASE_PATH
+    database.REPORTING_DATABASE_PATH = "/nonexistent/replica.db"
+    try:
+        pool = await init_reporting_pool()
+        assert pool is database._pool, "Нет запасного варианта через основной пул"
+        page, _ = await get_shifts_page(project_id, status=None, reporting=True)
+        assert len(page) == 1, page
+        await close_reporting_pool()
+        assert database._pool is pool and pool.loop is not None, "Основной пул закрыт вместе с отчётным"
+    finally:
+        database.REPORTING_DATABASE_PATH = replica
+    print("3. Отчётная БД недоступна: чтение через основной пул ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
@@ -0,0 +1,92 @@
+"""
+Тест симуляции ставок (simulate_project)
+Сценарий должен давать те же суммы, что реальный пересчёт с новыми ставками,
+и ничего не записывать в БД
+"""
+import asyncio
+import os
+import tempfile
+
+# Проверка "ничего не записано" - на своей временной БД, а не на data.db
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_simulation_"), "data.db")
+
+from database import init_db, close_pool, get_connection, get_project_totals
+from calculator import recalculate_project, simulate_project
+from profession_config import profession_cache
+from testkit import LUNCH, seed_project
+
+async def test():
+    print("🧪 Тест симуляции ставок\n")
+
+    await init_db()
+
+    project_id, profession_id, _, _ = await seed_project(
+        777007, "Симуляция", 24,
+        lambda i: (f"2026-0{1 + i % 2}-{1 + i // 2:02d}", 10 + i % 8, [LUNCH] if i % 3 == 0 else [], i % 5 == 0),
+        daily_allowance=1000,
+        overtime_rounding=0.5
+    )
+
+    current = await recalculate_project(project_id)
+    totals_before = await get_project_totals(project_id)
+
+    # 1. Несколько сценариев сразу, в БД ничего не меняется
+    result = await simulate_project(project_id, [
+        {"name": "Без изменений", "overrides": {}},
+        {"name": "Ставки +100", "overrides": {"progressive_rates": [
+            {"hours_from": 0, "hours_to": 2, "rate": 600},
+            {"hours_from": 2, "hours_to": None, "rate": 800}
+        ]}},
+        {"name": "Смена 10ч", "overrides": {"base_shift_hours": 10, "base_rate_net": 12000}}
+    ])
+    same, raised, shorter = result["scenarios"]
+
+    assert result["shifts"] == 24, result
+    assert result["baseline"]["total_net"] == current["total_net"], (result["baseline"], current)
+    assert same["delta_net"] == 0 and same["changed_shifts"] == 0 and same["diff"] == [], same
+    assert raised["delta_net"] > 0 and shorter["delta_net"] > 0, result
+    assert sum(d["delta_net"] for d in raised["diff"]) == raised["delta_net"], raised
+    assert await get_project_totals(project_id) == totals_before
+    print(f"1. 3 сценария по {result['shifts']} сменам за {result['seconds']} с, БД не изменена ✅")
+
+    # 2. Сценарий совпадает с реальным пересчётом после изменения ставок
+    async with get_connection() as db:
+        await db.execute("UPDATE progressive_rates SET rate = rate + 100 WHERE profession_id = ?", (profession_id,))
+        await db.commit()
+    profession_cache.invalidate(project_id)
+
+    recalculated = await recalculate_project(project_id)
+    assert recalculated["total_net"] == raised["total_net"], (recalculated, raised)
+    assert recalculated["total_gross"] == raised["total_gross"], (recalculated, raised)
+    print(f"2. Ставки +100: {raised['delta_net']:+} ₽ нетто, совпадает с пересчётом ✅")
+
+    # 3. Ошибки в сценарии
+    for overrides, reason in (
+        ({"position": "Режиссёр"}, "Нельзя изменить"),
+        ({"progressive_rates": [{"hours_from": 1, "hours_to": None, "rate": 500}]}, "Разрыв"),
+        ({"progressive_rates": [{"hours_from": 0}]}, "нужны"),
+        ({"progressive_rates": [{"hours_from": 0, "hours_to": None, "rate": "abc"}]}, "rate"),
+        ({"base_rate_net": "abc"}, "base_rate_net"),
+        ({"daily_allowance": [1000]}, "daily_allowance"),
+        ({"overtime_rounding": True}, "overtime_rounding"),
+        ({"base_overtime_rate": -500}, "неотрицательное"),
+        (["base_rate_net"], "объект"),
+    ):
+        try:
+            await simulate_project(project_id, [{"name": "Ошибка", "overrides": overrides}])
+        except ValueError as e:
+            assert reason in str(e), (overrides, e)
+        else:
+            raise AssertionError(f"Сценарий {overrides} прошёл проверку")
+    print("3. Некорректные сценарии отклоняются ✅")
+
+    # 4. Период
+    result = await simulate_project(project_id, [{"overrides": {"daily_allowance": 2000}}], "2026-01-01", "2026-01-31")
+    assert result["shifts"] == 12 and result["scenarios"][0]["name"] == "Сценарий 1", result
+    print("4. Симуляция за период ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
@@ -0,0 +1,110 @@
+"""
+Тест устаревших расчётов (config_version) и фонового пересчёта
+После изменения настроек устаревают только затронутые смены,
+recompute_stale даёт тот же результат, что расчёт смены заново
+"""
+import asyncio
+import os
+import tempfile
+
+# recompute_stale берёт устаревшие смены всех проектов: тест работает на своей временной БД
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_stale_"), "data.db")
+
+from database import (
+    init_db, close_pool, add_progressive_rate, add_meal_type, add_additional_service,
+    get_connection, count_stale_shifts, rebuild_period_totals
+)
+from calculator import calculate_shift_earnings, recalculate_project, recompute_stale
+from testkit import earnings_of, seed_project
+
+async def stale_ids(project_id):
+    async with get_connection() as db:
+        async with db.execute("""
+            SELECT s.id FROM shifts s
+            JOIN earnings e ON e.shift_id = s.id
+            JOIN professions p ON p.project_id = s.project_id
+            WHERE s.project_id = ? AND e.calculated_with_version < p.config_version
+        """, (project_id,)) as cursor:
+            return {row[0] for row in await cursor.fetchall()}
+
+async def test():
+    print("🧪 Тест фонового пересчёта устаревших смен\n")
+
+    await init_db()
+
+    project_id, profession_id, _, shift_ids = await seed_project(
+        777009, "Версии", 20,
+        lambda i: (
+            f"2026-04-{i + 1:02d}", 11 + i % 8, ["поздний обед"] if i % 3 == 0 else [], i % 4 == 0,
+            ["ронин"] if i % 7 == 0 else []
+        ),
+        rates=((0, 2, 500), (2, 4, 600)),
+        overtime_rounding=0.5
+    )
+
+    await recalculate_project(project_id)
+    assert await count_stale_shifts(project_id) == 0
+    print("1. После расчёта устаревших смен нет ✅")
+
+    # 2. Новая ступень: устаревают только смены с переработкой дальше 4ч
+    await add_progressive_rate(profession_id, 4, None, 800, 3)
+    async with get_connection() as db:
+        async with db.execute("""
+            SELECT id FROM shifts WHERE project_id = ? AND overtime_hours > 4
+        """, (project_id,)) as cursor:
+            expected = {row[0] for row in await cursor.fetchall()}
+    assert expected and await stale_ids(project_id) == expected, (await stale_ids(project_id), expected)
+    print(f"2. Новая ступень ставок: устарело {len(expected)} из {len(shift_ids)} смен ✅")
+
+    # 3. Новый обед: устаревают смены без привязанных обедов
+    await add_meal_type(profession_id, "поздний обед", 1.0, '[]')
+    async with get_connection() as db:
+        async with db.execute("""
+            SELECT id FROM shifts s WHERE project_id = ?
+              AND NOT EXISTS (SELECT 1 FROM shift_meals sm WHERE sm.shift_id = s.id)
+        """, (project_id,)) as cursor:
+            expected |= {row[0] for row in await cursor.fetchall()}
+    assert await stale_ids(project_id) == expected
+    print(f"3. Новый тип обеда: устарело {len(expected)} смен ✅")
+
+    # 4. Новая услуга: устаревают все смены
+    await add_additional_service(profession_id, "ронин", 3000, keywords='[]')
+    assert await count_stale_shifts(project_id) == len(shift_ids)
+    assert await count_stale_shifts() >= len(shift_ids)
+    print("4. Новая услуга: устарели все смены ✅")
+
+    # 5. Фоновый пересчёт порциями
+    batches = 0
+    while await recompute_stale(limit=6):
+        batches += 1
+    assert batches == 4, batches
+    assert await count_stale_shifts(project_id) == 0
+    background = await earnings_of(shift_ids)
+
+    for shift_id in shift_ids:
+        await calculate_shift_earnings(shift_id, project_id)
+    assert background == await earnings_of(shift_ids), "Фоновый пересчёт расходится с расчётом смены"
+    assert not await rebuild_period_totals()
+    print(f"5. Пересчитано порциями ({batches}), совпадает с calculate_shift_earnings ✅")
+
+    # 6. Настройки изменены другим процессом: в кэше старая версия
+    async with get_connection() as db:
+        await db.execute("UPDATE progressive_rates SET rate = rate + 100 WHERE profession_id = ?", (profession_id,))
+        await db.execute("UPDATE professions SET config_version = config_version + 1 WHERE id = ?", (profession_id,))
+        await db.commit()
+    assert await count_stale_shifts(project_id) == len(shift_ids)
+    while await recompute_stale():
+        pass
+    assert await count_stale_shifts(project_id) == 0
+    background = await earnings_of(shift_ids)
+
+    for shift_id in shift_ids:
+        await calculate_shift_earnings(shift_id, project_id)
+    assert background == await earnings_of(shift_ids)
+    print("6. Кэш с устаревшей версией настроек перечитывается ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
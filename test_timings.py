@@ -0,0 +1,81 @@
+"""
+Тест замеров времени (timings.py) и их расстановки в calculate_shift_earnings
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+# Смены для замеров - во временной БД, а не в data.db
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="test_timings_"), "data.db")
+
+from database import init_db, close_pool
+from calculator import calculate_shift_earnings
+from testkit import seed_project
+from timings import BOUNDS, Histogram, TimingRegistry, timed, timings
+
+async def test():
+    print("🧪 Тест замеров времени\n")
+
+    # 1. Гистограмма: квантили - граница корзины, не больше максимума
+    histogram = Histogram("test")
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+    stats = histogram.to_dict()
+    assert stats["count"] == 100 and stats["max_ms"] == 100.0 and stats["min_ms"] == 1.0, stats
+    assert 50.0 <= stats["p50_ms"] <= 100.0 and stats["p99_ms"] == 100.0, stats
+    assert abs(stats["avg_ms"] - 50.5) < 1e-6, stats
+    histogram.record(BOUNDS[-1] * 10)
+    assert histogram.percentile(1.0) == BOUNDS[-1] * 10
+    assert Histogram("empty").to_dict()["p95_ms"] == 0.0
+    print("1. Гистограмма и квантили ✅")
+
+    # 2. Выключенный реестр ничего не пишет
+    registry = TimingRegistry(enabled=False)
+    registry.record("x", 1.0)
+    assert registry.snapshot() == {} and "выключены" in registry.dump()
+    print("2. TIMINGS_ENABLED=0 ✅")
+
+    # 3. Накладные расходы timed
+    timings.reset()
+    iterations = 100_000
+    started = time.perf_counter()
+    for _ in range(iterations):
+        with timed("test.overhead"):
+            pass
+    overhead = (time.perf_counter() - started) / iterations * 1e6
+    assert timings.snapshot()["test.overhead"]["count"] == iterations
+    assert overhead < 10, overhead
+    print(f"3. Накладные расходы: {overhead:.2f} мкс на замер ✅")
+
+    # 4. Фазы calculate_shift_earnings
+    await init_db()
+    project_id, _, _, shift_ids = await seed_project(
+        777010, "Замеры", 10,
+        lambda i: (f"2026-05-{i + 1:02d}", 12 + i % 3, [], False),
+        rates=((0, None, 500),),
+        meal=None
+    )
+
+    timings.reset()
+    for shift_id in shift_ids:
+        await calculate_shift_earnings(shift_id, project_id)
+
+    snapshot = timings.snapshot()
+    for name in (
+        "calc.calculate_shift_earnings", "calc.load_shift", "calc.load_meals",
+        "calc.load_profession", "calc.compute", "calc.save",
+        "db.get_shift", "db.get_shift_meals", "db.load_project_snapshot",
+        "db.save_shift_earnings", "db.upsert_earnings", "core.compute", "core.encode_details"
+    ):
+        assert name in snapshot, (name, sorted(snapshot))
+    assert snapshot["calc.calculate_shift_earnings"]["count"] == 10
+    assert snapshot["db.load_project_snapshot"]["count"] == 1   # дальше - из кэша
+    print(timings.dump())
+    print("4. Фазы расчёта смены замерены ✅")
+
+    await close_pool()
+
+    print("\n✅ Все тесты пройдены!")
+
+asyncio.run(test())
@@ -0,0 +1,67 @@
+"""
+Общие заготовки для тестов расчёта смен (не тест: запускать не нужно)
+
+    project_id, profession_id, meal_type_id, shift_ids = await seed_project(
+        777005, "Пересчёт", 30,
+        lambda i: (f"2026-01-{i + 1:02d}", 12 + i % 7, ["текущий обед"], i % 5 == 0)
+    )
+"""
+import json
+from database import (
+    create_user, create_project, create_profession, add_progressive_rate,
+    add_meal_type, create_shift, confirm_shift, add_shift_meal, get_shift_details
+)
+
+# Ступени прогрессивных ставок по умолчанию: (hours_from, hours_to, rate)
+RATES = ((0, 2, 500), (2, None, 700))
+LUNCH = "текущий обед"
+
+
+async def seed_project(user_id: int, name: str, count: int, shift, rates=RATES, meal=LUNCH, **profession):
+    """
+    Пользователь, проект, профессия "Оператор" и count подтверждённых смен
+
+    Args:
+        shift: i -> (date, total_hours, meals, with_meal) - дата и часы смены,
+               обеды в тексте (parsed_data) и привязать ли обед meal;
+               пятый элемент, если есть, - услуги в тексте
+        rates: Ступени (hours_from, hours_to, rate) по порядку
+        meal: Тип обеда профессии (None - без обедов)
+        profession: Поля create_profession; по умолчанию base_rate_net=10000,
+                    tax_percentage=13, base_overtime_rate=500
+
+    Returns:
+        (project_id, profession_id, meal_type_id, [shift_id])
+    """
+    profession = {"base_rate_net": 10000, "tax_percentage": 13, "base_overtime_rate": 500, **profession}
+
+    await create_user(user_id, f"test_{user_id}")
+    project_id = await create_project(user_id, name, "")
+    profession_id = await create_profession(project_id=project_id, position="Оператор", **profession)
+
+    for order_num, (hours_from, hours_to, rate) in enumerate(rates, start=1):
+        await add_progressive_rate(profession_id, hours_from, hours_to, rate, order_num)
+    meal_type_id = await add_meal_type(profession_id, meal, 1.0, '[]') if meal else None
+
+    shift_ids = []
+    for i in range(count):
+        date, total_hours, meals, with_meal, *services = shift(i)
+        parsed = json.dumps({"meals": list(meals), "services": list(services[0]) if services else []})
+        shift_id = await create_shift(project_id, date, "07:00", "23:00", total_hours, "смена", parsed)
+        await confirm_shift(shift_id)
+        if with_meal:
+            await add_shift_meal(shift_id, meal_type_id)
+        shift_ids.append(shift_id)
+
+    return project_id, profession_id, meal_type_id, shift_ids
+
+
+async def earnings_of(shift_ids) -> dict:
+    """{shift_id: (overtime_hours, total_net, total_gross, status)} - для сравнения расчётов"""
+    result = {}
+    for shift_id in shift_ids:
+        details = await get_shift_details(shift_id)
+        result[shift_id] = (
+            details["overtime_hours"], details["total_net"], details["total_gross"], details["status"]
+        )
+    return result
@@ -0,0 +1,156 @@
+"""
+Замеры времени горячего пути (гистограммы в памяти процесса)
+
+    with timed("db.get_shift"):
+        ...
+
+Каждое имя - гистограмма длительностей с фиксированными корзинами
+(от 1 мкс до 7 с): запись - один bisect и пара сложений, поэтому
+замеры можно не выключать в продакшене. Итоги - timings.dump()
+(команда /timings в боте, GET /api/timings в API-сервере).
+"""
+from bisect import bisect_left
+from time import perf_counter
+
+from config import TIMINGS_ENABLED
+
+# Верхние границы корзин, секунды (последняя корзина - всё, что дольше)
+BOUNDS = tuple(
+    base * 10 ** exp / 1e6
+    for exp in range(0, 7)
+    for base in (1, 1.5, 2, 3, 5, 7)
+)
+
+
+class Histogram:
+    """Распределение длительностей одного замера"""
+
+    __slots__ = ("name", "counts", "count", "total", "min", "max")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect_left(BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """Оценка q-квантиля (0..1) сверху: граница корзины, не больше max"""
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BOUNDS[i], self.max) if i < len(BOUNDS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        """Итоги в миллисекундах"""
+        def ms(seconds):
+            return round(seconds * 1000, 3)
+
+        return {
+            "count": self.count,
+            "total_ms": ms(self.total),
+            "avg_ms": ms(self.total / self.count) if self.count else 0.0,
+            "min_ms": ms(self.min or 0.0),
+            "p50_ms": ms(self.percentile(0.5)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max),
+        }
+
+
+class TimingRegistry:
+    """Гистограммы замеров по имени"""
+
+    def __init__(self, enabled: bool = TIMINGS_ENABLED):
+        self.enabled = enabled
+        self._histograms = {}
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram(name)
+        return histogram
+
+    def record(self, name: str, seconds: float):
+        if self.enabled:
+            self.histogram(name).record(seconds)
+
+    def snapshot(self) -> dict:
+        """{имя: итоги} по имени"""
+        # copy() - из другого потока (api_server) во время записи замеров
+        histograms = self._histograms.copy()
+        return {name: histograms[name].to_dict() for name in sorted(histograms)}
+
+    def reset(self):
+        self._histograms.clear()
+
+    def dump(self) -> str:
+        """Итоги таблицей (мс)"""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return "Замеров нет" if self.enabled else "Замеры выключены (TIMINGS_ENABLED=0)"
+
+        width = max(len(name) for name in snapshot)
+        lines = [f"{'замер':<{width}} {'N':>7} {'сред':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'макс':>8}"]
+        for name, stats in snapshot.items():
+            lines.append(
+                f"{name:<{width}} {stats['count']:>7} {stats['avg_ms']:>8.3f} {stats['p50_ms']:>8.3f} "
+                f"{stats['p95_ms']:>8.3f} {stats['p99_ms']:>8.3f} {stats['max_ms']:>8.3f}"
+            )
+        return "\n".join(lines)
+
+
+timings = TimingRegistry()
+
+
+class _Timer:
+    """Один замер (объект на вызов: безопасно при параллельных корутинах)"""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.record(perf_counter() - self.started)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timed(name: str):
+    """Контекстный менеджер замера в гистограмму name общего реестра timings"""
+    if not timings.enabled:
+        return _NO_TIMER
+    return _Timer(timings.histogram(name))